@@ -0,0 +1,188 @@
+"""
+File: build_profile.py
+Purpose: Time the phases of a generator run and count its filesystem calls (--profile).
+
+Nothing is measured until `enable()` is called.  Phases are the `with phase(...)`
+blocks of the generator, from whole passes (tree load, tree walk, output) down to
+the config reads, symbol construction, highlight collection, nextgroup emission
+and error-label output within them; a phase is timed inclusively, so nested ones
+overlap their enclosing one.  The filesystem calls are counted where they are
+made: the syntax tree loader (`syntax_tree.scan_node_dir()` and
+`parse_simple_ini.read_node_config()`), the cache validation
+(`syntax_tree.path_signature()`, for every entry of a manifest) and the cache
+reads (`tree_cache.read_pickle()`), each behind a check of `enabled`.
+"""
+import contextlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# the counters reported, in report order (filesystem calls, then config cache lookups)
+COUNTER_NAMES: Tuple[str, ...] = ('iterdir', 'stat', 'open', 'config cache hits', 'config cache misses')
+
+enabled: bool = False
+phase_totals_ns: Dict[str, int] = {}
+phase_calls: Dict[str, int] = {}
+call_counts: Dict[str, int] = {}
+
+
+class ProfileReport(NamedTuple):
+    """
+    What one run (or one generator job) measured.
+    """
+    phase_totals_ns: Dict[str, int]  # inclusive time of each phase
+    phase_calls: Dict[str, int]  # number of times each phase was entered
+    counters: Dict[str, int]  # filesystem calls and config cache hits/misses
+
+
+class PhaseTimer:
+    """
+    Times one pass through a phase (a `with` block).
+    """
+    __slots__ = ('phase_name', 'start_ns')
+
+    def __init__(self, phase_name: str) -> None:
+        self.phase_name = phase_name
+        self.start_ns = 0
+
+    def __enter__(self) -> 'PhaseTimer':
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        record_phase(self.phase_name, time.perf_counter_ns() - self.start_ns)
+
+
+def record_phase(phase_name: str, elapsed_ns: int) -> None:
+    """
+    Add one pass through a phase.
+    :param phase_name: the name of the phase
+    :type phase_name: `str`
+    :param elapsed_ns: how long it took, in nanoseconds
+    :type elapsed_ns: `int`
+    :return: None
+    :rtype: `None`
+    """
+    phase_totals_ns[phase_name] = phase_totals_ns.get(phase_name, 0) + elapsed_ns
+    phase_calls[phase_name] = phase_calls.get(phase_name, 0) + 1
+
+
+def count_call(counter_name: str) -> None:
+    """
+    Count one call (the caller checks `enabled` first).
+    :param counter_name: the name of the counter, one of COUNTER_NAMES
+    :type counter_name: `str`
+    :return: None
+    :rtype: `None`
+    """
+    call_counts[counter_name] = call_counts.get(counter_name, 0) + 1
+
+
+def phase(phase_name: str) -> Any:
+    """
+    Time a `with` block as a phase; a do-nothing context when profiling is disabled.
+    :param phase_name: the name of the phase
+    :type phase_name: `str`
+    :return: a context manager
+    :rtype: `Any`
+    """
+    if not enabled:
+        return contextlib.nullcontext()
+    return PhaseTimer(phase_name)
+
+
+def enable() -> None:
+    """
+    Start profiling this process: time its phases and count its filesystem calls from now on.
+    :return: None
+    :rtype: `None`
+    """
+    global enabled
+    enabled = True
+    reset()
+
+
+def reset() -> None:
+    """
+    Start measuring afresh (e.g. for each rebuild of watch mode, or in a worker process).
+    :return: None
+    :rtype: `None`
+    """
+    phase_totals_ns.clear()
+    phase_calls.clear()
+    call_counts.clear()
+
+
+def snapshot() -> ProfileReport:
+    """
+    Give what was measured since the last reset.
+    :return: the measurements
+    :rtype: `ProfileReport`
+    """
+    counters = {this_name: call_counts.get(this_name, 0) for this_name in COUNTER_NAMES}
+    return ProfileReport(dict(phase_totals_ns), dict(phase_calls), counters)
+
+
+def merge(report: ProfileReport) -> None:
+    """
+    Add what another process (a generator job) measured.
+    :param report: the measurements of the other process
+    :type report: `ProfileReport`
+    :return: None
+    :rtype: `None`
+    """
+    for this_phase_name, this_total_ns in report.phase_totals_ns.items():
+        phase_totals_ns[this_phase_name] = phase_totals_ns.get(this_phase_name, 0) + this_total_ns
+        phase_calls[this_phase_name] = phase_calls.get(this_phase_name, 0) + report.phase_calls[this_phase_name]
+    for this_counter_name, this_count in report.counters.items():
+        call_counts[this_counter_name] = call_counts.get(this_counter_name, 0) + this_count
+
+
+def format_table(report: ProfileReport) -> List[str]:
+    """
+    Lay a profile out as a table; phase times are inclusive of the phases nested in them.
+    :param report: the measurements
+    :type report: `ProfileReport`
+    :return: lines of text
+    :rtype: `List[str]`
+    """
+    lines = [f"  {'phase':<24} {'calls':>8} {'total ms':>12} {'mean us':>12}"]
+    for this_phase_name, this_total_ns in report.phase_totals_ns.items():
+        this_calls = report.phase_calls[this_phase_name]
+        lines.append(f"  {this_phase_name:<24} {this_calls:>8} {this_total_ns / 1e6:>12.3f} "
+                     f"{this_total_ns / this_calls / 1e3:>12.1f}")
+    lines.append(f"  {'counter':<24} {'count':>8}")
+    for this_counter_name, this_count in report.counters.items():
+        lines.append(f"  {this_counter_name:<24} {this_count:>8}")
+    return lines
+
+
+def append_json(json_filespec: Path, report: ProfileReport, **run_details: Any) -> None:
+    """
+    Append a profile as one JSON line to a file, for tracking its trend across runs.
+    :param json_filespec: the JSON Lines file
+    :type json_filespec: `Path`
+    :param report: the measurements
+    :type report: `ProfileReport`
+    :param run_details: anything else to record about the run (e.g. the file format)
+    :type run_details: `Any`
+    :return: None
+    :rtype: `None`
+    """
+    record: Dict[str, Any] = {'time': time.time(), **run_details,
+                              'phases': {this_phase_name: {'calls': report.phase_calls[this_phase_name],
+                                                           'total_ns': this_total_ns}
+                                         for this_phase_name, this_total_ns in report.phase_totals_ns.items()},
+                              'counters': report.counters}
+    with open(json_filespec, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def optional_report() -> Optional[ProfileReport]:
+    """
+    Give what was measured, if profiling is enabled.
+    :return: the measurements, or None
+    :rtype: `Optional[ProfileReport]`
+    """
+    return snapshot() if enabled else None
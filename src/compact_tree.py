@@ -0,0 +1,508 @@
+"""
+File: compact_tree.py
+Purpose: Store a loaded syntax tree compactly: parallel array columns, a string table and bitflags.
+
+Every distinct node is one row of the columns.  Its name and option values are
+indices into one string table (each distinct string is kept once), its boolean
+options are bits of one byte, and its child nodes are an index range of one flat
+array of node indices (a shared subtree is one row, listed by every parent).
+Its path is an index into a path table: each entry is a parent entry and one
+path component, so a path costs two integers, whatever its depth.
+
+The loader fills the columns as it scans the directories (`CompactTreeBuilder`);
+there is no node object in between.  Emitters read the rows through
+`CompactNode`, a two-slot handle.
+"""
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# node flags
+FLAG_TERMINAL: int = 0x01
+FLAG_BACK_REFERENCE: int = 0x02
+FLAG_HAS_OPTIONS: int = 0x04  # the node has a non-empty '.config.ini'
+FLAG_SQUISHABLE_WITH_NEXT_TOKEN: int = 0x08
+FLAG_SQUISHABLE_GIVEN: int = 0x10  # 'squishable_with_next_token' is given a value (whatever it is)
+FLAG_MUST_FOLLOW_LINES_TO_END_REGION_DELIMITER: int = 0x20
+# the flags that come from the '.config.ini' of a node
+OPTION_FLAGS: int = (FLAG_HAS_OPTIONS | FLAG_SQUISHABLE_WITH_NEXT_TOKEN | FLAG_SQUISHABLE_GIVEN
+                     | FLAG_MUST_FOLLOW_LINES_TO_END_REGION_DELIMITER)
+
+# string index of an option not given
+NO_STRING: int = -1
+# the parent of a path table entry that holds a whole path (the tree root, or a place outside of it)
+NO_PATH: int = -1
+# option values that mean false
+FALSE_OPTION_VALUES = ('', '0', 'no', 'false', 'off')
+
+STRING_INDEX_TYPECODE: str = 'i'  # signed, for NO_STRING
+NODE_INDEX_TYPECODE: str = 'I'
+FLAGS_TYPECODE: str = 'B'
+
+
+def is_true_option(value: Optional[str]) -> bool:
+    """
+    Read a boolean node option.
+    :param value: the option value, None if not given
+    :type value: `Optional[str]`
+    :return: Returns True if the option is given and not false
+    :rtype: `bool`
+    """
+    return value is not None and value.strip().lower() not in FALSE_OPTION_VALUES
+
+
+def option_flags(options: Dict[str, str]) -> int:
+    """
+    Reduce the boolean options of a node to its option flags.
+    :param options: options from .config.ini file
+    :type options: `Dict[str, str]`
+    :return: the option flags
+    :rtype: `int`
+    """
+    if not options:
+        return 0
+    flags = FLAG_HAS_OPTIONS
+    squishable = options.get('squishable_with_next_token')
+    if squishable:
+        flags |= FLAG_SQUISHABLE_GIVEN
+    if is_true_option(squishable):
+        flags |= FLAG_SQUISHABLE_WITH_NEXT_TOKEN
+    if is_true_option(options.get('must_follow_lines_to_end_region_delimiter')):
+        flags |= FLAG_MUST_FOLLOW_LINES_TO_END_REGION_DELIMITER
+    return flags
+
+
+# the columns of a compact syntax tree: what gets pickled (and measured)
+COLUMN_NAMES: Tuple[str, ...] = ('strings', 'path_parent_ids', 'path_name_ids', 'name_ids', 'path_ids', 'pattern_ids',
+                                 'highlight_ids', 'follow_on_ids', 'flags', 'child_starts', 'child_counts',
+                                 'child_indices')
+# the path table entry of the tree root
+ROOT_PATH_ID: int = 0
+
+
+class CompactNode:
+    """
+    A handle to one node (row) of a compact syntax tree.
+    """
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree: 'CompactTree', index: int) -> None:
+        self.tree = tree
+        self.index = index
+
+    def __repr__(self) -> str:
+        return f'CompactNode({self.index}, {self.name!r})'
+
+    def __reduce__(self) -> Tuple[Any, Tuple[Any, ...]]:
+        # unpickle into the shared handle of the (unpickled) tree
+        return CompactTree.node, (self.tree, self.index)
+
+    @property
+    def name(self) -> str:
+        return self.tree.strings[self.tree.name_ids[self.index]]
+
+    @property
+    def path_string(self) -> str:
+        """The real path of the node directory (of the ancestor, for a back reference)."""
+        return self.tree.get_path(self.tree.path_ids[self.index])
+
+    @property
+    def path(self) -> Path:
+        return Path(self.path_string)
+
+    @property
+    def pattern(self) -> Optional[str]:
+        return self.tree.get_string(self.tree.pattern_ids[self.index])
+
+    @property
+    def highlight_color_name(self) -> Optional[str]:
+        return self.tree.get_string(self.tree.highlight_ids[self.index])
+
+    @property
+    def follow_on_to_only(self) -> Optional[str]:
+        return self.tree.get_string(self.tree.follow_on_ids[self.index])
+
+    @property
+    def flags(self) -> int:
+        return self.tree.flags[self.index]
+
+    @property
+    def has_options(self) -> bool:
+        return bool(self.tree.flags[self.index] & FLAG_HAS_OPTIONS)
+
+    @property
+    def is_squishable_with_next_token(self) -> bool:
+        return bool(self.tree.flags[self.index] & FLAG_SQUISHABLE_WITH_NEXT_TOKEN)
+
+    @property
+    def must_follow_lines_to_end_region_delimiter(self) -> bool:
+        return bool(self.tree.flags[self.index] & FLAG_MUST_FOLLOW_LINES_TO_END_REGION_DELIMITER)
+
+    @property
+    def is_terminal(self) -> bool:
+        return bool(self.tree.flags[self.index] & FLAG_TERMINAL)
+
+    @property
+    def is_back_reference(self) -> bool:
+        return bool(self.tree.flags[self.index] & FLAG_BACK_REFERENCE)
+
+    @property
+    def options_key(self) -> Tuple[Optional[str], Optional[str], Optional[str], int]:
+        """Everything that the '.config.ini' of the node sets, to compare or fingerprint nodes by."""
+        return self.pattern, self.highlight_color_name, self.follow_on_to_only, self.flags & OPTION_FLAGS
+
+    @property
+    def children(self) -> Tuple['CompactNode', ...]:
+        """The child nodes (the tuple is made on first use, then kept)."""
+        tree = self.tree
+        children = tree.child_handles[self.index]
+        if children is None:
+            start = tree.child_starts[self.index]
+            children = tuple(tree.node(this_index)
+                             for this_index in tree.child_indices[start:start + tree.child_counts[self.index]])
+            tree.child_handles[self.index] = children
+        return children
+
+
+class CompactTree:
+    """
+    A syntax tree (a DAG) as parallel array columns, one row per distinct node; row 0 is the root.
+    """
+    __slots__ = COLUMN_NAMES + ('handles', 'child_handles', 'path_strings', 'named_rows')
+
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        # the path table: the parent entry and the last component (a string index) of each path
+        self.path_parent_ids = array(STRING_INDEX_TYPECODE)
+        self.path_name_ids = array(STRING_INDEX_TYPECODE)
+        self.name_ids = array(STRING_INDEX_TYPECODE)
+        self.path_ids = array(NODE_INDEX_TYPECODE)
+        self.pattern_ids = array(STRING_INDEX_TYPECODE)
+        self.highlight_ids = array(STRING_INDEX_TYPECODE)
+        self.follow_on_ids = array(STRING_INDEX_TYPECODE)
+        self.flags = array(FLAGS_TYPECODE)
+        self.child_starts = array(NODE_INDEX_TYPECODE)
+        self.child_counts = array(NODE_INDEX_TYPECODE)
+        self.child_indices = array(NODE_INDEX_TYPECODE)
+        self.reset_handles()
+
+    def __getstate__(self) -> Tuple[Any, ...]:
+        # the handles and joined paths are not worth shipping; they are cheap to make again
+        return tuple(getattr(self, this_column) for this_column in COLUMN_NAMES)
+
+    def __setstate__(self, columns: Tuple[Any, ...]) -> None:
+        for this_column, this_values in zip(COLUMN_NAMES, columns):
+            setattr(self, this_column, this_values)
+        self.reset_handles()
+
+    def __len__(self) -> int:
+        return len(self.flags)
+
+    def reset_handles(self) -> None:
+        """
+        Forget the handles, child tuples, joined paths and row index made so far (after the columns were filled).
+        :return: None
+        :rtype: `None`
+        """
+        # handles are made on first use, one per row, so a node is always the same object
+        self.handles: List[Optional[CompactNode]] = [None] * len(self.flags)
+        self.child_handles: List[Optional[Tuple[CompactNode, ...]]] = [None] * len(self.flags)
+        self.path_strings: List[Optional[str]] = [None] * len(self.path_parent_ids)
+        # the row of each (path, name), indexed on first use by find_row()
+        self.named_rows: Optional[Dict[Tuple[str, str], int]] = None
+
+    def get_string(self, string_index: int) -> Optional[str]:
+        """
+        Look up the string table.
+        :param string_index: a string index
+        :type string_index: `int`
+        :return: the string, None for NO_STRING
+        :rtype: `Optional[str]`
+        """
+        if string_index == NO_STRING:
+            return None
+        return self.strings[string_index]
+
+    def get_path(self, path_id: int) -> str:
+        """
+        Join a path of the path table (once: it is kept for the next time).
+        :param path_id: a path table entry
+        :type path_id: `int`
+        :return: the path
+        :rtype: `str`
+        """
+        path_strings = self.path_strings
+        path_string = path_strings[path_id]
+        if path_string is not None:
+            return path_string
+        # up to the nearest path joined already (or a whole one), then down again
+        pending_ids: List[int] = []
+        this_id = path_id
+        while this_id != NO_PATH and path_strings[this_id] is None:
+            pending_ids.append(this_id)
+            this_id = self.path_parent_ids[this_id]
+        path_string = '' if this_id == NO_PATH else path_strings[this_id]
+        for this_id in reversed(pending_ids):
+            name = self.strings[self.path_name_ids[this_id]]
+            path_string = name if self.path_parent_ids[this_id] == NO_PATH else path_string + os.sep + name
+            path_strings[this_id] = path_string
+        return path_string
+
+    def distinct_strings(self, string_column: array) -> List[str]:
+        """
+        Give the distinct values of a string column (e.g. every highlight of the tree), in row order.
+        :param string_column: a string index column, e.g. `highlight_ids`
+        :type string_column: `array`
+        :return: the distinct strings, options not given left out
+        :rtype: `List[str]`
+        """
+        return [self.strings[this_index] for this_index in dict.fromkeys(string_column) if this_index != NO_STRING]
+
+    def find_row(self, path: str, name: str) -> Optional[int]:
+        """
+        Find a node by its path and name; a back reference is never found (it stands for its ancestor).
+        :param path: the path of the node
+        :type path: `str`
+        :param name: the name of the node
+        :type name: `str`
+        :return: its row, None if there is no such node
+        :rtype: `Optional[int]`
+        """
+        if self.named_rows is None:
+            self.named_rows = {}
+            for this_row, (this_path_id, this_name_id, this_flags) in enumerate(zip(self.path_ids, self.name_ids,
+                                                                                    self.flags)):
+                if not this_flags & FLAG_BACK_REFERENCE:
+                    self.named_rows.setdefault((self.get_path(this_path_id), self.strings[this_name_id]), this_row)
+        return self.named_rows.get((path, name))
+
+    def node(self, index: int) -> CompactNode:
+        """
+        Give the handle to a node.
+        :param index: the row of the node
+        :type index: `int`
+        :return: its handle
+        :rtype: `CompactNode`
+        """
+        handle = self.handles[index]
+        if handle is None:
+            handle = CompactNode(self, index)
+            self.handles[index] = handle
+        return handle
+
+    @property
+    def root(self) -> CompactNode:
+        return self.node(0)
+
+
+class CompactTreeBuilder:
+    """
+    Fill the columns of a compact syntax tree row by row, as the loader scans the node directories.
+
+    A row is added when its directory is scanned, and given its child nodes once
+    all of them are loaded (`set_children()`); the first row added is the root.
+    """
+    __slots__ = ('tree', 'root_path', 'string_ids', 'path_entry_ids')
+
+    def __init__(self, root_path: str) -> None:
+        self.tree = CompactTree()
+        self.root_path = root_path
+        self.string_ids: Dict[str, int] = {}
+        # the path table entry of each (parent entry, component string index)
+        self.path_entry_ids: Dict[Tuple[int, int], int] = {}
+        self.intern_path(NO_PATH, root_path)
+
+    def intern_string(self, value: Optional[str]) -> int:
+        """
+        Add a string to the string table, once.
+        :param value: a string, or None
+        :type value: `Optional[str]`
+        :return: its string index, NO_STRING for None
+        :rtype: `int`
+        """
+        if value is None:
+            return NO_STRING
+        string_index = self.string_ids.get(value)
+        if string_index is None:
+            string_index = len(self.tree.strings)
+            self.string_ids[value] = string_index
+            self.tree.strings.append(value)
+        return string_index
+
+    def intern_path(self, parent_path_id: int, name: str) -> int:
+        """
+        Add a path to the path table, once.
+        :param parent_path_id: the entry of its parent directory (NO_PATH: the name is a whole path)
+        :type parent_path_id: `int`
+        :param name: its last component
+        :type name: `str`
+        :return: its path table entry
+        :rtype: `int`
+        """
+        key = (parent_path_id, self.intern_string(name))
+        path_id = self.path_entry_ids.get(key)
+        if path_id is None:
+            path_id = len(self.tree.path_parent_ids)
+            self.path_entry_ids[key] = path_id
+            self.tree.path_parent_ids.append(parent_path_id)
+            self.tree.path_name_ids.append(key[1])
+        return path_id
+
+    def intern_real_path(self, real_path: str) -> int:
+        """
+        Add a real path (e.g. where a symlink leads) to the path table: component by component within the tree.
+        :param real_path: the path
+        :type real_path: `str`
+        :return: its path table entry
+        :rtype: `int`
+        """
+        if real_path == self.root_path:
+            return ROOT_PATH_ID
+        if not real_path.startswith(self.root_path + os.sep):
+            return self.intern_path(NO_PATH, real_path)
+        path_id = ROOT_PATH_ID
+        for this_component in real_path[len(self.root_path) + 1:].split(os.sep):
+            path_id = self.intern_path(path_id, this_component)
+        return path_id
+
+    def add_row(self, name: str, path_id: int, options: Dict[str, str]) -> int:
+        """
+        Add a node, without child nodes yet.
+        :param name: the node name
+        :type name: `str`
+        :param path_id: the path table entry of its directory
+        :type path_id: `int`
+        :param options: options from its .config.ini file
+        :type options: `Dict[str, str]`
+        :return: its row
+        :rtype: `int`
+        """
+        return self.append_row(self.intern_string(name), path_id, self.intern_string(options.get('pattern')),
+                               self.intern_string(options.get('highlight_color_name')),
+                               self.intern_string(options.get('follow_on_to_only')), option_flags(options), 0, 0)
+
+    def add_link(self, row: int, name: str, path_id: int) -> int:
+        """
+        Add a node linked to a loaded node by another name: another keyword, with the same options and child nodes.
+        :param row: the row of the loaded node
+        :type row: `int`
+        :param name: the name of the link
+        :type name: `str`
+        :param path_id: the path table entry of the link
+        :type path_id: `int`
+        :return: its row
+        :rtype: `int`
+        """
+        tree = self.tree
+        return self.append_row(self.intern_string(name), path_id, tree.pattern_ids[row], tree.highlight_ids[row],
+                               tree.follow_on_ids[row], tree.flags[row], tree.child_starts[row],
+                               tree.child_counts[row])
+
+    def add_back_reference(self, row: int, name: str) -> int:
+        """
+        Add a childless stand-in for an ancestor node still being loaded, which closes a cycle.
+        :param row: the row of the ancestor
+        :type row: `int`
+        :param name: the name of the link to it
+        :type name: `str`
+        :return: its row
+        :rtype: `int`
+        """
+        tree = self.tree
+        return self.append_row(self.intern_string(name), tree.path_ids[row], tree.pattern_ids[row],
+                               tree.highlight_ids[row], tree.follow_on_ids[row],
+                               (tree.flags[row] & OPTION_FLAGS) | FLAG_BACK_REFERENCE, 0, 0)
+
+    def append_row(self, name_id: int, path_id: int, pattern_id: int, highlight_id: int, follow_on_id: int,
+                   flags: int, child_start: int, child_count: int) -> int:
+        """
+        Append a row to every column.
+        :return: the row
+        :rtype: `int`
+        """
+        tree = self.tree
+        tree.name_ids.append(name_id)
+        tree.path_ids.append(path_id)
+        tree.pattern_ids.append(pattern_id)
+        tree.highlight_ids.append(highlight_id)
+        tree.follow_on_ids.append(follow_on_id)
+        tree.flags.append(flags)
+        tree.child_starts.append(child_start)
+        tree.child_counts.append(child_count)
+        return len(tree.flags) - 1
+
+    def set_children(self, row: int, child_rows: List[int]) -> None:
+        """
+        Give a node its child nodes, once all of them are loaded.
+        :param row: the row of the node
+        :type row: `int`
+        :param child_rows: the rows of its child nodes
+        :type child_rows: `List[int]`
+        :return: None
+        :rtype: `None`
+        """
+        tree = self.tree
+        tree.child_starts[row] = len(tree.child_indices)
+        tree.child_counts[row] = len(child_rows)
+        tree.child_indices.extend(child_rows)
+        # a terminal node has no ordinary (non-block) child nodes
+        if not any(not tree.strings[tree.name_ids[this_row]].startswith('block_') for this_row in child_rows):
+            tree.flags[row] |= FLAG_TERMINAL
+
+    def finish(self) -> CompactTree:
+        """
+        Give the tree built.
+        :return: the compact syntax tree
+        :rtype: `CompactTree`
+        """
+        self.tree.reset_handles()
+        return self.tree
+
+
+class MemoryReport(NamedTuple):
+    """
+    The memory footprint of a compact syntax tree, and the peak memory of building it, in bytes.
+    """
+    node_count: int  # distinct nodes
+    string_count: int  # distinct strings of the string table
+    path_count: int  # entries of the path table
+    column_bytes: Dict[str, int]  # per column (the string table included)
+    peak_bytes: int  # the peak of memory allocated while loading (or unpickling) and compressing the tree
+
+    @property
+    def compact_bytes(self) -> int:
+        return sum(self.column_bytes.values())
+
+    def format(self) -> List[str]:
+        """
+        Lay the report out as a table.
+        :return: lines of text
+        :rtype: `List[str]`
+        """
+        lines = [f"Memory footprint of {self.node_count} nodes ({self.string_count} distinct strings, "
+                 f"{self.path_count} paths):"]
+        for this_column, this_size in self.column_bytes.items():
+            lines.append(f"  {this_column:<16} {this_size:>12} bytes")
+        lines.append(f"  {'compact total':<16} {self.compact_bytes:>12} bytes")
+        lines.append(f"  {'peak to build':<16} {self.peak_bytes:>12} bytes")
+        if self.compact_bytes:
+            lines.append(f"  {'ratio':<16} {self.peak_bytes / self.compact_bytes:>12.1f} x")
+        return lines
+
+
+def measure(tree: CompactTree, peak_bytes: int) -> MemoryReport:
+    """
+    Measure the memory footprint of a compact syntax tree.
+    :param tree: the compact syntax tree
+    :type tree: `CompactTree`
+    :param peak_bytes: the peak of memory allocated while building it (e.g. traced by `tracemalloc`)
+    :type peak_bytes: `int`
+    :return: the memory footprint report
+    :rtype: `MemoryReport`
+    """
+    column_bytes = {this_column: sys.getsizeof(getattr(tree, this_column)) for this_column in COLUMN_NAMES[1:]}
+    column_bytes['strings'] = sys.getsizeof(tree.strings) + sum(sys.getsizeof(this_string)
+                                                                for this_string in tree.strings)
+    return MemoryReport(len(tree), len(tree.strings), len(tree.path_parent_ids), column_bytes, peak_bytes)
@@ -8,12 +8,17 @@ Purpose: Construct consistent symbol/group names from a parsing stack.
 """
 
 import re
+import sys
 import logging
 import pathlib
-from typing import List, Deque
+from typing import List, Deque, Tuple
 
 logging.basicConfig(level=logging.ERROR)
 
+# Precompiled once; these run for every path component of every node
+NON_ALPHANUMERIC_REGEX = re.compile(r'[^a-zA-Z0-9]')
+NON_ALPHANUMERIC_RUN_REGEX = re.compile(r'[^a-zA-Z0-9]+')
+
 def convert(previous_name: str, name: str) -> str:
     """
 
@@ -69,7 +74,6 @@ def get_dir_stackless(syntax_root_path: pathlib.Path, file_path: pathlib.Path) -
         relative_path = file_path.relative_to(syntax_root_path)
     except ValueError:
         relative_path = file_path  # Fallback if path is not under root
-    print(f'parts: {file_path.parts}')
     parts = list(relative_path.parts)[1:] if relative_path.is_absolute() else relative_path.parts
 
     # Process each part
@@ -80,7 +84,7 @@ def get_dir_stackless(syntax_root_path: pathlib.Path, file_path: pathlib.Path) -
         part = special_conversions.get(part, part)
 
         # Remove invalid characters, replace with underscore
-        part = re.sub(r'[^a-zA-Z0-9]', '_', part)
+        part = NON_ALPHANUMERIC_REGEX.sub('_', part)
         # Convert to lowercase and remove leading/trailing underscores
         part = part.lower().strip('_')
         # Skip empty parts (e.g., from consecutive underscores)
@@ -90,7 +94,7 @@ def get_dir_stackless(syntax_root_path: pathlib.Path, file_path: pathlib.Path) -
             # Preserve all-uppercase names (TABLE, CHAIN, etc.)
             if not converted_part.isupper():
                 # Normalize to snake_case: lowercased, non-alphanumerics → underscores
-                converted_part = re.sub(r'[^a-zA-Z0-9]+', '_', converted_part.lower()).strip('_')
+                converted_part = NON_ALPHANUMERIC_RUN_REGEX.sub('_', converted_part.lower()).strip('_')
             valid_parts.append(converted_part)
         parent_part = converted_part
 
@@ -108,6 +112,73 @@ def get_dir_stackless(syntax_root_path: pathlib.Path, file_path: pathlib.Path) -
     return variable_name
 
 
+def get_component(parent_name: str, name: str) -> str:
+    """
+    Convert one path component into its snake_case part of a symbol/group name.
+
+    :param parent_name: The converted part of the parent path component
+    :type parent_name: `str`
+    :param name: The path component (a node name)
+    :type name: `str`
+    :return: The converted part
+    :rtype: `str`
+    """
+    converted_name = convert(parent_name, name)
+    if name.isupper():
+        # Preserve all-uppercase names (TABLE, CHAIN, etc.)
+        return converted_name
+    # Normalize to snake_case: lowercased, non-alphanumerics → underscores
+    return NON_ALPHANUMERIC_RUN_REGEX.sub('_', converted_name.lower()).strip('_')
+
+
+def get_root_dir(prefix: str) -> str:
+    """
+    Construct the symbol/group name of the syntax tree root, which all other names extend.
+
+    :param prefix: A string prefix (e.g., 'nft_' for Vimscript group names).
+    :type prefix: `str`
+    :return: The symbol name of the root, same as `get_dir()` of a root-only stack.
+    :rtype: `str`
+    """
+    return sys.intern(prefix.rstrip('_'))
+
+
+def get_child_dir(parent_dir_name: str, parent_component: str, name: str) -> Tuple[str, str]:
+    """
+    Extend the finished symbol name of a parent node by one child node, instead of
+    re-building it from the whole stack.
+
+    :param parent_dir_name: `get_dir()` of the stack ending at the parent node
+    :type parent_dir_name: `str`
+    :param parent_component: The converted part of the parent node (empty for the root)
+    :type parent_component: `str`
+    :param name: The child node name
+    :type name: `str`
+    :return: `get_dir()` of the stack ending at the child node, and the converted part of the child node
+    :rtype: `Tuple[str, str]`
+    """
+    if not name:
+        raise ValueError("Empty name!")
+    component = get_component(parent_component, name)
+    return sys.intern(parent_dir_name + '_' + component), component
+
+
+def get_child(parent_dir_name: str, parent_name: str, name: str) -> str:
+    """
+    Construct the symbol/group name of a child node from the finished symbol name of its parent node.
+
+    :param parent_dir_name: `get_dir()` of the stack ending at the parent node
+    :type parent_dir_name: `str`
+    :param parent_name: The parent node name
+    :type parent_name: `str`
+    :param name: The child node name
+    :type name: `str`
+    :return: The symbol/group name of the child node
+    :rtype: `str`
+    """
+    return sys.intern(parent_dir_name + '_' + convert(parent_name, name))
+
+
 def get_dir(stack: Deque[pathlib.Path], prefix: str) -> str:
     """
     Construct a snake_case symbol/group name string from a parsing stack.
@@ -133,13 +204,7 @@ def get_dir(stack: Deque[pathlib.Path], prefix: str) -> str:
         if len(name) == 0:
             raise ValueError("Empty name!")
 
-        converted_name = convert(parent_name, name)
-        if name.isupper():
-            # Preserve all-uppercase names (TABLE, CHAIN, etc.)
-            snake_case_name = converted_name
-        else:
-            # Normalize to snake_case: lowercased, non-alphanumerics → underscores
-            snake_case_name = re.sub(r'[^a-zA-Z0-9]+', '_', converted_name.lower()).strip('_')
+        snake_case_name = get_component(parent_name, name)
 
         names.append(snake_case_name)
         parent_name = snake_case_name
@@ -192,7 +257,7 @@ def get_file(stack: Deque[pathlib.Path], filename2: str, prefix: str) -> str:
             snake_case_name = '_' + converted_name
         else:
             # Normalize to snake_case: lowercased, non-alphanumerics → underscores
-            snake_case_name = re.sub(r'[^a-zA-Z0-9]+', '_', converted_name.lower()).strip('_')
+            snake_case_name = NON_ALPHANUMERIC_RUN_REGEX.sub('_', converted_name.lower()).strip('_')
 
         # Append to names list
         names.append(snake_case_name)
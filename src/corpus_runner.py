@@ -0,0 +1,346 @@
+"""
+File: corpus_runner.py
+Purpose: Run the sample scripts of a corpus against the lexer of its syntax tree, and compare their verdicts.
+
+A sample script exercises the pathway of the directory it is kept in (see
+DESIGN-corpus.md).  Its expected verdict is annotated within it, on comment lines:
+
+    # parser:  allowed
+    # scanner: NOT ALLOWED
+
+A script is expected to be allowed only if every annotation says so; it is
+lexed as allowed if every other line of it is valid.  The annotation lines
+themselves are not lexed.
+
+Runs are incremental: a script that passed last time is skipped while its
+content, and the subtrees that its lines entered, are unchanged.
+"""
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import tree_cache
+import tree_lexer
+import vim_fragments
+from compact_tree import CompactTree
+
+RESULT_STORE_VERSION: int = 1
+RESULT_STORE_FILENAME: str = 'corpus-results.pickle'
+SAMPLE_FILE_SUFFIX: str = '.nft'
+ANNOTATION_REGEX = re.compile(r'^\s*#?\s*(parser|scanner)\s*:\s*(allowed|not allowed)\s*$', re.IGNORECASE)
+
+# the lexer of a worker process, compiled once by its initializer
+worker_lexer: Optional[tree_lexer.CompiledLexer] = None
+
+
+class SampleResult(NamedTuple):
+    """
+    The outcome of running one sample script.
+    """
+    path: str
+    line_count: int
+    expected: Optional[bool]  # True: allowed, False: not allowed, None: not annotated
+    actual: bool  # every line lexed valid
+    invalid_lines: Tuple[Tuple[int, str], ...]  # (line number, what went wrong)
+    entered_paths: Tuple[str, ...]  # the top-level nodes that its lines entered
+    seconds: float
+
+    @property
+    def passed(self) -> bool:
+        return self.expected is not None and self.expected == self.actual
+
+
+class StoredResult(NamedTuple):
+    """
+    What a passing run of a sample script was derived from.
+    """
+    digest: str  # of its content
+    entered_paths: Tuple[str, ...]
+    governing_fingerprint: str  # of the top level and of the subtrees it entered
+
+
+class CorpusSummary(NamedTuple):
+    """
+    The outcome of a corpus run.
+    """
+    results: Tuple[SampleResult, ...]
+    skipped_paths: Tuple[str, ...]
+    seconds: float
+
+    @property
+    def failed(self) -> Tuple[SampleResult, ...]:
+        return tuple(this_result for this_result in self.results
+                     if this_result.expected is not None and not this_result.passed)
+
+
+def format_verdict(verdict: Optional[bool]) -> str:
+    """
+    Spell a verdict as the annotations do.
+    :param verdict: True: allowed, False: not allowed, None: not annotated
+    :type verdict: `Optional[bool]`
+    :return: the verdict
+    :rtype: `str`
+    """
+    if verdict is None:
+        return 'not annotated'
+    return 'allowed' if verdict else 'NOT ALLOWED'
+
+
+def read_annotations(lines: Sequence[str]) -> Tuple[Optional[bool], List[int]]:
+    """
+    Read the expected verdict of a sample script.
+    :param lines: its lines
+    :type lines: `Sequence[str]`
+    :return: the expected verdict (None if not annotated), and the indices of its annotation lines
+    :rtype: `Tuple[Optional[bool], List[int]]`
+    """
+    expected: Optional[bool] = None
+    annotation_indices = []
+    for this_index, this_line in enumerate(lines):
+        match = ANNOTATION_REGEX.match(this_line)
+        if match is None:
+            continue
+        annotation_indices.append(this_index)
+        this_verdict = match.group(2).lower() == 'allowed'
+        expected = this_verdict if expected is None else expected and this_verdict
+    return expected, annotation_indices
+
+
+def run_sample(lexer: tree_lexer.CompiledLexer, path: str) -> SampleResult:
+    """
+    Lex a sample script and compare its verdict.
+    :param lexer: a compiled lexer
+    :type lexer: `tree_lexer.CompiledLexer`
+    :param path: the script path
+    :type path: `str`
+    :return: its outcome
+    :rtype: `SampleResult`
+    """
+    start_time = time.perf_counter()
+    with open(path, encoding='utf-8', errors='replace') as sample_file:
+        lines = sample_file.readlines()
+    expected, annotation_indices = read_annotations(lines)
+    for this_index in annotation_indices:
+        lines[this_index] = ''
+    top_level_rows = set(lexer.continuation_rows[tree_lexer.ROOT_ROW])
+    entered_rows = set()
+    invalid_lines = []
+    for this_result in tree_lexer.lex_lines(lexer, lines):
+        entered_rows.update(this_token.row for this_token in this_result.tokens if this_token.row in top_level_rows)
+        if not this_result.is_valid:
+            invalid_lines.append((this_result.line_number, this_result.message))
+    entered_paths = tuple(sorted(lexer.tree.node(this_row).path_string for this_row in entered_rows))
+    return SampleResult(path, len(lines), expected, not invalid_lines, tuple(invalid_lines), entered_paths,
+                        time.perf_counter() - start_time)
+
+
+def init_worker(tree: CompactTree) -> None:
+    """
+    Compile the lexer of a worker process.
+    :param tree: the compact syntax tree
+    :type tree: `CompactTree`
+    :return: None
+    :rtype: `None`
+    """
+    global worker_lexer
+    worker_lexer = tree_lexer.compile_lexer(tree)
+
+
+def run_sample_job(path: str) -> SampleResult:
+    """
+    Run one sample script with the lexer of this worker process.
+    :param path: the script path
+    :type path: `str`
+    :return: its outcome
+    :rtype: `SampleResult`
+    """
+    assert worker_lexer is not None, 'the worker process was not initialized'
+    return run_sample(worker_lexer, path)
+
+
+def subtree_fingerprint(lexer: tree_lexer.CompiledLexer, row: int) -> str:
+    """
+    Fingerprint everything that a line entering a node is lexed with: the nodes reachable from it.
+    :param lexer: a compiled lexer
+    :type lexer: `tree_lexer.CompiledLexer`
+    :param row: a row of the compact tree
+    :type row: `int`
+    :return: a hex digest
+    :rtype: `str`
+    """
+    tree = lexer.tree
+    reached_rows: Dict[int, None] = {}
+    pending_rows = [row]
+    while pending_rows:
+        this_row = pending_rows.pop()
+        if this_row in reached_rows:
+            continue
+        reached_rows[this_row] = None
+        pending_rows.extend(lexer.continuation_rows[this_row])
+    # rows are numbered afresh by every load; paths are not
+    return vim_fragments.fingerprint(sorted(
+        (tree.node(this_row).path_string, tree.node(this_row).name, tree.node(this_row).options_key,
+         tree.node(this_row).is_terminal,
+         tuple(tree.node(this_continuation).path_string for this_continuation in lexer.continuation_rows[this_row]))
+        for this_row in reached_rows))
+
+
+def governing_fingerprint(lexer: tree_lexer.CompiledLexer, entered_paths: Sequence[str]) -> str:
+    """
+    Fingerprint the part of the syntax tree that lexing a sample script depends on.
+    :param lexer: a compiled lexer
+    :type lexer: `tree_lexer.CompiledLexer`
+    :param entered_paths: the top-level nodes that its lines entered
+    :type entered_paths: `Sequence[str]`
+    :return: a hex digest
+    :rtype: `str`
+    """
+    tree = lexer.tree
+    top_level_rows = {tree.node(this_row).path_string: this_row
+                      for this_row in lexer.continuation_rows[tree_lexer.ROOT_ROW]}
+    # every line starts at the top level, where all top-level nodes compete
+    top_level = [(this_path, tree.node(this_row).name, tree.node(this_row).options_key)
+                 for this_path, this_row in top_level_rows.items()]
+    entered = [(this_path, subtree_fingerprint(lexer, top_level_rows[this_path])
+                if this_path in top_level_rows else None) for this_path in entered_paths]
+    return vim_fragments.fingerprint(top_level, entered)
+
+
+def file_digest(path: str) -> str:
+    """
+    Hash the content of a file.
+    :param path: the file path
+    :type path: `str`
+    :return: a hex digest
+    :rtype: `str`
+    """
+    with open(path, 'rb') as sample_file:
+        return hashlib.blake2b(sample_file.read(), digest_size=16).hexdigest()
+
+
+def load_store(cache_dirpath: Path) -> Dict[str, StoredResult]:
+    """
+    Load the sample scripts that passed in previous runs.
+    :param cache_dirpath: directory holding the cache files
+    :type cache_dirpath: `Path`
+    :return: stored results keyed by script path
+    :rtype: `Dict[str, StoredResult]`
+    """
+    stored = tree_cache.read_pickle(cache_dirpath / RESULT_STORE_FILENAME)
+    if not isinstance(stored, dict) or stored.get('version') != RESULT_STORE_VERSION:
+        return {}
+    return stored['results']
+
+
+def save_store(cache_dirpath: Path, stored_results: Dict[str, StoredResult]) -> None:
+    """
+    Save the sample scripts that passed, for the next run.
+    :param cache_dirpath: directory holding the cache files
+    :type cache_dirpath: `Path`
+    :param stored_results: stored results keyed by script path
+    :type stored_results: `Dict[str, StoredResult]`
+    :return: None
+    :rtype: `None`
+    """
+    tree_cache.write_pickle(cache_dirpath / RESULT_STORE_FILENAME,
+                            {'version': RESULT_STORE_VERSION, 'results': stored_results})
+
+
+def run_corpus(tree: CompactTree, sample_paths: Sequence[str], stored_results: Dict[str, StoredResult],
+               jobs: int = 1) -> CorpusSummary:
+    """
+    Run sample scripts, skipping those unchanged since they passed; the stored results are rebuilt in place, from
+    the scripts given (a script gone from the syntax tree is dropped).
+    :param tree: the compact syntax tree
+    :type tree: `CompactTree`
+    :param sample_paths: the script paths
+    :type sample_paths: `Sequence[str]`
+    :param stored_results: the scripts that passed in previous runs, keyed by script path
+    :type stored_results: `Dict[str, StoredResult]`
+    :param jobs: number of worker processes
+    :type jobs: `int`
+    :return: the outcome of every script run, in the order given
+    :rtype: `CorpusSummary`
+    """
+    start_time = time.perf_counter()
+    lexer = tree_lexer.compile_lexer(tree)
+    # most scripts enter the same few subtrees
+    fingerprints: Dict[Tuple[str, ...], str] = {}
+
+    def get_fingerprint(entered_paths: Tuple[str, ...]) -> str:
+        """
+        Fingerprint the part of the syntax tree that scripts entering these top-level nodes depend on, once.
+        """
+        if entered_paths not in fingerprints:
+            fingerprints[entered_paths] = governing_fingerprint(lexer, entered_paths)
+        return fingerprints[entered_paths]
+
+    previous_results = dict(stored_results)
+    stored_results.clear()
+    digests = {}
+    pending_paths = []
+    skipped_paths = []
+    for this_path in sample_paths:
+        digests[this_path] = file_digest(this_path)
+        stored_result = previous_results.get(this_path)
+        if (stored_result is not None and stored_result.digest == digests[this_path]
+                and stored_result.governing_fingerprint == get_fingerprint(stored_result.entered_paths)):
+            stored_results[this_path] = stored_result
+            skipped_paths.append(this_path)
+        else:
+            pending_paths.append(this_path)
+
+    if jobs <= 1 or len(pending_paths) <= 1:
+        results = [run_sample(lexer, this_path) for this_path in pending_paths]
+    else:
+        # a worker compiles its own lexer once; scripts are handed out in chunks
+        chunk_size = max(1, len(pending_paths) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(tree,)) as executor:
+            results = list(executor.map(run_sample_job, pending_paths, chunksize=chunk_size))
+
+    for this_result in results:
+        if this_result.passed:
+            stored_results[this_result.path] = StoredResult(
+                digests[this_result.path], this_result.entered_paths, get_fingerprint(this_result.entered_paths))
+    return CorpusSummary(tuple(results), tuple(skipped_paths), time.perf_counter() - start_time)
+
+
+def format_report(summary: CorpusSummary, tree_dirpath: str, verbose: bool = False) -> List[str]:
+    """
+    Format the outcome of a corpus run: a line per script, then a summary.
+    :param summary: the outcome of a corpus run
+    :type summary: `CorpusSummary`
+    :param tree_dirpath: the syntax tree directory, that script paths are shown relative to
+    :type tree_dirpath: `str`
+    :param verbose: also list the skipped scripts, and the invalid lines of every script
+    :type verbose: `bool`
+    :return: report lines
+    :rtype: `List[str]`
+    """
+    lines = []
+    for this_result in summary.results:
+        this_path = os.path.relpath(this_result.path, tree_dirpath)
+        if this_result.expected is None:
+            status = 'NOTE'
+        else:
+            status = 'PASS' if this_result.passed else 'FAIL'
+        lines.append(f"{status} {this_path}: {this_result.line_count} lines in {this_result.seconds * 1000:.2f} ms, "
+                     f"expected {format_verdict(this_result.expected)}, lexed {format_verdict(this_result.actual)}")
+        if verbose or status == 'FAIL':
+            for this_line_number, this_message in this_result.invalid_lines:
+                lines.append(f"    line {this_line_number}: {this_message}")
+    if verbose:
+        for this_path in summary.skipped_paths:
+            lines.append(f"SKIP {os.path.relpath(this_path, tree_dirpath)}: unchanged since it passed")
+    passed_count = sum(1 for this_result in summary.results if this_result.passed)
+    unannotated_count = sum(1 for this_result in summary.results if this_result.expected is None)
+    line_count = sum(this_result.line_count for this_result in summary.results)
+    lines.append(f"Corpus: {len(summary.results) + len(summary.skipped_paths)} scripts: {passed_count} passed, "
+                 f"{len(summary.failed)} failed, {unannotated_count} not annotated, "
+                 f"{len(summary.skipped_paths)} skipped (unchanged); "
+                 f"{line_count} lines run in {summary.seconds:.3f} s")
+    return lines
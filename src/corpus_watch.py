@@ -0,0 +1,58 @@
+"""
+File: corpus_watch.py
+Purpose: Poll a syntax tree and its Vimscript header/footer directories for changes.
+"""
+import os
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import syntax_tree
+import tree_cache
+from syntax_tree import StatSignature
+
+DEFAULT_POLL_INTERVAL: float = 0.05  # seconds
+
+
+def snapshot_dirs(dirpaths: List[Path]) -> Dict[str, StatSignature]:
+    """
+    Take the stat signature of some directories and of every file directly in them.
+    :param dirpaths: directories to take a snapshot of (missing ones are skipped)
+    :type dirpaths: `List[Path]`
+    :return: stat signatures keyed by path
+    :rtype: `Dict[str, StatSignature]`
+    """
+    snapshot: Dict[str, StatSignature] = {}
+    for this_dirpath in dirpaths:
+        try:
+            snapshot[str(this_dirpath)] = syntax_tree.stat_signature(os.stat(this_dirpath))
+            with os.scandir(this_dirpath) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        snapshot[entry.path] = syntax_tree.stat_signature(entry.stat())
+        except FileNotFoundError:
+            continue
+    return snapshot
+
+
+def wait_for_change(tree_manifest: Dict[str, StatSignature], dirs_snapshot: Dict[str, StatSignature],
+                    dirpaths: List[Path], interval: float = DEFAULT_POLL_INTERVAL) -> None:
+    """
+    Block until something in the syntax tree or in the watched directories changes.
+    :param tree_manifest: stat signatures of every directory and config file of the syntax tree
+    :type tree_manifest: `Dict[str, StatSignature]`
+    :param dirs_snapshot: snapshot of the other watched directories, taken before the last build
+    :type dirs_snapshot: `Dict[str, StatSignature]`
+    :param dirpaths: other directories to watch (e.g. Vimscript header/footer directories)
+    :type dirpaths: `List[Path]`
+    :param interval: seconds between polls
+    :type interval: `float`
+    :return: None
+    :rtype: `None`
+    """
+    while True:
+        time.sleep(interval)
+        if not tree_cache.manifest_is_valid(tree_manifest):
+            return
+        if snapshot_dirs(dirpaths) != dirs_snapshot:
+            return
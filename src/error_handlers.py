@@ -0,0 +1,137 @@
+"""
+File: error_handlers.py
+Purpose: Compile the 'follow_on_to_only' node option into antipattern error groups, one per distinct follow-on set.
+
+An error group is the last resort of a 'nextgroup=' list: it matches any character
+that may not follow the node.  It is defined ahead of every node, so that a child
+node matching at the same column wins over it.  Every node with the same set of
+follow-on tokens (in whatever order they are listed) refers to the same group, so
+Vim has to evaluate only one lookahead regex per distinct set.  A node without a
+'follow_on_to_only' option may refer to the default error group: anything that
+none of its child nodes matches.
+"""
+import functools
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from parse_simple_ini import valid_node_follow_on_options
+
+# follow-on token: (its part of an error group name, the characters it stands for)
+FOLLOW_ON_TOKENS: Dict[str, Tuple[str, str]] = {
+    'new_line': ('nl', ''),  # the end of a line: no character, only the blanks before it
+    'end_of_statement': ('semicolon', ';'),
+    'start_block_delimiter': ('lbrace', '{'),
+    'end_block_delimiter': ('rbrace', '}'),
+    'equal': ('equal', '='),
+    'start_parenthesis': ('lparen', '('),
+    'end_parenthesis': ('rparen', ')'),
+    'slash': ('slash', '/'),
+    'at_symbol': ('at', '@'),
+    'dot': ('dot', '.'),
+    'colon': ('colon', ':'),
+    'comma': ('comma', ','),
+    'plus': ('plus', '+'),
+    'dash': ('dash', '-'),
+    'asterisk': ('asterisk', '*'),
+    'hashmark': ('hash', '#'),
+}
+if set(FOLLOW_ON_TOKENS) != valid_node_follow_on_options:
+    raise RuntimeError(f"Every follow-on token needs its characters: "
+                       f"{sorted(set(FOLLOW_ON_TOKENS) ^ valid_node_follow_on_options)}")
+
+# characters to backslash inside a Vim '[...]' collection
+VIM_COLLECTION_SPECIAL_CHARS: str = ']^-\\'
+# the blanks before the end of a line
+BLANK_CHARS: str = ' \\t'
+# the default error group: any character but a blank (where none of the child nodes of a node matches)
+DEFAULT_ERROR_ANTIPATTERN: str = r'\v[^ \t]'
+
+
+class ErrorHandler(NamedTuple):
+    """
+    One antipattern error group.
+    """
+    group_name: str
+    characters: str  # the characters allowed to follow
+    antipattern: str  # a Vim very-magic pattern matching any other character
+
+
+def parse_follow_on_tokens(follow_on_to_only: str) -> Tuple[str, ...]:
+    """
+    Read a 'follow_on_to_only' option into its distinct tokens, in canonical (FOLLOW_ON_TOKENS) order.
+    :param follow_on_to_only: a comma-separated list of follow-on tokens
+    :type follow_on_to_only: `str`
+    :return: the distinct tokens
+    :rtype: `Tuple[str, ...]`
+    :raises ValueError: If a token is not a valid follow-on token.
+    """
+    tokens = {this_token.strip() for this_token in follow_on_to_only.split(',')} - {''}
+    unknown_tokens = tokens - FOLLOW_ON_TOKENS.keys()
+    if unknown_tokens:
+        raise ValueError(f"Invalid follow-on tokens {sorted(unknown_tokens)}; "
+                         f"valid tokens are: {list(FOLLOW_ON_TOKENS)}")
+    return tuple(this_token for this_token in FOLLOW_ON_TOKENS if this_token in tokens)
+
+
+def escape_collection_chars(characters: str) -> str:
+    """
+    Escape characters for use inside a Vim '[...]' collection.
+    :param characters: literal characters
+    :type characters: `str`
+    :return: the escaped characters
+    :rtype: `str`
+    """
+    return ''.join('\\' + c if c in VIM_COLLECTION_SPECIAL_CHARS else c for c in characters)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_tokens(symbol_prefix: str, tokens: Tuple[str, ...]) -> ErrorHandler:
+    """
+    Compile a set of follow-on tokens into its error group (once; it is cached).
+    :param symbol_prefix: a prefix for the group names
+    :type symbol_prefix: `str`
+    :param tokens: distinct follow-on tokens, in canonical order
+    :type tokens: `Tuple[str, ...]`
+    :return: the error group
+    :rtype: `ErrorHandler`
+    """
+    group_name = symbol_prefix + 'Error_' + '_'.join(FOLLOW_ON_TOKENS[this_token][0] for this_token in tokens) \
+        + '_not_found'
+    characters = ''.join(FOLLOW_ON_TOKENS[this_token][1] for this_token in tokens)
+    if 'new_line' in tokens:
+        # a '[^...]' never matches the end of a line; blanks may come before it, but no other character.
+        # The group starts at the offending character, never at a blank before it: a child node that
+        # 'skipwhite' moves past the blanks starts there too
+        antipattern = r'\v[^' + BLANK_CHARS + escape_collection_chars(characters) + ']'
+    else:
+        antipattern = r'\v[^' + escape_collection_chars(characters) + ']'
+    return ErrorHandler(group_name, characters, antipattern)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_default(symbol_prefix: str) -> ErrorHandler:
+    """
+    Give the default error group, of the nodes without a 'follow_on_to_only' option (once; it is cached).
+    :param symbol_prefix: a prefix for the group names
+    :type symbol_prefix: `str`
+    :return: the error group
+    :rtype: `ErrorHandler`
+    """
+    # not '<prefix>Error': a corpus header or footer may define that group, with items of its own
+    return ErrorHandler(symbol_prefix + 'Error_unexpected', '', DEFAULT_ERROR_ANTIPATTERN)
+
+
+def compile_follow_on(symbol_prefix: str, follow_on_to_only: str) -> Optional[ErrorHandler]:
+    """
+    Give the error group of a 'follow_on_to_only' option.
+    :param symbol_prefix: a prefix for the group names
+    :type symbol_prefix: `str`
+    :param follow_on_to_only: a comma-separated list of follow-on tokens
+    :type follow_on_to_only: `str`
+    :return: the error group, None if the option lists no token (anything may follow)
+    :rtype: `Optional[ErrorHandler]`
+    :raises ValueError: If a token is not a valid follow-on token.
+    """
+    tokens = parse_follow_on_tokens(follow_on_to_only)
+    if not tokens:
+        return None
+    return compile_tokens(symbol_prefix, tokens)
@@ -0,0 +1,531 @@
+"""
+File: lsp_server.py
+Purpose: A language server (JSON-RPC over stdio, asyncio) serving semantic tokens lexed with the syntax tree.
+
+Usage: python src/lsp_server.py -f nftables [-c corpus]
+
+The syntax tree is loaded and its lexer compiled once, at start-up.  Supported:
+
+- initialize, initialized, shutdown, exit
+- textDocument/didOpen, textDocument/didChange (incremental or full), textDocument/didClose
+- textDocument/semanticTokens/full and textDocument/semanticTokens/full/delta
+
+A 'didChange' re-lexes only from the first changed line (see tree_document.py);
+a delta is one edit spanning the lines whose tokens changed.  Positions are
+UTF-16 code units, as LSP has them by default.
+"""
+import argparse
+import asyncio
+import bisect
+import contextlib
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import compact_tree
+import parse_simple_ini
+import syntax_tree
+import tree_compress
+import tree_lexer
+from tree_document import TextEdit, TreeDocument
+from tree_lexer import CompiledLexer, LineResult
+
+SERVER_NAME: str = 'one-syntax'
+# JSON-RPC error codes
+PARSE_ERROR: int = -32700
+INVALID_REQUEST: int = -32600
+METHOD_NOT_FOUND: int = -32601
+INVALID_PARAMS: int = -32602
+SERVER_NOT_INITIALIZED: int = -32002
+TEXT_DOCUMENT_SYNC_INCREMENTAL: int = 2
+# LSP semantic token type for the Vim highlight group a node is linked to (the first one found in its name)
+HIGHLIGHT_TOKEN_TYPES: Dict[str, str] = {
+    'Comment': 'comment',
+    'String': 'string',
+    'Character': 'string',
+    'Number': 'number',
+    'Float': 'number',
+    'Boolean': 'enumMember',
+    'Constant': 'enumMember',
+    'Identifier': 'variable',
+    'Function': 'function',
+    'Statement': 'keyword',
+    'Keyword': 'keyword',
+    'Conditional': 'keyword',
+    'Operator': 'operator',
+    'Delimiter': 'operator',
+    'Type': 'type',
+    'PreProc': 'macro',
+    'Define': 'macro',
+    'Special': 'macro',
+}
+TOKEN_TYPES: Tuple[str, ...] = tuple(dict.fromkeys(HIGHLIGHT_TOKEN_TYPES.values()))
+
+
+def token_type_rows(tree: compact_tree.CompactTree) -> List[int]:
+    """
+    Give the semantic token type (an index into TOKEN_TYPES) of every node, by its 'highlight_color_name'.
+    :param tree: a compact syntax tree
+    :type tree: `compact_tree.CompactTree`
+    :return: the token type of every row; -1 for a node that is not highlighted
+    :rtype: `List[int]`
+    """
+    row_types = []
+    for this_index in range(len(tree)):
+        highlight = tree.node(this_index).highlight_color_name
+        token_type = -1
+        if highlight is not None:
+            for this_highlight, this_token_type in HIGHLIGHT_TOKEN_TYPES.items():
+                if this_highlight in highlight:
+                    token_type = TOKEN_TYPES.index(this_token_type)
+                    break
+        row_types.append(token_type)
+    return row_types
+
+
+def utf16_length(text: str) -> int:
+    """
+    Measure a text in UTF-16 code units.
+    :param text: the text
+    :type text: `str`
+    :return: its length
+    :rtype: `int`
+    """
+    if text.isascii():
+        return len(text)
+    return len(text.encode('utf-16-le')) // 2
+
+
+def utf16_to_column(line: str, character: int) -> int:
+    """
+    Convert an LSP character offset (UTF-16 code units) into a column (characters) of a line.
+    :param line: the line
+    :type line: `str`
+    :param character: the character offset
+    :type character: `int`
+    :return: the column
+    :rtype: `int`
+    """
+    if line.isascii():
+        return character
+    units = 0
+    for this_column, this_char in enumerate(line):
+        if units >= character:
+            return this_column
+        units += 2 if ord(this_char) > 0xFFFF else 1
+    return len(line)
+
+
+class OpenDocument:
+    """
+    An open document, and the semantic tokens last sent for it.
+    """
+    __slots__ = ('document', 'version', 'result_id', 'sent_data', 'sent_offsets')
+
+    def __init__(self, document: TreeDocument, version: int) -> None:
+        self.document = document
+        self.version = version
+        self.result_id = 0
+        # the semantic tokens last sent, and where the tokens of each line start in them (then their end)
+        self.sent_data: List[int] = []
+        self.sent_offsets: List[int] = [0]
+
+
+class LanguageServer:
+    """
+    Serve the semantic tokens of open documents, lexed with one compiled lexer.
+    """
+
+    def __init__(self, lexer: CompiledLexer, verbose: bool = False) -> None:
+        self.lexer = lexer
+        self.row_types = token_type_rows(lexer.tree)
+        self.verbose = verbose
+        self.documents: Dict[str, OpenDocument] = {}
+        self.initialized = False
+        self.shutting_down = False
+        self.exit_code: Optional[int] = None
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            'initialize': self.initialize,
+            'initialized': lambda params: None,
+            'shutdown': self.shutdown,
+            'exit': self.exit,
+            'textDocument/didOpen': self.did_open,
+            'textDocument/didChange': self.did_change,
+            'textDocument/didClose': self.did_close,
+            'textDocument/semanticTokens/full': self.semantic_tokens_full,
+            'textDocument/semanticTokens/full/delta': self.semantic_tokens_delta,
+        }
+
+    def log(self, message: str) -> None:
+        """
+        Log to stderr (stdout carries the protocol), under --verbose.
+        :param message: the message
+        :type message: `str`
+        :return: None
+        :rtype: `None`
+        """
+        if self.verbose:
+            print(f"{SERVER_NAME}: {message}", file=sys.stderr, flush=True)
+
+    def initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Answer 'initialize' with the capabilities of this server.
+        """
+        self.initialized = True
+        return {
+            'capabilities': {
+                'positionEncoding': 'utf-16',
+                'textDocumentSync': {'openClose': True, 'change': TEXT_DOCUMENT_SYNC_INCREMENTAL},
+                'semanticTokensProvider': {
+                    'legend': {'tokenTypes': list(TOKEN_TYPES), 'tokenModifiers': []},
+                    'full': {'delta': True},
+                },
+            },
+            'serverInfo': {'name': SERVER_NAME},
+        }
+
+    def shutdown(self, params: Optional[Dict[str, Any]]) -> None:
+        """
+        Answer 'shutdown'; only 'exit' may follow.
+        """
+        self.shutting_down = True
+
+    def exit(self, params: Optional[Dict[str, Any]]) -> None:
+        """
+        Stop serving; the exit code tells if 'shutdown' came first.
+        """
+        self.exit_code = 0 if self.shutting_down else 1
+
+    def did_open(self, params: Dict[str, Any]) -> None:
+        """
+        Lex a newly opened document.
+        """
+        text_document = params['textDocument']
+        start_time = time.perf_counter()
+        document = TreeDocument(self.lexer, text_document['text'])
+        self.documents[text_document['uri']] = OpenDocument(document, text_document.get('version', 0))
+        self.log(f"opened {text_document['uri']}: lexed {len(document.lines)} lines in "
+                 f"{(time.perf_counter() - start_time) * 1000:.2f} ms")
+
+    def did_change(self, params: Dict[str, Any]) -> None:
+        """
+        Apply the changes to a document, then re-lex it from the first changed line.
+        """
+        open_document = self.documents[params['textDocument']['uri']]
+        document = open_document.document
+        start_time = time.perf_counter()
+        for this_change in params['contentChanges']:
+            change_range = this_change.get('range')
+            if change_range is None:
+                # the whole text
+                document.apply_edit(TextEdit(0, 0, len(document.lines), 0, this_change['text']))
+                continue
+            start, end = change_range['start'], change_range['end']
+            lines = document.lines
+            start_column = utf16_to_column(lines[start['line']], start['character']) \
+                if start['line'] < len(lines) else 0
+            end_column = utf16_to_column(lines[end['line']], end['character']) if end['line'] < len(lines) else 0
+            document.apply_edit(TextEdit(start['line'], start_column, end['line'], end_column, this_change['text']))
+        relexed_start, relexed_stop = document.relex()
+        open_document.version = params['textDocument'].get('version', open_document.version)
+        self.log(f"changed {params['textDocument']['uri']}: re-lexed lines {relexed_start + 1}-{relexed_stop} in "
+                 f"{(time.perf_counter() - start_time) * 1000:.2f} ms")
+
+    def did_close(self, params: Dict[str, Any]) -> None:
+        """
+        Forget a closed document.
+        """
+        self.documents.pop(params['textDocument']['uri'], None)
+
+    def encode_line(self, line: str, line_result: LineResult) -> List[Tuple[int, int, int]]:
+        """
+        Give the highlighted tokens of a line, in UTF-16 code units.
+        :param line: the line
+        :type line: `str`
+        :param line_result: its lexing
+        :type line_result: `LineResult`
+        :return: (start, length, token type) triples
+        :rtype: `List[Tuple[int, int, int]]`
+        """
+        row_types = self.row_types
+        is_ascii = line.isascii()
+        triples = []
+        for this_token in line_result.tokens:
+            token_type = row_types[this_token.row]
+            if token_type < 0:
+                continue
+            if is_ascii:
+                triples.append((this_token.start, this_token.end - this_token.start, token_type))
+            else:
+                start = utf16_length(line[:this_token.start])
+                triples.append((start, utf16_length(line[this_token.start:this_token.end]), token_type))
+        return triples
+
+    def encode_lines(self, document: TreeDocument, start: int, stop: int, previous_line: int,
+                     line_offsets: Optional[List[int]] = None) -> List[int]:
+        """
+        Encode the semantic tokens of a range of lines, relatively to the token before them.
+        :param document: the document
+        :type document: `TreeDocument`
+        :param start: the first line
+        :type start: `int`
+        :param stop: the line after the last one
+        :type stop: `int`
+        :param previous_line: the line of the token before them (0 if none)
+        :type previous_line: `int`
+        :param line_offsets: if given, collects where the encoding of each line starts (relative to the first)
+        :type line_offsets: `Optional[List[int]]`
+        :return: the LSP encoding (5 integers per token)
+        :rtype: `List[int]`
+        """
+        data: List[int] = []
+        lines = document.lines
+        line_results = document.line_results
+        for this_index in range(start, stop):
+            if line_offsets is not None:
+                line_offsets.append(len(data))
+            previous_start = 0
+            for this_start, this_length, this_type in self.encode_line(lines[this_index], line_results[this_index]):
+                data.extend((this_index - previous_line, this_start - previous_start, this_length, this_type, 0))
+                previous_line, previous_start = this_index, this_start
+        return data
+
+    def send_result(self, open_document: OpenDocument, data: List[int], line_offsets: List[int]) -> str:
+        """
+        Remember the tokens sent, to compute the next delta against.
+        :return: the result id
+        """
+        open_document.result_id += 1
+        open_document.sent_data = data
+        open_document.sent_offsets = line_offsets
+        return str(open_document.result_id)
+
+    def semantic_tokens_full(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Answer all the semantic tokens of a document.
+        """
+        open_document = self.documents[params['textDocument']['uri']]
+        document = open_document.document
+        document.take_changes()
+        line_offsets: List[int] = []
+        data = self.encode_lines(document, 0, len(document.lines), 0, line_offsets)
+        line_offsets.append(len(data))
+        return {'resultId': self.send_result(open_document, list(data), line_offsets), 'data': data}
+
+    def semantic_tokens_delta(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Answer the semantic tokens of a document as one edit of those last sent.
+        """
+        open_document = self.documents[params['textDocument']['uri']]
+        if params.get('previousResultId') != str(open_document.result_id):
+            # not the last result sent: only the whole of the tokens will do
+            return self.semantic_tokens_full(params)
+        document = open_document.document
+        sent_data = open_document.sent_data
+        sent_offsets = open_document.sent_offsets  # where each line starts in sent_data, and its end
+        old_line_count = len(sent_offsets) - 1
+        new_line_count = len(document.lines)
+        # the lines [prefix, len - suffix) changed, in the old and in the new text
+        prefix, suffix = document.take_changes()
+        prefix = min(prefix, old_line_count)
+        suffix = min(suffix, old_line_count - prefix)
+        old_stop, new_stop = old_line_count - suffix, new_line_count - suffix
+
+        start_offset = sent_offsets[prefix]
+        delete_count = sent_offsets[old_stop] - start_offset
+        # the line of the last token before the changed lines: the last line whose encoding is not empty
+        previous_line = max(bisect.bisect_left(sent_offsets, start_offset) - 1, 0)
+        changed_offsets: List[int] = []
+        edit_data = self.encode_lines(document, prefix, new_stop, previous_line, changed_offsets)
+        if edit_data:
+            last_changed_line = prefix + bisect.bisect_left(changed_offsets, len(edit_data)) - 1
+        else:
+            last_changed_line = previous_line
+        # an unchanged line keeps its encoding, but the first token after the changed lines is relative to
+        # the token before it: it is re-encoded too
+        next_old_line = bisect.bisect_right(sent_offsets, sent_offsets[old_stop]) - 1
+        if next_old_line < old_line_count:
+            next_line = next_old_line - old_stop + new_stop
+            edit_data.extend(self.encode_lines(document, next_line, next_line + 1, last_changed_line)[:5])
+            delete_count += 5
+
+        sent_data[start_offset:start_offset + delete_count] = edit_data
+        shift = len(edit_data) - delete_count
+        line_offsets = sent_offsets[:prefix]
+        line_offsets.extend(start_offset + this_offset for this_offset in changed_offsets)
+        line_offsets.extend(this_offset + shift for this_offset in sent_offsets[old_stop:])
+        edits = [{'start': start_offset, 'deleteCount': delete_count, 'data': edit_data}]
+        return {'resultId': self.send_result(open_document, sent_data, line_offsets), 'edits': edits}
+
+    def handle(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Handle one request or notification.
+        :param message: the JSON-RPC message
+        :type message: `Dict[str, Any]`
+        :return: the response to a request, None for a notification
+        :rtype: `Optional[Dict[str, Any]]`
+        """
+        method = message.get('method')
+        message_id = message.get('id')
+        handler = self.handlers.get(method) if isinstance(method, str) else None
+        error: Optional[Tuple[int, str]] = None
+        result = None
+        if handler is None:
+            error = (METHOD_NOT_FOUND, f"Method not found: {method}")
+        elif not self.initialized and method not in ('initialize', 'exit'):
+            error = (SERVER_NOT_INITIALIZED, 'Server not initialized')
+        else:
+            try:
+                result = handler(message.get('params') or {})
+            except (KeyError, IndexError, TypeError, ValueError) as this_error:
+                error = (INVALID_PARAMS, f"{method}: {this_error!r}")
+        if message_id is None:
+            if error is not None and error[0] != METHOD_NOT_FOUND:
+                self.log(error[1])
+            return None
+        if error is not None:
+            return {'jsonrpc': '2.0', 'id': message_id, 'error': {'code': error[0], 'message': error[1]}}
+        return {'jsonrpc': '2.0', 'id': message_id, 'result': result}
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """
+    Read one 'Content-Length'-framed JSON-RPC message.
+    :param reader: the input stream
+    :type reader: `asyncio.StreamReader`
+    :return: the message, None at the end of the input
+    :rtype: `Optional[Dict[str, Any]]`
+    """
+    content_length = None
+    while True:
+        header = await reader.readline()
+        if not header:
+            return None
+        header = header.strip()
+        if not header:
+            break
+        name, _, value = header.decode('ascii').partition(':')
+        if name.strip().lower() == 'content-length':
+            content_length = int(value.strip())
+    if content_length is None:
+        raise ValueError('a message without Content-Length')
+    return json.loads(await reader.readexactly(content_length))
+
+
+def write_message(writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+    """
+    Write one 'Content-Length'-framed JSON-RPC message.
+    :param writer: the output stream
+    :type writer: `asyncio.StreamWriter`
+    :param message: the message
+    :type message: `Dict[str, Any]`
+    :return: None
+    :rtype: `None`
+    """
+    body = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    writer.write(b'Content-Length: ' + str(len(body)).encode('ascii') + b'\r\n\r\n' + body)
+
+
+async def serve(server: LanguageServer, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> int:
+    """
+    Serve messages until 'exit' or the end of the input.
+    :param server: the language server
+    :type server: `LanguageServer`
+    :param reader: the input stream
+    :type reader: `asyncio.StreamReader`
+    :param writer: the output stream
+    :type writer: `asyncio.StreamWriter`
+    :return: the exit code
+    :rtype: `int`
+    """
+    while server.exit_code is None:
+        try:
+            message = await read_message(reader)
+        except (ValueError, asyncio.IncompleteReadError) as this_error:
+            write_message(writer, {'jsonrpc': '2.0', 'id': None,
+                                   'error': {'code': PARSE_ERROR, 'message': str(this_error)}})
+            await writer.drain()
+            continue
+        if message is None:
+            return 1
+        if not isinstance(message, dict):
+            write_message(writer, {'jsonrpc': '2.0', 'id': None,
+                                   'error': {'code': INVALID_REQUEST, 'message': 'not a JSON-RPC message'}})
+            continue
+        response = server.handle(message)
+        if response is not None:
+            write_message(writer, response)
+            await writer.drain()
+    return server.exit_code
+
+
+async def open_stdio() -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """
+    Wrap stdin and stdout into asyncio streams.
+    :return: the input and output streams
+    :rtype: `Tuple[asyncio.StreamReader, asyncio.StreamWriter]`
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout.buffer)
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    return reader, writer
+
+
+def load_lexer(corpus_dirpath: Path, file_format: str) -> CompiledLexer:
+    """
+    Load the syntax tree of a file format and compile its lexer.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param file_format: the file format
+    :type file_format: `str`
+    :return: the lexer
+    :rtype: `CompiledLexer`
+    :raises ValueError: If the main options lack 'symbol_name_prefix'.
+    """
+    tree_dirpath = corpus_dirpath / file_format / 'syntax-tree'
+    symbol_prefix = parse_simple_ini.get_main_options(tree_dirpath).get('symbol_name_prefix')
+    if symbol_prefix is None:
+        raise ValueError(f"Missing required main option 'symbol_name_prefix' in {tree_dirpath}/.config.main.ini")
+    tree, _ = tree_compress.compress(syntax_tree.load(tree_dirpath, symbol_prefix))
+    return tree_lexer.compile_lexer(tree)
+
+
+async def run(args: argparse.Namespace) -> int:
+    """
+    Load the lexer once, then serve over stdio.
+    :param args: the command line arguments
+    :type args: `argparse.Namespace`
+    :return: the exit code
+    :rtype: `int`
+    """
+    # stdout carries the protocol: whatever loading the syntax tree prints goes to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        lexer = load_lexer(args.corpus, args.file_type)
+    server = LanguageServer(lexer, args.verbose)
+    reader, writer = await open_stdio()
+    return await serve(server, reader, writer)
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+    :param argv: the arguments (default is those of the command line)
+    :type argv: `Optional[Sequence[str]]`
+    :return: the parsed arguments
+    :rtype: `argparse.Namespace`
+    """
+    parser = argparse.ArgumentParser(description='Language server (stdio) serving semantic tokens of a syntax tree')
+    parser.add_argument('-f', '--file-type', metavar='file_type', type=str, required=True,
+                        help='File format (the directory name under the corpus)')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, required=False, default=Path('corpus'),
+                        help='Corpus directory (default is ./corpus)')
+    parser.add_argument('-v', '--verbose', action='store_true', required=False, help='Log to stderr')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run(parse_args())))
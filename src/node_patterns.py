@@ -0,0 +1,78 @@
+"""
+File: node_patterns.py
+Purpose: The Vim very-magic ('\v') pattern that each node of the syntax tree matches, and the order of sibling nodes.
+
+Both the Vimscript emitter and the in-process lexer read node patterns from here,
+so that they accept exactly the same text.
+"""
+from typing import List, Optional, Sequence
+
+import pattern_specificity
+from compact_tree import CompactNode, FLAG_SQUISHABLE_GIVEN
+
+# Also, one other thing: do NOT USE '\s'; use '[ \t]'...  too many syntax options differentiate those
+OPTIONAL_WHITESPACE_REGEX: str = '[ \\t]{0,5}'
+REQUIRED_WHITESPACE_REGEX: str = '[ \\t]{1,5}'
+
+
+def option_regex(node: CompactNode) -> Optional[str]:
+    """
+    Give the 'pattern' option of a node, unquoted.
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :return: a Vim very-magic regex (without the leading '\\v'), None if the node has no 'pattern' option
+    :rtype: `Optional[str]`
+    """
+    if node.pattern is None:
+        return None
+    return node.pattern.rstrip('\'').lstrip('\'')
+
+
+def match_regex(node: CompactNode, default_regex: Optional[str] = None) -> str:
+    """
+    Give the regex that the 'syntax match' of a node matches: its pattern, then the whitespace after it.
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :param default_regex: the regex to use when the node has no 'pattern' option (default: its name)
+    :type default_regex: `Optional[str]`
+    :return: a Vim very-magic regex (without the leading '\\v')
+    :rtype: `str`
+    """
+    regex = option_regex(node)
+    if regex is None:
+        regex = node.name if default_regex is None else default_regex
+    # 'skipwhite' Vimscript syntax option is mostly useless here (only does '\s*' or not)
+    # for a deterministic syntax pathway, we default to 'atleastwhitespace' '\s+', so we do this in regex
+    if node.has_options:
+        # Pretty much always expect a space after each keyword so make that its default
+        # (any 'squishable_with_next_token' value given, even '0', has always made the whitespace optional)
+        if node.flags & FLAG_SQUISHABLE_GIVEN:
+            regex += OPTIONAL_WHITESPACE_REGEX
+        else:
+            regex += REQUIRED_WHITESPACE_REGEX
+    return regex
+
+
+def node_specificity(node: CompactNode) -> pattern_specificity.Specificity:
+    """
+    Score how specific the pattern of a node is (its 'pattern' option, else its literal name).
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :return: its specificity
+    :rtype: `pattern_specificity.Specificity`
+    """
+    regex = option_regex(node)
+    if regex is not None:
+        return pattern_specificity.score(regex)
+    return pattern_specificity.score_literal(node.name)
+
+
+def order_by_specificity(nodes: Sequence[CompactNode]) -> List[CompactNode]:
+    """
+    Sort sibling nodes, most specific firstly (README items 5 and 6); ties go by name, for a stable output.
+    :param nodes: sibling nodes of the syntax tree
+    :type nodes: `Sequence[CompactNode]`
+    :return: the nodes, most specific firstly
+    :rtype: `List[CompactNode]`
+    """
+    return sorted(nodes, key=lambda this_node: (node_specificity(this_node).sort_key(), this_node.name))
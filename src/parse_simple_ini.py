@@ -1,8 +1,15 @@
 """
 Configuration file and its settings
 """
+import os
 import pathlib
-from typing import Dict
+from collections import OrderedDict
+from typing import Dict, Iterable, Mapping, NamedTuple, Optional
+
+import build_profile
+
+# Upper bound of node config files kept parsed in memory (least recently used are evicted)
+CONFIG_CACHE_MAX_ENTRIES: int = 4096
 
 
 def read(file_path: pathlib.Path) -> Dict[str, str]:
@@ -102,19 +109,33 @@ def get_node_options(path: pathlib.Path) -> Dict[str, str]:
         raise NotADirectoryError(f"Path '{path}' is not a directory.")
     # Check for .config.ini file in directory
     node_config_path = path / '.config.ini'
-    if not node_config_path.exists():
+    try:
+        return read_node_config(node_config_path)
+    except FileNotFoundError:
         # No config file, return empty dictionary
         return {}
-    # Read config file
-    retrieved_node_config_options = read(node_config_path)
+
+
+def validate_node_options(node_options: Dict[str, str], node_config_path: pathlib.Path) -> None:
+    """
+    Validates node options already read from a node's configuration file.
+
+    :param node_options: Dictionary of node options.
+    :type node_options: `Dict[str, str]`
+    :param node_config_path: Path to the configuration file (used in error messages).
+    :type node_config_path: `pathlib.Path`
+    :return: None
+    :rtype: `None`
+    :raises ValueError: If an invalid option or follow-on token is found.
+    """
     # enforce valid options in syntax tree's config.ini file.
-    for this_node_option in retrieved_node_config_options:
+    for this_node_option in node_options:
         # Validate option name
         if this_node_option not in valid_node_options:
             raise ValueError(f"Invalid option '{this_node_option}' in config {node_config_path} file.")
         # Validate follow-on tokens if present
-        if this_node_option == 'follow_on_to_only' and retrieved_node_config_options['follow_on_to_only']:
-            tokens = retrieved_node_config_options['follow_on_to_only'].split(',')
+        if this_node_option == 'follow_on_to_only' and node_options['follow_on_to_only']:
+            tokens = node_options['follow_on_to_only'].split(',')
             # Validate further
             for token in tokens:
                 # Strip whitespace
@@ -125,4 +146,104 @@ def get_node_options(path: pathlib.Path) -> Dict[str, str]:
                         f"Invalid follow-on token '{token}' in config {node_config_path} file. "
                         f"Valid tokens are: {valid_node_follow_on_options}"
                     )
-    return retrieved_node_config_options
+
+
+class ConfigCacheEntry(NamedTuple):
+    """
+    A parsed and validated node config file, along with the stats it was read with.
+    """
+    mtime_ns: int
+    size: int
+    generation: int
+    options: Dict[str, str]
+
+
+config_cache: "OrderedDict[str, ConfigCacheEntry]" = OrderedDict()
+config_cache_generation: int = 0
+
+
+def new_config_cache_generation() -> None:
+    """
+    Have every cached config file re-validated (by its stats) the next time it is looked up.
+
+    Within one generation, a config file is stat'ed and validated at most once; a resident
+    process (e.g. watch mode) starts a new generation before each rebuild.
+    :return: None
+    :rtype: `None`
+    """
+    global config_cache_generation
+    config_cache_generation += 1
+
+
+def read_node_config(node_config_path: pathlib.Path,
+                     stat_result: Optional[os.stat_result] = None) -> Dict[str, str]:
+    """
+    Reads and validates a node configuration file, at most once for as long as it is unchanged.
+
+    Parsed files are cached by (path, mtime_ns, size); the returned dictionary is shared
+    with the cache and must not be modified.
+    :param node_config_path: Path to the configuration file.
+    :type node_config_path: `pathlib.Path`
+    :param stat_result: the stats of the configuration file, if already known
+    :type stat_result: `Optional[os.stat_result]`
+    :return: Dictionary of node options.
+    :rtype: `Dict[str, str]`
+    :raises FileNotFoundError: If the specified file does not exist.
+    :raises ValueError: If an invalid option or follow-on token is found.
+    """
+    cache_key = str(node_config_path)
+    cached_entry = config_cache.get(cache_key)
+    # already validated during this generation: no need to even stat it
+    if cached_entry is not None and cached_entry.generation == config_cache_generation:
+        config_cache.move_to_end(cache_key)
+        if build_profile.enabled:
+            build_profile.count_call('config cache hits')
+        return cached_entry.options
+
+    if stat_result is None:
+        if build_profile.enabled:
+            build_profile.count_call('stat')
+        stat_result = os.stat(node_config_path)
+    if (cached_entry is not None and cached_entry.mtime_ns == stat_result.st_mtime_ns
+            and cached_entry.size == stat_result.st_size):
+        config_cache[cache_key] = cached_entry._replace(generation=config_cache_generation)
+        config_cache.move_to_end(cache_key)
+        if build_profile.enabled:
+            build_profile.count_call('config cache hits')
+        return cached_entry.options
+
+    if build_profile.enabled:
+        build_profile.count_call('config cache misses')
+        build_profile.count_call('open')
+    node_options = read(node_config_path)
+    validate_node_options(node_options, node_config_path)
+    config_cache[cache_key] = ConfigCacheEntry(mtime_ns=stat_result.st_mtime_ns, size=stat_result.st_size,
+                                               generation=config_cache_generation, options=node_options)
+    config_cache.move_to_end(cache_key)
+    while len(config_cache) > CONFIG_CACHE_MAX_ENTRIES:
+        config_cache.popitem(last=False)
+    return node_options
+
+
+def load_many(node_config_paths: Iterable[pathlib.Path],
+              stat_results: Optional[Mapping[pathlib.Path, os.stat_result]] = None) \
+        -> Dict[pathlib.Path, Dict[str, str]]:
+    """
+    Reads and validates many node configuration files through the config cache.
+
+    Each file goes through `read_node_config()`: it is opened and parsed at most once for as
+    long as it is unchanged, and stat'ed at most once per cache generation.
+    :param node_config_paths: Paths to the configuration files.
+    :type node_config_paths: `Iterable[pathlib.Path]`
+    :param stat_results: the stats of the configuration files already known (e.g. from a directory listing)
+    :type stat_results: `Optional[Mapping[pathlib.Path, os.stat_result]]`
+    :return: Dictionary of node options, keyed by configuration file path.
+    :rtype: `Dict[pathlib.Path, Dict[str, str]]`
+    :raises FileNotFoundError: If a specified file does not exist.
+    :raises ValueError: If an invalid option or follow-on token is found.
+    """
+    all_node_options: Dict[pathlib.Path, Dict[str, str]] = {}
+    for this_node_config_path in node_config_paths:
+        all_node_options[this_node_config_path] = read_node_config(
+            this_node_config_path, None if stat_results is None else stat_results.get(this_node_config_path))
+    return all_node_options
@@ -0,0 +1,330 @@
+"""
+File: pattern_cost.py
+Purpose: Score how expensive the Vim very-magic ('\v') node patterns are, before they are emitted.
+
+Vim tries a 'syntax match' regex at every column it may match at, on every
+redraw; a backtracking-prone pattern makes it lag on every keystroke.  This
+static analysis flags the usual suspects:
+
+- nested quantifiers, e.g. '(a+)*' (exponential backtracking when both are unbounded)
+- overlapping alternations, e.g. '(a|ab)', the worse when repeated
+- an unanchored leading '.*', which is retried from every column
+- a '.*' with more pattern after it, e.g. '^.*foo', which backtracks over the rest of the line
+- repetition without an upper bound, e.g. '*', '+' or '{1,}'
+
+A construct is reported once: the repetitions within nested unbounded
+quantifiers, and a repeated overlapping alternation, are not reported again
+on their own.
+"""
+import re
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from compact_tree import CompactTree, FLAG_BACK_REFERENCE, NO_STRING
+
+ATOM_COST: int = 1
+UNBOUNDED_REPETITION_COST: int = 10
+LEADING_ANY_REPETITION_COST: int = 50
+BACKTRACKING_ANY_REPETITION_COST: int = 30
+OVERLAPPING_ALTERNATION_COST: int = 20
+REPEATED_OVERLAPPING_ALTERNATION_COST: int = 100
+NESTED_QUANTIFIER_COST: int = 40
+NESTED_UNBOUNDED_QUANTIFIER_COST: int = 200
+
+DIGITS = frozenset('0123456789')
+LOWERCASE_LETTERS = frozenset('abcdefghijklmnopqrstuvwxyz')
+UPPERCASE_LETTERS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+LETTERS = LOWERCASE_LETTERS | UPPERCASE_LETTERS
+# the characters that the character class escapes of Vim match (None: too many to tell apart)
+CHARACTER_CLASS_CHARS: Dict[str, Optional[FrozenSet[str]]] = {
+    's': frozenset(' \t'),
+    'd': DIGITS,
+    'w': LETTERS | DIGITS | {'_'},
+    'a': LETTERS,
+    'l': LOWERCASE_LETTERS,
+    'u': UPPERCASE_LETTERS,
+    'x': DIGITS | frozenset('abcdefABCDEF'),
+    'o': frozenset('01234567'),
+    'h': LETTERS | {'_'},
+}
+NEGATED_CHARACTER_CLASSES: str = 'SDWALUXOHiIkKfFpP'
+# zero-width atoms of very-magic mode (anchors)
+ZERO_WIDTH_ATOMS: str = '^$<>'
+UNBOUNDED_REPETITION: str = 'repetition without an upper bound'
+OVERLAPPING_ALTERNATION: str = 'overlapping alternation: alternatives may start alike'
+# what may follow an atom without matching anything: closing groups, zero-width atoms, '\zs' and '\ze'
+ZERO_WIDTH_REGEX = re.compile(r'(?:\)|[$<>]|\\z[se])*')
+
+
+class Atom(NamedTuple):
+    """
+    One parsed atom (a character, a class or a group), with its quantifier applied.
+    """
+    first_chars: Optional[FrozenSet[str]]  # the characters it may start with; None for (nearly) any
+    can_be_empty: bool
+    has_quantifier: bool  # it is quantified, or contains a quantified atom
+    has_unbounded_quantifier: bool
+    has_overlapping_alternation: bool
+
+
+class Finding(NamedTuple):
+    """
+    One costly construct found in a pattern.
+    """
+    offset: int  # index into the pattern
+    cost: int
+    description: str
+
+
+class PatternCost(NamedTuple):
+    """
+    The cost of one pattern, and where it is used.
+    """
+    pattern: str
+    cost: int
+    findings: Tuple[Finding, ...]
+    node_paths: Tuple[str, ...]
+
+
+def bracket_class_chars(pattern: str, start: int) -> Tuple[Optional[FrozenSet[str]], int]:
+    """
+    Read a '[...]' collection.
+    :param pattern: a Vim very-magic pattern
+    :type pattern: `str`
+    :param start: index of the opening '['
+    :type start: `int`
+    :return: the characters it matches (None if negated), and the index after its closing ']'
+    :rtype: `Tuple[Optional[FrozenSet[str]], int]`
+    """
+    i = start + 1
+    negated = i < len(pattern) and pattern[i] == '^'
+    if negated:
+        i += 1
+    chars = set()
+    first = True
+    while i < len(pattern) and (pattern[i] != ']' or first):
+        first = False
+        if pattern[i] == '\\' and i + 1 < len(pattern):
+            chars |= CHARACTER_CLASS_CHARS.get(pattern[i + 1]) or {pattern[i + 1]}
+            i += 2
+        elif i + 2 < len(pattern) and pattern[i + 1] == '-' and pattern[i + 2] != ']':
+            chars |= {chr(c) for c in range(ord(pattern[i]), ord(pattern[i + 2]) + 1)}
+            i += 3
+        else:
+            chars.add(pattern[i])
+            i += 1
+    return (None if negated else frozenset(chars)), i + 1
+
+
+def quantifier_bounds(pattern: str, i: int) -> Tuple[Optional[Tuple[int, Optional[int]]], int]:
+    """
+    Read a quantifier, if any.
+    :param pattern: a Vim very-magic pattern
+    :type pattern: `str`
+    :param i: index to read at
+    :type i: `int`
+    :return: None if there is no quantifier, else its (minimum, maximum or None if unbounded);
+             and the index after it
+    :rtype: `Tuple[Optional[Tuple[int, Optional[int]]], int]`
+    """
+    if i >= len(pattern):
+        return None, i
+    if pattern[i] == '*':
+        return (0, None), i + 1
+    if pattern[i] == '+':
+        return (1, None), i + 1
+    if pattern[i] in '?=':
+        return (0, 1), i + 1
+    if pattern[i] == '{':
+        end = pattern.find('}', i)
+        if end < 0:
+            return None, i
+        # '{-n,m}' is the non-greedy form
+        bounds = pattern[i + 1:end].lstrip('-').split(',')
+        try:
+            minimum = int(bounds[0]) if bounds[0] else 0
+            if len(bounds) == 1:
+                # '{n}' is exactly n; '{}' is as many as possible
+                return (minimum, minimum if bounds[0] else None), end + 1
+            return (minimum, int(bounds[1]) if bounds[1] else None), end + 1
+        except ValueError:
+            return None, i
+    return None, i
+
+
+def sequence_first_chars(atoms: List[Atom]) -> Tuple[Optional[FrozenSet[str]], bool]:
+    """
+    Give the characters a sequence of atoms may start with.
+    :param atoms: a sequence of atoms
+    :type atoms: `List[Atom]`
+    :return: the characters (None for nearly any), and whether the whole sequence can be empty
+    :rtype: `Tuple[Optional[FrozenSet[str]], bool]`
+    """
+    first_chars: FrozenSet[str] = frozenset()
+    for this_atom in atoms:
+        if this_atom.first_chars is None:
+            return None, False
+        first_chars |= this_atom.first_chars
+        if not this_atom.can_be_empty:
+            return first_chars, False
+    return first_chars, True
+
+
+def analyze(pattern: str) -> Tuple[int, Tuple[Finding, ...]]:
+    """
+    Score the cost of a Vim very-magic pattern.
+    :param pattern: a Vim very-magic pattern (without the leading '\\v')
+    :type pattern: `str`
+    :return: its cost, and the costly constructs found in it
+    :rtype: `Tuple[int, Tuple[Finding, ...]]`
+    """
+    findings: List[Finding] = []
+    atom_count = 0
+    is_anchored = pattern.startswith('^')
+    # each frame: the start offset of a group, and its alternatives so far (the last one being parsed)
+    frames: List[Tuple[int, List[List[Atom]]]] = [(0, [[]])]
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        atom_offset = i
+        atom: Optional[Atom] = None
+        if c == '\\' and i + 1 < len(pattern):
+            escaped = pattern[i + 1]
+            if escaped == '_' and i + 2 < len(pattern):
+                # '\_x': the class x, or any character ('\_.'), plus the end of a line
+                class_name = pattern[i + 2]
+                atom = Atom(None if class_name == '.' else CHARACTER_CLASS_CHARS.get(class_name),
+                            False, False, False, False)
+                i += 3
+            elif escaped == 'z' and i + 2 < len(pattern):
+                # '\zs', '\ze' and such: zero-width
+                i += 3
+                continue
+            else:
+                chars = CHARACTER_CLASS_CHARS.get(escaped)
+                if chars is None and escaped not in NEGATED_CHARACTER_CLASSES:
+                    chars = frozenset(escaped)
+                atom = Atom(chars, False, False, False, False)
+                i += 2
+        elif c == '[':
+            chars, i = bracket_class_chars(pattern, i)
+            atom = Atom(chars, False, False, False, False)
+        elif c == '.':
+            atom = Atom(None, False, False, False, False)
+            i += 1
+        elif c == '(' or (c == '%' and pattern.startswith('%(', i)):
+            i += 1 if c == '(' else 2
+            frames.append((atom_offset, [[]]))
+            continue
+        elif c == '|':
+            frames[-1][1].append([])
+            i += 1
+            continue
+        elif c == ')' and len(frames) > 1:
+            group_offset, alternatives = frames.pop()
+            atom_offset = group_offset
+            i += 1
+            alternative_firsts = [sequence_first_chars(this_alternative) for this_alternative in alternatives]
+            has_overlap = False
+            for this_index, (these_chars, _) in enumerate(alternative_firsts):
+                for those_chars, _ in alternative_firsts[this_index + 1:]:
+                    if these_chars is None or those_chars is None or these_chars & those_chars:
+                        has_overlap = True
+            if has_overlap:
+                findings.append(Finding(group_offset, OVERLAPPING_ALTERNATION_COST, OVERLAPPING_ALTERNATION))
+            first_chars: Optional[FrozenSet[str]] = frozenset()
+            for these_chars, _ in alternative_firsts:
+                first_chars = None if (first_chars is None or these_chars is None) else first_chars | these_chars
+            atom = Atom(first_chars, any(can_be_empty for _, can_be_empty in alternative_firsts),
+                        any(this_atom.has_quantifier for this_alternative in alternatives
+                            for this_atom in this_alternative),
+                        any(this_atom.has_unbounded_quantifier for this_alternative in alternatives
+                            for this_atom in this_alternative),
+                        has_overlap)
+        elif c in ZERO_WIDTH_ATOMS:
+            i += 1
+            continue
+        else:
+            # a quantifier with nothing to repeat is taken literally
+            atom = Atom(frozenset(c), False, False, False, False)
+            i += 1
+
+        atom_count += 1
+        bounds, i = quantifier_bounds(pattern, i)
+        if bounds is not None:
+            minimum, maximum = bounds
+            is_unbounded = maximum is None
+            is_nested_unbounded = is_unbounded and atom.has_unbounded_quantifier
+            if atom.has_quantifier:
+                if is_nested_unbounded:
+                    # it covers the unbounded repetitions within the atom
+                    findings = [this_finding for this_finding in findings
+                                if not (this_finding.description == UNBOUNDED_REPETITION
+                                        and atom_offset <= this_finding.offset < i)]
+                    findings.append(Finding(atom_offset, NESTED_UNBOUNDED_QUANTIFIER_COST,
+                                            'nested unbounded quantifiers (catastrophic backtracking)'))
+                else:
+                    findings.append(Finding(atom_offset, NESTED_QUANTIFIER_COST, 'nested quantifiers'))
+            if atom.has_overlapping_alternation and (is_unbounded or (maximum or 0) > 1):
+                # it covers the overlapping alternation of the atom
+                findings = [this_finding for this_finding in findings
+                            if not (this_finding.description == OVERLAPPING_ALTERNATION
+                                    and this_finding.offset == atom_offset)]
+                findings.append(Finding(atom_offset, REPEATED_OVERLAPPING_ALTERNATION_COST,
+                                        'repeated overlapping alternation'))
+            if is_unbounded and not is_nested_unbounded:
+                if atom.first_chars is None and not is_anchored and len(frames) == 1 \
+                        and frames[0][1] == [[]]:
+                    findings.append(Finding(atom_offset, LEADING_ANY_REPETITION_COST,
+                                            "unanchored leading '.*' (retried from every column)"))
+                elif atom.first_chars is None \
+                        and pattern[ZERO_WIDTH_REGEX.match(pattern, i).end():][:1] not in ('', '|'):
+                    findings.append(Finding(atom_offset, BACKTRACKING_ANY_REPETITION_COST,
+                                            "'.*' with more pattern after it (backtracks over the rest of the line)"))
+                else:
+                    findings.append(Finding(atom_offset, UNBOUNDED_REPETITION_COST, UNBOUNDED_REPETITION))
+            atom = atom._replace(can_be_empty=atom.can_be_empty or minimum == 0, has_quantifier=True,
+                                 has_unbounded_quantifier=atom.has_unbounded_quantifier or is_unbounded)
+        frames[-1][1][-1].append(atom)
+
+    return atom_count * ATOM_COST + sum(this_finding.cost for this_finding in findings), tuple(findings)
+
+
+def analyze_tree(tree: CompactTree) -> List[PatternCost]:
+    """
+    Score every distinct 'pattern' option of a syntax tree.
+    :param tree: the compact syntax tree
+    :type tree: `CompactTree`
+    :return: the pattern costs, most expensive firstly
+    :rtype: `List[PatternCost]`
+    """
+    pattern_paths: Dict[str, List[str]] = {}
+    for this_row in range(len(tree)):
+        pattern_id = tree.pattern_ids[this_row]
+        if pattern_id == NO_STRING or tree.flags[this_row] & FLAG_BACK_REFERENCE:
+            continue
+        # quoted just like the emitter unquotes it
+        pattern = tree.strings[pattern_id].rstrip('\'').lstrip('\'')
+        pattern_paths.setdefault(pattern, []).append(tree.get_path(tree.path_ids[this_row]))
+    pattern_costs = []
+    for this_pattern, these_paths in pattern_paths.items():
+        cost, findings = analyze(this_pattern)
+        pattern_costs.append(PatternCost(this_pattern, cost, findings, tuple(sorted(these_paths))))
+    return sorted(pattern_costs, key=lambda this_cost: (-this_cost.cost, this_cost.pattern))
+
+
+def format_report(pattern_costs: List[PatternCost]) -> List[str]:
+    """
+    Lay pattern costs out as a report.
+    :param pattern_costs: pattern costs, most expensive firstly
+    :type pattern_costs: `List[PatternCost]`
+    :return: lines of text
+    :rtype: `List[str]`
+    """
+    lines = [f"  {'cost':>6}  pattern"]
+    for this_cost in pattern_costs:
+        lines.append(f"  {this_cost.cost:>6}  \\v{this_cost.pattern}")
+        for this_finding in this_cost.findings:
+            lines.append(f"  {'':>6}    +{this_finding.cost} at {this_finding.offset}: {this_finding.description}")
+        for this_path in this_cost.node_paths:
+            lines.append(f"  {'':>6}    used by {this_path}")
+    return lines
@@ -0,0 +1,179 @@
+"""
+File: pattern_specificity.py
+Purpose: Score how specific a Vim very-magic ('\v') pattern is, to order sibling nodes by.
+
+README items 5 and 6: literal keywords go by longest lexical string firstly; regex
+patterns go by longest static prefix, down to the most complex regex, down to
+simple '+'/'*' wildcards.
+"""
+import functools
+from typing import NamedTuple, Optional, Tuple
+
+# number of characters matched by the character class escapes of Vim
+CHARACTER_CLASS_WIDTHS = {
+    's': 2, 'S': 254,  # whitespace: space and tab
+    'd': 10, 'D': 246,
+    'w': 63, 'W': 193,
+    'a': 52, 'A': 204,
+    'l': 26, 'L': 230,
+    'u': 26, 'U': 230,
+    'x': 22, 'X': 234,
+    'o': 8, 'O': 248,
+    'h': 53, 'H': 203,
+    'i': 63, 'I': 53, 'k': 63, 'K': 53, 'f': 80, 'F': 70, 'p': 95, 'P': 85,
+}
+ANY_CHARACTER_WIDTH: int = 256
+# pattern atoms of very-magic mode that match no character (anchors, grouping, alternation)
+ZERO_WIDTH_ATOMS: str = '^$()|<>'
+
+
+class Specificity(NamedTuple):
+    """
+    How specific a pattern is; compare with `sort_key()`.
+    """
+    literal_prefix_length: int  # static characters before the first non-literal atom
+    unbounded_quantifier_count: int  # '*', '+', '{n,}'
+    quantifier_count: int  # every quantifier, bounded or not
+    character_class_width: int  # characters matched by all character classes, summed up
+
+    def sort_key(self) -> Tuple[int, int, int, int]:
+        """
+        Most specific firstly: longest static prefix, fewest wildcards, fewest quantifiers, narrowest classes.
+        :return: a key that sorts the most specific pattern firstly
+        :rtype: `Tuple[int, int, int, int]`
+        """
+        return (-self.literal_prefix_length, self.unbounded_quantifier_count, self.quantifier_count,
+                self.character_class_width)
+
+
+def bracket_class_width(pattern: str, start: int) -> Tuple[int, int]:
+    """
+    Measure a '[...]' character class.
+    :param pattern: a Vim very-magic pattern
+    :type pattern: `str`
+    :param start: index of the opening '['
+    :type start: `int`
+    :return: the number of characters the class matches, and the index after its closing ']'
+    :rtype: `Tuple[int, int]`
+    """
+    i = start + 1
+    negated = i < len(pattern) and pattern[i] == '^'
+    if negated:
+        i += 1
+    width = 0
+    first = True
+    while i < len(pattern) and (pattern[i] != ']' or first):
+        first = False
+        if pattern[i] == '\\' and i + 1 < len(pattern):
+            width += CHARACTER_CLASS_WIDTHS.get(pattern[i + 1], 1)
+            i += 2
+        elif i + 2 < len(pattern) and pattern[i + 1] == '-' and pattern[i + 2] != ']':
+            width += max(ord(pattern[i + 2]) - ord(pattern[i]) + 1, 1)
+            i += 3
+        else:
+            width += 1
+            i += 1
+    width = min(width, ANY_CHARACTER_WIDTH)
+    return (ANY_CHARACTER_WIDTH - width if negated else width), i + 1
+
+
+def quantifier_at(pattern: str, i: int) -> Tuple[Optional[bool], int]:
+    """
+    Read a quantifier, if any.
+    :param pattern: a Vim very-magic pattern
+    :type pattern: `str`
+    :param i: index to read at
+    :type i: `int`
+    :return: None if there is no quantifier, else whether it is unbounded; and the index after it
+    :rtype: `Tuple[Optional[bool], int]`
+    """
+    if i >= len(pattern):
+        return None, i
+    if pattern[i] in '*+':
+        return True, i + 1
+    if pattern[i] in '?=':
+        return False, i + 1
+    if pattern[i] == '{':
+        end = pattern.find('}', i)
+        if end < 0:
+            return None, i
+        bounds = pattern[i + 1:end].lstrip('-')
+        # '{}', '{n,}' and '{,}' are unbounded
+        return (bounds == '' or bounds.endswith(',')), end + 1
+    return None, i
+
+
+@functools.lru_cache(maxsize=None)
+def score(pattern: str) -> Specificity:
+    """
+    Analyse a Vim very-magic pattern once (the score is cached) for how specific it is.
+    :param pattern: a Vim very-magic pattern (without the leading '\\v')
+    :type pattern: `str`
+    :return: its specificity
+    :rtype: `Specificity`
+    """
+    literal_prefix_length = 0
+    in_literal_prefix = True
+    unbounded_quantifier_count = 0
+    quantifier_count = 0
+    character_class_width = 0
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        is_literal = False
+        if c == '\\' and i + 1 < len(pattern):
+            width = CHARACTER_CLASS_WIDTHS.get(pattern[i + 1])
+            if width is None:
+                is_literal = True
+            else:
+                character_class_width += width
+            i += 2
+        elif c == '[':
+            width, i = bracket_class_width(pattern, i)
+            character_class_width += width
+        elif c == '.':
+            character_class_width += ANY_CHARACTER_WIDTH
+            i += 1
+        elif c == '%' and i + 1 < len(pattern) and pattern[i + 1] == '(':
+            # non-capturing group
+            in_literal_prefix = False
+            i += 2
+            continue
+        elif c in ZERO_WIDTH_ATOMS:
+            # an anchor at the very start does not end the static prefix
+            if c != '^' or i > 0:
+                in_literal_prefix = False
+            i += 1
+            if c == ')':
+                # a quantified group
+                is_unbounded, i = quantifier_at(pattern, i)
+                if is_unbounded is not None:
+                    quantifier_count += 1
+                    unbounded_quantifier_count += int(is_unbounded)
+            continue
+        else:
+            is_literal = True
+            i += 1
+
+        is_unbounded, i = quantifier_at(pattern, i)
+        if is_unbounded is not None:
+            quantifier_count += 1
+            unbounded_quantifier_count += int(is_unbounded)
+            # a repeated (or optional) atom is not static
+            in_literal_prefix = False
+        if is_literal and in_literal_prefix:
+            literal_prefix_length += 1
+        else:
+            in_literal_prefix = False
+    return Specificity(literal_prefix_length, unbounded_quantifier_count, quantifier_count, character_class_width)
+
+
+def score_literal(literal: str) -> Specificity:
+    """
+    Score a literal keyword: all of it is static.
+    :param literal: a literal keyword
+    :type literal: `str`
+    :return: its specificity
+    :rtype: `Specificity`
+    """
+    return Specificity(len(literal), 0, 0, 0)
@@ -0,0 +1,74 @@
+"""
+File: regexp_opt.py
+Purpose: Fold a list of literal keywords into one prefix-trie Vim regex (in the spirit of Emacs' regexp-opt).
+"""
+import os
+from typing import Dict, List, Sequence, Tuple
+
+# characters that are special in a Vim very-magic ('\v') pattern
+VIM_VERY_MAGIC_SPECIAL_CHARS: str = '\\^$.*+?=@{}()[]<>|%&~/\''
+
+
+def escape_very_magic(literal: str) -> str:
+    """
+    Escape a literal string for use in a Vim very-magic ('\\v') pattern.
+    :param literal: a literal string
+    :type literal: `str`
+    :return: the escaped string
+    :rtype: `str`
+    """
+    return ''.join('\\' + c if c in VIM_VERY_MAGIC_SPECIAL_CHARS else c for c in literal)
+
+
+def build_trie_regex(words: List[str]) -> Tuple[str, bool]:
+    """
+    Build the trie regex of a sorted list of unique words.
+    :param words: sorted, unique words; an empty word means that the words may end here
+    :type words: `List[str]`
+    :return: a Vim very-magic regex (without the leading '\\v'), and whether it is a single atom
+             (one character or one group) that a quantifier may follow
+    :rtype: `Tuple[str, bool]`
+    """
+    is_optional = words[0] == ''
+    if is_optional:
+        words = words[1:]
+    if not words:
+        return '', True
+
+    prefix = os.path.commonprefix(words)
+    if prefix:
+        # Factor out the longest common prefix of all remaining words
+        rest_regex, _ = build_trie_regex([this_word[len(prefix):] for this_word in words])
+        regex = escape_very_magic(prefix) + rest_regex
+        is_atom = len(prefix) == 1 and not rest_regex
+    else:
+        # Otherwise branch on the first character, one alternative per distinct first character
+        branches: Dict[str, List[str]] = {}
+        for this_word in words:
+            branches.setdefault(this_word[0], []).append(this_word[1:])
+        alternatives = [escape_very_magic(first_char) + build_trie_regex(rest)[0]
+                        for first_char, rest in branches.items()]
+        regex = '%(' + '|'.join(alternatives) + ')'
+        is_atom = True
+
+    if is_optional:
+        # very magic '=' (zero or one), never '?' (see the TIPS of the nftables header.vim);
+        # greedy: the longer word is tried before its shorter prefix
+        return (regex if is_atom else '%(' + regex + ')') + '=', False
+    return regex, is_atom
+
+
+def optimize(words: Sequence[str]) -> str:
+    """
+    Fold literal words into one prefix-trie regex, e.g. ['change', 'chain', 'create'] into
+    '<c%(ha%(in|nge)|reate)>', and ['ip', 'ip6'] into '<ip6=>'.  Whichever word matches, the regex
+    matches all of it, never a shorter prefix of it, and only as a whole word ('ip' is not the
+    start of 'ipx'), as each of the words would on its own.
+    :param words: literal words
+    :type words: `Sequence[str]`
+    :return: a Vim very-magic regex (without the leading '\\v')
+    :rtype: `str`
+    """
+    if not words:
+        raise ValueError('no words to optimize')
+    return '<' + build_trie_regex(sorted(set(words)))[0] + '>'
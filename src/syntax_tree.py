@@ -0,0 +1,294 @@
+"""
+File: syntax_tree.py
+Purpose: Load a 'syntax-tree' directory into the columns of a compact syntax tree in a single pass.
+
+A node is one directory of the syntax tree; its name is the keyword (or
+placeholder) that the directory represents.  Its path is the real path of the
+directory, so a subtree symlinked into many pathways is loaded once and shared
+by all of them (the tree is a DAG).  A symlink by another name than the
+directory it leads to is another keyword: that node has the path of the
+symlink, and the child nodes of the directory.  A symlink back to one of its own ancestors
+becomes a back reference: a childless stand-in for that ancestor, which closes
+the cycle.
+"""
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import build_profile
+import parse_simple_ini
+from compact_tree import CompactTree, CompactTreeBuilder, ROOT_PATH_ID
+
+NODE_CONFIG_FILENAME: str = '.config.ini'
+
+# (st_ino, st_mtime_ns, st_size) of a directory or a config file
+StatSignature = Tuple[int, int, int]
+# the inode recorded for a symlink to nowhere (and for a path missing from a manifest)
+NO_INODE: int = -1
+# (st_dev, st_ino) of a node directory, the same through every symlink to it
+NodeIdentity = Tuple[int, int]
+
+
+def is_skipped_entry(name: str, hidden_prefix: str) -> bool:
+    """
+    Check if a directory entry is not part of the syntax tree.
+    :param name: name of the directory entry
+    :type name: `str`
+    :param hidden_prefix: a prefix for hidden files
+    :type hidden_prefix: `str`
+    :return: Returns True if the entry is to be skipped
+    :rtype: `bool`
+    """
+    # Skip hidden files, nft_* files, config files and unit test scripts
+    if name.startswith('.'):
+        return True
+    if hidden_prefix and name.startswith(hidden_prefix):
+        return True
+    if name.endswith('.nft'):
+        return True
+    return False
+
+
+def stat_signature(stat_result: os.stat_result) -> StatSignature:
+    """
+    Reduce a stat result down to what tells us that a directory or a file has changed.
+    :param stat_result: result of a stat() call
+    :type stat_result: `os.stat_result`
+    :return: inode, modification time (in nanoseconds) and size
+    :rtype: `StatSignature`
+    """
+    return stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size
+
+
+def dangling_link_signature(link_stat: os.stat_result) -> StatSignature:
+    """
+    Give the stat signature of a symlink to nowhere: it differs from that of any directory it may lead to later.
+    :param link_stat: result of an lstat() call on the symlink
+    :type link_stat: `os.stat_result`
+    :return: NO_INODE, modification time (in nanoseconds) and size of the symlink itself
+    :rtype: `StatSignature`
+    """
+    return NO_INODE, link_stat.st_mtime_ns, link_stat.st_size
+
+
+def path_signature(path: str) -> StatSignature:
+    """
+    Take the stat signature of a path as a manifest records it: through a symlink, unless it leads nowhere.
+    :param path: a directory, a config file or a symlink
+    :type path: `str`
+    :return: its stat signature
+    :rtype: `StatSignature`
+    :raises OSError: If there is nothing at that path.
+    """
+    if build_profile.enabled:
+        build_profile.count_call('stat')
+    try:
+        return stat_signature(os.stat(path))
+    except FileNotFoundError:
+        if build_profile.enabled:
+            build_profile.count_call('stat')
+        return dangling_link_signature(os.lstat(path))
+
+
+def scan_node_dir(path: str, hidden_prefix: str, device: int,
+                  manifest: Optional[Dict[str, StatSignature]] = None) \
+        -> Tuple[Dict[str, str], List[Tuple[str, Optional[str], NodeIdentity]]]:
+    """
+    List a node directory exactly once: read its config file and find its child node directories.
+    :param path: the real path to a node
+    :type path: `str`
+    :param hidden_prefix: a prefix for hidden files
+    :type hidden_prefix: `str`
+    :param device: the device (st_dev) of the node directory
+    :type device: `int`
+    :param manifest: if given, collects the stat signature of every directory (and real directory of a
+        symlink), symlink to nowhere and config file read
+    :type manifest: `Optional[Dict[str, StatSignature]]`
+    :return: the node options, and the name, real path (None: within the node directory) and identity of
+        each child node
+    :rtype: `Tuple[Dict[str, str], List[Tuple[str, Optional[str], NodeIdentity]]]`
+    :raises NotADirectoryError: If a plain file is found amongst the nodes.
+    """
+    child_entries: List[Tuple[str, Optional[str], NodeIdentity]] = []
+    node_options: Dict[str, str] = {}
+    profiling = build_profile.enabled
+    try:
+        if profiling:
+            build_profile.count_call('iterdir')
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name == NODE_CONFIG_FILENAME:
+                    if entry.is_file():
+                        if profiling:
+                            build_profile.count_call('stat')
+                        config_stat = entry.stat()
+                        if manifest is not None:
+                            manifest[entry.path] = stat_signature(config_stat)
+                        with build_profile.phase('config reads'):
+                            node_options = parse_simple_ini.read_node_config(Path(entry.path), config_stat)
+                    continue
+                if is_skipped_entry(entry.name, hidden_prefix):
+                    continue
+                # DirEntry.is_dir() reuses the file type returned by the directory listing
+                if entry.is_dir():
+                    if manifest is not None:
+                        if profiling:
+                            build_profile.count_call('stat')
+                        manifest[entry.path] = stat_signature(entry.stat())
+                    if entry.is_symlink():
+                        # identify the directory linked to (and where it really is)
+                        if profiling:
+                            build_profile.count_call('stat')
+                        target_stat = entry.stat()
+                        real_path = os.path.realpath(entry.path)
+                        if manifest is not None:
+                            # the node is named after where it really is: so are its dependencies
+                            manifest[real_path] = stat_signature(target_stat)
+                        child_entries.append((entry.name, real_path, (target_stat.st_dev, target_stat.st_ino)))
+                    else:
+                        # the inode comes with the directory listing; no stat() needed
+                        child_entries.append((entry.name, None, (device, entry.inode())))
+                elif entry.is_symlink() and not entry.is_file():
+                    # a symlink to nowhere (yet) is no child node; its directory is emitted again
+                    # once it leads somewhere, so it is recorded all the same
+                    if manifest is not None:
+                        if profiling:
+                            build_profile.count_call('stat')
+                        manifest[entry.path] = dangling_link_signature(entry.stat(follow_symlinks=False))
+                elif entry.is_file():
+                    raise NotADirectoryError('Not sure what to do with this file', entry.path,
+                                             ": try cd into directory containing 'syntax-tree'")
+    except PermissionError:
+        # never on stdout: that is the protocol stream of the language server
+        print("  Permission denied: %s" % os.path.basename(path), file=sys.stderr)
+    return node_options, child_entries
+
+
+def load_node(path: str, hidden_prefix: str,
+              manifest: Optional[Dict[str, StatSignature]] = None) -> CompactTree:
+    """
+    Load a node and all of its child nodes; each directory is listed exactly once.
+
+    Each node becomes a row of the compact syntax tree as soon as its directory is
+    listed, and gets its child nodes once they are all loaded; an explicit stack
+    stands for the recursion, so the depth of the tree is not bounded by the
+    recursion limit.  A directory reached again through a symlink is not listed
+    again: its row is shared (or linked to, by another name).  A symlink to an ancestor becomes a back reference
+    instead of an endless descent.
+    :param path: the real path to a node
+    :type path: `str`
+    :param hidden_prefix: a prefix for hidden files
+    :type hidden_prefix: `str`
+    :param manifest: if given, collects the stat signature of every directory and config file read
+    :type manifest: `Optional[Dict[str, StatSignature]]`
+    :return: The loaded tree, not compressed (`tree_compress.compress()`); row 0 is the node
+    :rtype: `CompactTree`
+    :raises NotADirectoryError: If a plain file is found amongst the nodes.
+    """
+    builder = CompactTreeBuilder(path)
+    tree = builder.tree
+    loaded_rows: Dict[NodeIdentity, int] = {}
+    # the row of a loaded node at each other place (path table entry) that it is linked from
+    link_rows: Dict[Tuple[NodeIdentity, int], int] = {}
+    # the rows of the nodes being loaded, i.e. of the ancestors of the next node
+    loading_rows: Dict[NodeIdentity, int] = {}
+    # each frame: the row of the node, its real path and its path table entry, its identity,
+    # its child entries still to load, and the rows of its child nodes loaded so far
+    frames: List[Tuple[int, str, int, NodeIdentity, Iterator[Tuple[str, Optional[str], NodeIdentity]],
+                       List[int]]] = []
+
+    def place_child(parent_path_id: int, name: str, real_path: Optional[str]) -> int:
+        """
+        Give the path table entry that a child node is named after: where its directory really is, unless it
+        is reached through a symlink by another name, which is named where it is found
+        :param parent_path_id: the path table entry of the (real) parent node directory
+        :type parent_path_id: `int`
+        :param name: the child node name
+        :type name: `str`
+        :param real_path: the real path of the child node, None if within the parent node directory
+        :type real_path: `Optional[str]`
+        :return: the path table entry
+        :rtype: `int`
+        """
+        if real_path is None or os.path.basename(real_path) != name:
+            return builder.intern_path(parent_path_id, name)
+        return builder.intern_real_path(real_path)
+
+    def push_frame(name: str, node_path: str, path_id: int, identity: NodeIdentity,
+                   row_path_id: Optional[int] = None) -> None:
+        """
+        Start loading a node.
+        :param name: the node name
+        :type name: `str`
+        :param node_path: the real path to the node
+        :type node_path: `str`
+        :param path_id: the path table entry of that path, which the paths of the child nodes extend
+        :type path_id: `int`
+        :param identity: the node identity
+        :type identity: `NodeIdentity`
+        :param row_path_id: the path table entry that the node is named after, if not that of its real path
+        :type row_path_id: `Optional[int]`
+        :rtype: None
+        """
+        node_options, child_entries = scan_node_dir(node_path, hidden_prefix, identity[0], manifest)
+        row = builder.add_row(name, path_id if row_path_id is None else row_path_id, node_options)
+        loading_rows[identity] = row
+        frames.append((row, node_path, path_id, identity, iter(child_entries), []))
+
+    root_stat = os.stat(path)
+    push_frame(os.path.basename(path), path, ROOT_PATH_ID, (root_stat.st_dev, root_stat.st_ino))
+    while True:
+        row, node_path, path_id, identity, pending_child_entries, child_rows = frames[-1]
+        next_child_entry = next(pending_child_entries, None)
+        if next_child_entry is not None:
+            child_name, child_real_path, child_identity = next_child_entry
+            child_path_id = place_child(path_id, child_name, child_real_path)
+            shared_row = loaded_rows.get(child_identity)
+            if shared_row is not None:
+                # loaded already through another pathway
+                if tree.path_ids[shared_row] != child_path_id:
+                    # a link by another name: another keyword, with the same child nodes
+                    link_key = (child_identity, child_path_id)
+                    if link_key not in link_rows:
+                        link_rows[link_key] = builder.add_link(shared_row, child_name, child_path_id)
+                    shared_row = link_rows[link_key]
+                child_rows.append(shared_row)
+            elif child_identity in loading_rows:
+                # a cycle: stand in for the ancestor
+                child_rows.append(builder.add_back_reference(loading_rows[child_identity], child_name))
+            elif child_real_path is None:
+                push_frame(child_name, node_path + os.sep + child_name, child_path_id, child_identity)
+            else:
+                push_frame(child_name, child_real_path, builder.intern_real_path(child_real_path), child_identity,
+                           child_path_id)
+            continue
+        frames.pop()
+        del loading_rows[identity]
+        builder.set_children(row, child_rows)
+        loaded_rows[identity] = row
+        if not frames:
+            return builder.finish()
+        frames[-1][5].append(row)
+
+
+def load(syntax_tree_path: Path, hidden_prefix: str,
+         manifest: Optional[Dict[str, StatSignature]] = None) -> CompactTree:
+    """
+    Load the whole syntax tree into memory.
+    :param syntax_tree_path: Path to the root of syntax tree
+    :type syntax_tree_path: `Path`
+    :param hidden_prefix: a prefix for hidden files
+    :type hidden_prefix: `str`
+    :param manifest: if given, collects the stat signature of every directory and config file read
+    :type manifest: `Optional[Dict[str, StatSignature]]`
+    :return: The syntax tree, not compressed; row 0 is its root
+    :rtype: `CompactTree`
+    :raises NotADirectoryError: If the syntax tree path is not a directory.
+    """
+    start_path = syntax_tree_path.resolve()  # Convert to Path and resolve
+    if not start_path.is_dir():
+        raise NotADirectoryError(f"Path '{start_path}' is not a directory.")
+    if manifest is not None:
+        manifest[str(start_path)] = stat_signature(start_path.stat())
+    return load_node(str(start_path), hidden_prefix, manifest)
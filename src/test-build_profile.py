@@ -0,0 +1,103 @@
+"""
+File: test-build_profile.py
+Purpose: Profile a cold build and a cache-hit build of each syntax tree, checking the phases and the filesystem calls.
+
+Usage: python src/test-build_profile.py [-c corpus]
+
+A cold build lists every node directory and reads every config file; a
+build of the unchanged tree right after it loads the tree from the cache,
+and only stats what the cache manifest recorded (every directory and config
+file of the tree) to validate it.  Both report every phase of the build.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Sequence, Tuple
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+GENERATOR_FILESPEC: Path = SRC_DIRPATH / 'test-traverse_dirs_and_ast.py'
+FILE_FORMATS: Sequence[str] = ('ini', 'nftables')
+NODE_CONFIG_FILENAME: str = '.config.ini'
+# the phases of every build
+BUILD_PHASES: Sequence[str] = ('tree load', 'tree compress', 'highlight collection', 'symbol construction',
+                               'tree walk', 'nextgroup emission', 'error-label output', 'output')
+
+
+def count_tree_entries(tree_dirpath: Path) -> Tuple[int, int, int]:
+    """
+    Count what the loader finds in a syntax tree: its node directories, the symlinks amongst them, and config files.
+    :param tree_dirpath: the syntax tree directory
+    :type tree_dirpath: `Path`
+    :return: the number of node directories (the tree root aside), of symlinks to directories, and of config files
+    :rtype: `Tuple[int, int, int]`
+    """
+    dir_count = 0
+    symlink_count = 0
+    config_count = 0
+    for this_dirpath, these_dirnames, these_filenames in os.walk(tree_dirpath):
+        # hidden directories hold no nodes, and symlinks are not followed
+        these_dirnames[:] = [this_name for this_name in these_dirnames if not this_name.startswith('.')]
+        dir_count += len(these_dirnames)
+        symlink_count += sum(1 for this_name in these_dirnames if os.path.islink(os.path.join(this_dirpath, this_name)))
+        config_count += these_filenames.count(NODE_CONFIG_FILENAME)
+    return dir_count, symlink_count, config_count
+
+
+def build(corpus_dirpath: Path, file_format: str, output_dirpath: Path) -> Dict[str, Any]:
+    """
+    Run the generator with --profile-json, keeping its cache in the output directory.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param file_format: the file format
+    :type file_format: `str`
+    :param output_dirpath: the output directory
+    :type output_dirpath: `Path`
+    :return: the profile recorded
+    :rtype: `Dict[str, Any]`
+    """
+    profile_filespec = output_dirpath / 'profile.jsonl'
+    subprocess.run([sys.executable, str(GENERATOR_FILESPEC), '-f', file_format, '-c', str(corpus_dirpath),
+                    '-t', str(SRC_DIRPATH.parent / 'templates'), '-o', str(output_dirpath),
+                    '--profile-json', str(profile_filespec)], stdout=subprocess.DEVNULL, check=True)
+    records = [json.loads(this_line) for this_line in profile_filespec.read_text().splitlines()]
+    return records[-1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test the profile of cold and cache-hit builds')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    args = parser.parse_args()
+    for this_file_format in FILE_FORMATS:
+        dir_count, symlink_count, config_count = count_tree_entries(args.corpus / this_file_format / 'syntax-tree')
+        with tempfile.TemporaryDirectory() as output_dirspec:
+            cold_profile = build(args.corpus, this_file_format, Path(output_dirspec))
+            cached_profile = build(args.corpus, this_file_format, Path(output_dirspec))
+
+        for this_profile in (cold_profile, cached_profile):
+            missing_phases = [this_phase for this_phase in BUILD_PHASES if this_phase not in this_profile['phases']]
+            assert not missing_phases, f"{this_file_format}: phases not reported: {missing_phases}"
+        cold_counters = cold_profile['counters']
+        # the tree root, then every node directory, is listed once (a symlinked one where it really is);
+        # every config file is read once
+        assert cold_counters['iterdir'] == dir_count - symlink_count + 1, (dir_count, symlink_count, cold_counters)
+        assert cold_counters['config cache misses'] == config_count, cold_counters
+        assert cold_counters['open'] >= config_count, cold_counters
+        assert cold_profile['phases']['config reads']['calls'] == config_count, cold_profile['phases']
+
+        cached_counters = cached_profile['counters']
+        assert cached_counters['iterdir'] == 0 and cached_counters['config cache misses'] == 0, cached_counters
+        assert 'config reads' not in cached_profile['phases'], cached_profile['phases']
+        # one stat per manifest entry (every directory and config file, the tree root too); the cache is opened
+        assert cached_counters['stat'] == dir_count + 1 + config_count, (dir_count, config_count, cached_counters)
+        assert cached_counters['open'] >= 1, cached_counters
+        print(f"PASS: {this_file_format}: every phase reported; a cache-hit build stats the "
+              f"{dir_count + 1 + config_count} manifest entries, and lists no directory")
+
+
+if __name__ == '__main__':
+    main()
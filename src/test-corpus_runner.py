@@ -0,0 +1,156 @@
+"""
+File: test-corpus_runner.py
+Purpose: Run the sample scripts of the nftables corpus, checking the invalid lines reported and the verdicts.
+
+Usage: python src/test-corpus_runner.py [-c corpus]
+
+The in-repo sample scripts are not annotated: every line that the syntax tree
+does not accept yet is reported, by line number.  Annotated scripts are then
+added to a copy of the syntax tree: they pass or fail on their verdicts, a
+passing script is skipped while it is unchanged, and the build fails on a
+failing one.
+"""
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Sequence, Tuple
+
+import corpus_runner
+import lsp_server
+import tree_lexer
+from corpus_runner import CorpusSummary, SampleResult
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+GENERATOR_FILESPEC: Path = SRC_DIRPATH / 'test-traverse_dirs_and_ast.py'
+FILE_FORMAT: str = 'nftables'
+# script (relative to the syntax tree): its line count, and the numbers of its invalid lines
+EXPECTED_INVALID_LINES: Dict[str, Tuple[int, Tuple[int, ...]]] = {
+    # 'add table T;': 'table' is no child of 'add'; 'add chain T C;': 'chain' takes no blanks
+    'add/chain.nft': (4, (2, 4)),
+    # no statement starts with 'table', 'delete' or 'create', nor with '#': there is no comment node
+    '.hold/create/create_cmd/table.nft': (15, (2, 3, 5, 6, 8, 9, 11, 12, 14, 15)),
+}
+# script added to the copy (relative to the syntax tree): its content, and whether it passes on its verdict
+ANNOTATED_SCRIPTS: Dict[str, Tuple[str, bool]] = {
+    'add/chain/allowed.nft': ('# parser:  allowed\n# scanner: allowed\nadd chainTABLECHAIN{\n\n', True),
+    'add/refused.nft': ('# parser: NOT ALLOWED\nadd table T;\n', True),
+    # one annotation not allowing it is enough
+    'add/half_refused.nft': ('# parser: allowed\n# scanner: not allowed\nadd chainTABLE{\n', True),
+    'add/wrong.nft': ('# parser: allowed\nadd table T;\n', False),
+}
+
+
+def relative_results(summary: CorpusSummary, tree_dirpath: Path) -> Dict[str, SampleResult]:
+    """
+    Key the results of a corpus run by script path, relative to the syntax tree.
+    :param summary: the outcome of a corpus run
+    :type summary: `CorpusSummary`
+    :param tree_dirpath: the syntax tree directory
+    :type tree_dirpath: `Path`
+    :return: the results
+    :rtype: `Dict[str, SampleResult]`
+    """
+    return {str(Path(this_result.path).relative_to(tree_dirpath)): this_result for this_result in summary.results}
+
+
+def find_scripts(tree_dirpath: Path) -> Sequence[str]:
+    """
+    Find the sample scripts of a syntax tree, as the generator does.
+    :param tree_dirpath: the syntax tree directory
+    :type tree_dirpath: `Path`
+    :return: the script paths
+    :rtype: `Sequence[str]`
+    """
+    return tree_lexer.find_sample_files(str(tree_dirpath), corpus_runner.SAMPLE_FILE_SUFFIX, include_hidden_dirs=True)
+
+
+def check_in_repo_scripts(corpus_dirpath: Path) -> None:
+    """
+    Run the in-repo sample scripts, with one worker process and with two.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :return: None
+    :rtype: `None`
+    """
+    tree_dirpath = corpus_dirpath / FILE_FORMAT / 'syntax-tree'
+    tree = lsp_server.load_lexer(corpus_dirpath, FILE_FORMAT).tree
+    for this_jobs in (1, 2):
+        summary = corpus_runner.run_corpus(tree, find_scripts(tree_dirpath), {}, this_jobs)
+        results = relative_results(summary, tree_dirpath)
+        reported = {this_path: (this_result.line_count,
+                                tuple(this_line_number for this_line_number, _ in this_result.invalid_lines))
+                    for this_path, this_result in results.items()}
+        assert reported == EXPECTED_INVALID_LINES, f"--jobs {this_jobs}: {reported}"
+        assert all(this_result.expected is None and not this_result.actual and not this_result.passed
+                   for this_result in results.values())
+        assert not summary.failed and not summary.skipped_paths
+        report = corpus_runner.format_report(summary, str(tree_dirpath))
+        assert report[-1].startswith(f"Corpus: {len(EXPECTED_INVALID_LINES)} scripts: 0 passed, 0 failed, "
+                                     f"{len(EXPECTED_INVALID_LINES)} not annotated, 0 skipped"), report[-1]
+    print(f"PASS: {FILE_FORMAT}: {len(EXPECTED_INVALID_LINES)} in-repo scripts, "
+          f"{sum(len(these_lines) for _, these_lines in EXPECTED_INVALID_LINES.values())} invalid lines reported")
+
+
+def check_annotated_scripts(corpus_dirpath: Path, copy_dirpath: Path) -> None:
+    """
+    Run annotated scripts added to a copy of the syntax tree, twice, then through the generator.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param copy_dirpath: an empty directory to copy it into
+    :type copy_dirpath: `Path`
+    :return: None
+    :rtype: `None`
+    """
+    for this_part in ('syntax-tree', 'vim'):
+        shutil.copytree(corpus_dirpath / FILE_FORMAT / this_part, copy_dirpath / FILE_FORMAT / this_part,
+                        symlinks=True)
+    tree_dirpath = copy_dirpath / FILE_FORMAT / 'syntax-tree'
+    for this_path, (this_content, _) in ANNOTATED_SCRIPTS.items():
+        (tree_dirpath / this_path).write_text(this_content)
+    tree = lsp_server.load_lexer(copy_dirpath, FILE_FORMAT).tree
+
+    stored_results: Dict[str, corpus_runner.StoredResult] = {}
+    results = relative_results(corpus_runner.run_corpus(tree, find_scripts(tree_dirpath), stored_results),
+                               tree_dirpath)
+    for this_path, (_, this_passes) in ANNOTATED_SCRIPTS.items():
+        assert results[this_path].passed == this_passes, f"{this_path}: {results[this_path]}"
+    passing_paths = {str(tree_dirpath / this_path) for this_path, (_, this_passes) in ANNOTATED_SCRIPTS.items()
+                     if this_passes}
+    assert set(stored_results) == passing_paths, sorted(stored_results)
+
+    # unchanged passing scripts are skipped; a changed one is run again
+    (tree_dirpath / 'add' / 'refused.nft').write_text('# parser: NOT ALLOWED\nadd table T2;\n')
+    summary = corpus_runner.run_corpus(tree, find_scripts(tree_dirpath), stored_results)
+    assert set(summary.skipped_paths) == passing_paths - {str(tree_dirpath / 'add' / 'refused.nft')}, \
+        summary.skipped_paths
+    assert sorted(relative_results(summary, tree_dirpath)) == \
+        sorted(['add/refused.nft', 'add/wrong.nft', *EXPECTED_INVALID_LINES]), summary.results
+    print(f"PASS: {FILE_FORMAT}: {len(ANNOTATED_SCRIPTS)} annotated scripts judged on their verdicts, "
+          f"unchanged passing ones skipped")
+
+    with tempfile.TemporaryDirectory() as output_dirspec:
+        generator_run = subprocess.run([sys.executable, str(GENERATOR_FILESPEC), '-f', FILE_FORMAT,
+                                        '-c', str(copy_dirpath), '-t', str(SRC_DIRPATH.parent / 'templates'),
+                                        '-o', output_dirspec, '--no-cache', '--test-corpus'],
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    assert generator_run.returncode != 0 and \
+        'Corpus failed: 1 script(s) lexed against their verdict' in generator_run.stderr, generator_run.stderr
+    assert 'FAIL add/wrong.nft: 2 lines' in generator_run.stdout, generator_run.stdout
+    print(f"PASS: {FILE_FORMAT}: --test-corpus fails the build on the one script lexed against its verdict")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test running the sample scripts of a corpus')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    args = parser.parse_args()
+    check_in_repo_scripts(args.corpus)
+    with tempfile.TemporaryDirectory() as copy_dirspec:
+        check_annotated_scripts(args.corpus, Path(copy_dirspec))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+File: test-error_handlers.py
+Purpose: Check that the error groups never win over a node: they are defined ahead of every node, and Vim agrees.
+
+Usage: python src/test-error_handlers.py [-c corpus]
+
+Vim prefers the last defined of the items matching at the same column, so an
+error group defined after the nodes would flag valid text.  Each syntax tree
+is emitted with every emit option; the error groups must come ahead of the
+first node.  Where Vim is installed, the lines that the tree accepts are
+highlighted by it, and no column of them may get an error group, while an
+invalid line gets its error group where it goes wrong.
+"""
+import argparse
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+GENERATOR_FILESPEC: Path = SRC_DIRPATH / 'test-traverse_dirs_and_ast.py'
+# the emit options to check, each on its own
+EMIT_OPTIONS: Sequence[Tuple[str, ...]] = (
+    (), ('--syntax-keywords',), ('--fold-keywords',), ('--clusters',), ('--default-error-group',),
+    ('--syntax-keywords', '--fold-keywords', '--clusters', '--default-error-group'),
+)
+# lines that the tree accepts, by how literal keywords are emitted: as 'syntax match' items, folded into
+# one (whole words only) or as 'syntax keyword' items (whole words, skipping the blanks after them); their
+# first token is in a 'nextgroup=' chain: the corpus footers define an uncontained catch-all of their own,
+# which competes at the top level
+VALID_LINES: Dict[str, Dict[str, Sequence[str]]] = {
+    'ini': {'match': ('[section]', '[ SECTION ]'), 'folded': ('[section]', '[ SECTION ]'),
+            'keyword': ('[section]', '[ SECTION ]')},
+    # the TABLE and CHAIN placeholders have no pattern yet: they match their names
+    'nftables': {'match': ('add chainTABLECHAIN{', 'add chainipTABLECHAIN{'),
+                 'folded': ('add chainTABLECHAIN{',),
+                 'keyword': ('add chain TABLECHAIN{', 'add chain ip TABLECHAIN{')},
+}
+# lines that the tree does not accept: the column (1-based) where an error group must start
+INVALID_LINES: Dict[str, Sequence[Tuple[str, int]]] = {
+    'ini': (),
+    'nftables': (('add table T;', 5),),
+}
+# "syntax match nft_add '\vadd[ \t]{0,5}'" (or 'syntax keyword'): the group name
+DEFINITION_REGEX = re.compile(r'syntax (?:match|keyword) (\S+)')
+# the groups of each line, one per column, as Vim highlights them
+VIM_GROUPS_EXPR: str = ("map(range(1, line('$')), {_, l -> join(map(range(1, col([l, '$']) - 1), "
+                        "{_, c -> synIDattr(synID(l, c, 1), 'name')}), ' ')})")
+
+
+def generate(corpus_dirpath: Path, file_format: str, output_dirpath: Path, options: Sequence[str]) -> Path:
+    """
+    Run the generator.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param file_format: the file format
+    :type file_format: `str`
+    :param output_dirpath: an output directory
+    :type output_dirpath: `Path`
+    :param options: more command line options
+    :type options: `Sequence[str]`
+    :return: the syntax file written
+    :rtype: `Path`
+    """
+    subprocess.run([sys.executable, str(GENERATOR_FILESPEC), '-f', file_format, '-c', str(corpus_dirpath),
+                    '-t', str(SRC_DIRPATH.parent / 'templates'), '-o', str(output_dirpath), '--no-cache', *options],
+                   stdout=subprocess.DEVNULL, check=True)
+    return output_dirpath / file_format / 'vim' / 'syntax' / (file_format + '.vim')
+
+
+def check_emit_order(syntax_filespec: Path) -> None:
+    """
+    Every error group that the generator defines comes ahead of the first node it defines.
+    :param syntax_filespec: the syntax file
+    :type syntax_filespec: `Path`
+    :return: None
+    :rtype: `None`
+    """
+    lines = syntax_filespec.read_text().splitlines()
+    # only what the generator emits: the corpus header and footer have groups of their own
+    generated_lines = lines[lines.index('" AUTO-GENERATED BY YOURS TRULY!'):]
+    definitions = [this_match[1] for this_match in map(DEFINITION_REGEX.match, generated_lines) if this_match]
+    error_positions = [this_index for this_index, this_name in enumerate(definitions) if 'Error' in this_name]
+    node_positions = [this_index for this_index, this_name in enumerate(definitions) if 'Error' not in this_name]
+    assert node_positions, f"{syntax_filespec}: no node defined"
+    assert not error_positions or max(error_positions) < min(node_positions), \
+        f"{syntax_filespec}: an error group is defined after a node: {definitions}"
+
+
+def highlight_with_vim(syntax_filespec: Path, lines: Sequence[str]) -> List[List[str]]:
+    """
+    Let Vim highlight lines with a syntax file.
+    :param syntax_filespec: the syntax file
+    :type syntax_filespec: `Path`
+    :param lines: the lines
+    :type lines: `Sequence[str]`
+    :return: the group name of each column of each line ('' for none)
+    :rtype: `List[List[str]]`
+    """
+    with tempfile.TemporaryDirectory() as work_dirspec:
+        sample_filespec = Path(work_dirspec) / 'sample.txt'
+        groups_filespec = Path(work_dirspec) / 'groups.txt'
+        sample_filespec.write_text(''.join(this_line + '\n' for this_line in lines))
+        # the syntax files quit on a terminal without colors; the exit status tells of the errors of the
+        # corpus header and footer (e.g. an unknown highlight group), not of the generated lines
+        subprocess.run(['vim', '-N', '-u', 'NONE', '-i', 'NONE', '-n', '-es', str(sample_filespec),
+                        '-c', 'syntax on', '-c', 'set t_Co=256', '-c', f"source {syntax_filespec}",
+                        '-c', f"call writefile({VIM_GROUPS_EXPR}, '{groups_filespec}')", '-c', 'qa!'],
+                       stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+        assert groups_filespec.exists(), f"{syntax_filespec}: Vim did not highlight the lines"
+        return [this_line.split(' ') for this_line in groups_filespec.read_text().splitlines()]
+
+
+def check_vim_highlights(syntax_filespec: Path, file_format: str, keyword_mode: str) -> None:
+    """
+    Vim highlights no column of a valid line as an error, and an invalid line where it goes wrong.
+    :param syntax_filespec: the syntax file
+    :type syntax_filespec: `Path`
+    :param file_format: the file format
+    :type file_format: `str`
+    :param keyword_mode: how literal keywords are emitted: 'match', 'folded' or 'keyword'
+    :type keyword_mode: `str`
+    :return: None
+    :rtype: `None`
+    """
+    valid_lines = VALID_LINES[file_format][keyword_mode]
+    invalid_lines = INVALID_LINES[file_format]
+    line_groups = highlight_with_vim(syntax_filespec, [*valid_lines, *(this_line for this_line, _ in invalid_lines)])
+    for this_line, this_groups in zip(valid_lines, line_groups):
+        assert all(this_group for this_char, this_group in zip(this_line, this_groups) if this_char not in ' \t'), \
+            f"{syntax_filespec}: {this_line!r} is not highlighted all along: {this_groups}"
+        assert not any('Error' in this_group for this_group in this_groups), \
+            f"{syntax_filespec}: {this_line!r}: {this_groups}"
+    for (this_line, this_column), this_groups in zip(invalid_lines, line_groups[len(valid_lines):]):
+        assert not any('Error' in this_group for this_group in this_groups[:this_column - 1]) \
+            and 'Error' in this_groups[this_column - 1], f"{syntax_filespec}: {this_line!r}: {this_groups}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test that the error groups never win over a node')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    args = parser.parse_args()
+    has_vim = shutil.which('vim') is not None
+    if not has_vim:
+        print('SKIP: no vim: only the emit order is checked')
+    for this_file_format in VALID_LINES:
+        for this_options in EMIT_OPTIONS:
+            with tempfile.TemporaryDirectory() as output_dirspec:
+                syntax_filespec = generate(args.corpus, this_file_format, Path(output_dirspec), this_options)
+                check_emit_order(syntax_filespec)
+                if has_vim:
+                    keyword_mode = ('keyword' if '--syntax-keywords' in this_options
+                                    else 'folded' if '--fold-keywords' in this_options else 'match')
+                    check_vim_highlights(syntax_filespec, this_file_format, keyword_mode)
+        print(f"PASS: {this_file_format}: error groups lose to every node, with {len(EMIT_OPTIONS)} sets of options")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+File: test-lsp_server.py
+Purpose: Drive the language server over stdio with random edits, checking every semantic tokens delta.
+
+Usage: python src/test-lsp_server.py [-f ini] [-c corpus] [-n 200] [--seed 1]
+
+The server is spawned as a subprocess.  After each random 'didChange', the
+edits of a 'semanticTokens/full/delta' are applied to the tokens held so far;
+they must equal the '/full' response for a second document, sent whole after
+every edit (so it is lexed afresh).  Edits insert block delimiters, newlines and
+characters outside of the Basic Multilingual Plane (two UTF-16 code units).
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+# the document edited with deltas, and the one re-sent whole
+EDITED_URI: str = 'file:///edited.ini'
+REFERENCE_URI: str = 'file:///reference.ini'
+DOCUMENT_LINES: Sequence[str] = (
+    '[section]', 'key = value', 'other_key=1', '# a comment', '', 'naïve = \'a b\'', '[', 'inner]',
+    'table t {', '}', 'x = {', '  y = 2', '}', '[unclosed',
+)
+INSERTED_TEXTS: Sequence[str] = (
+    'x', '', ' = 1', '#', '\n', '{', '}', '\n{\n', '}\n', '[', ']', '\n[\n', 's]', '😀', 'é', '\n[s]\nk = v\n',
+)
+
+
+def utf16_column(line: str, column: int) -> int:
+    """
+    Convert a column in characters into one in UTF-16 code units, as LSP positions are.
+    :param line: the line
+    :type line: `str`
+    :param column: a column in characters
+    :type column: `int`
+    :return: the column in UTF-16 code units
+    :rtype: `int`
+    """
+    return len(line[:column].encode('utf-16-le')) // 2
+
+
+class ServerProcess:
+    """
+    A language server subprocess, spoken to over its stdin and stdout.
+    """
+
+    def __init__(self, file_type: str, corpus_dirpath: Path) -> None:
+        self.process = subprocess.Popen([sys.executable, str(SRC_DIRPATH / 'lsp_server.py'), '-f', file_type,
+                                         '-c', str(corpus_dirpath)],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.next_id = 0
+
+    def write(self, message: Dict[str, Any]) -> None:
+        body = json.dumps(message).encode('utf-8')
+        self.process.stdin.write(b'Content-Length: ' + str(len(body)).encode('ascii') + b'\r\n\r\n' + body)
+        self.process.stdin.flush()
+
+    def read(self) -> Dict[str, Any]:
+        """
+        Read one message; anything else on stdout (e.g. a stray print) breaks the framing, and fails the test.
+        :return: the message
+        :rtype: `Dict[str, Any]`
+        """
+        content_length: Optional[int] = None
+        while True:
+            header = self.process.stdout.readline()
+            if not header:
+                raise SystemExit('FAIL: the server closed its stdout')
+            header = header.strip()
+            if not header:
+                break
+            name, _, value = header.partition(b':')
+            if name.strip().lower() != b'content-length':
+                raise SystemExit(f"FAIL: not a message header on stdout: {header!r}")
+            content_length = int(value)
+        if content_length is None:
+            raise SystemExit('FAIL: a message without Content-Length')
+        return json.loads(self.process.stdout.read(content_length))
+
+    def request(self, method: str, params: Any) -> Any:
+        """
+        Send a request and wait for its response.
+        :param method: the method
+        :type method: `str`
+        :param params: its parameters
+        :type params: `Any`
+        :return: the result
+        :rtype: `Any`
+        """
+        self.next_id += 1
+        self.write({'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': params})
+        response = self.read()
+        if response.get('id') != self.next_id or 'error' in response:
+            raise SystemExit(f"FAIL: {method}: {response}")
+        return response['result']
+
+    def notify(self, method: str, params: Any) -> None:
+        self.write({'jsonrpc': '2.0', 'method': method, 'params': params})
+
+
+def random_edit(chooser: random.Random, lines: List[str]) -> Dict[str, Any]:
+    """
+    Make a random edit of a document, apply it to its lines, and give it as a 'didChange' content change.
+    :param chooser: the random generator
+    :type chooser: `random.Random`
+    :param lines: the lines of the document, edited in place
+    :type lines: `List[str]`
+    :return: the content change (positions in UTF-16 code units)
+    :rtype: `Dict[str, Any]`
+    """
+    start_line = chooser.randrange(len(lines))
+    end_line = min(len(lines) - 1, start_line + chooser.choice((0, 0, 0, 1, 3)))
+    start_column = chooser.randint(0, len(lines[start_line]))
+    if end_line > start_line:
+        end_column = chooser.randint(0, len(lines[end_line]))
+    else:
+        end_column = chooser.randint(start_column, len(lines[start_line]))
+    text = chooser.choice(INSERTED_TEXTS)
+    change = {'range': {'start': {'line': start_line, 'character': utf16_column(lines[start_line], start_column)},
+                        'end': {'line': end_line, 'character': utf16_column(lines[end_line], end_column)}},
+              'text': text}
+    lines[start_line:end_line + 1] = (lines[start_line][:start_column] + text + lines[end_line][end_column:]).split('\n')
+    return change
+
+
+def run(args: argparse.Namespace) -> int:
+    """
+    Run the random edits; the first delta that differs from a fresh full response fails the test.
+    :param args: the command line arguments
+    :type args: `argparse.Namespace`
+    :return: the exit code
+    :rtype: `int`
+    """
+    chooser = random.Random(args.seed)
+    lines = [chooser.choice(DOCUMENT_LINES) for _ in range(args.lines)]
+    server = ServerProcess(args.file_type, args.corpus)
+    server.request('initialize', {'capabilities': {}})
+    server.notify('initialized', {})
+    server.notify('textDocument/didOpen', {'textDocument': {'uri': EDITED_URI, 'languageId': args.file_type,
+                                                            'version': 1, 'text': '\n'.join(lines)}})
+    server.notify('textDocument/didOpen', {'textDocument': {'uri': REFERENCE_URI, 'languageId': args.file_type,
+                                                            'version': 1, 'text': '\n'.join(lines)}})
+    result = server.request('textDocument/semanticTokens/full', {'textDocument': {'uri': EDITED_URI}})
+    data, result_id = result['data'], result['resultId']
+    for this_step in range(1, args.edits + 1):
+        change = random_edit(chooser, lines)
+        server.notify('textDocument/didChange', {'textDocument': {'uri': EDITED_URI, 'version': this_step + 1},
+                                                 'contentChanges': [change]})
+        delta = server.request('textDocument/semanticTokens/full/delta',
+                               {'textDocument': {'uri': EDITED_URI}, 'previousResultId': result_id})
+        result_id = delta['resultId']
+        for this_edit in delta['edits']:
+            data[this_edit['start']:this_edit['start'] + this_edit['deleteCount']] = this_edit.get('data', [])
+
+        server.notify('textDocument/didChange', {'textDocument': {'uri': REFERENCE_URI, 'version': this_step + 1},
+                                                 'contentChanges': [{'text': '\n'.join(lines)}]})
+        reference = server.request('textDocument/semanticTokens/full', {'textDocument': {'uri': REFERENCE_URI}})
+        if data != reference['data']:
+            print(f"FAIL: edit {this_step} ({change}): the deltas give {len(data) // 5} tokens, "
+                  f"a full response {len(reference['data']) // 5}")
+            server.process.kill()
+            return 1
+    server.request('shutdown', None)
+    server.notify('exit', None)
+    exit_code = server.process.wait(timeout=10)
+    if exit_code != 0:
+        print(f"FAIL: the server exited with {exit_code}")
+        return 1
+    print(f"PASS: {args.edits} edits of a {args.lines}-line document, every delta equal to a full response "
+          f"({len(data) // 5} tokens at the end)")
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Test the language server with random edits')
+    parser.add_argument('-f', '--file-type', metavar='file_type', type=str, default='ini',
+                        help='File format (default is ini)')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    parser.add_argument('-n', '--edits', metavar='N', type=int, default=200, help='Number of edits (default is 200)')
+    parser.add_argument('--lines', metavar='N', type=int, default=300,
+                        help='Number of lines of the document (default is 300)')
+    parser.add_argument('--seed', metavar='N', type=int, default=1, help='Seed of the random edits (default is 1)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(run(parse_args()))
@@ -0,0 +1,99 @@
+"""
+File: test-parallel_jobs.py
+Purpose: Build each syntax tree with one job and with several, checking that the output is the same, byte for byte.
+
+Usage: python src/test-parallel_jobs.py [-c corpus] [-j N]
+
+With more than one job, the top-level subtrees are emitted by a process pool
+and merged back in tree order.  Both corpora are built, with every set of
+emit options; the nftables tree has a single top-level node, so a copy of it
+with the 'add' subtree copied to 'create' and 'delete' is built too, which
+fans out to the pool and shares its merged subtrees across the jobs.
+"""
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Sequence, Tuple
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+GENERATOR_FILESPEC: Path = SRC_DIRPATH / 'test-traverse_dirs_and_ast.py'
+FILE_FORMATS: Sequence[str] = ('ini', 'nftables')
+EMIT_OPTIONS: Sequence[Tuple[str, ...]] = (
+    (), ('--syntax-keywords',), ('--fold-keywords', '--clusters'),
+    ('--syntax-keywords', '--fold-keywords', '--clusters', '--default-error-group'),
+)
+# the top-level subtrees that the nftables copy gets, besides 'add'
+COPIED_SUBTREES: Sequence[str] = ('create', 'delete')
+
+
+def build(corpus_dirpath: Path, file_format: str, jobs: int, options: Sequence[str]) -> bytes:
+    """
+    Run the generator afresh, and read back the syntax file that it wrote.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param file_format: the file format
+    :type file_format: `str`
+    :param jobs: number of worker processes
+    :type jobs: `int`
+    :param options: more command line options
+    :type options: `Sequence[str]`
+    :return: the content of the syntax file
+    :rtype: `bytes`
+    """
+    with tempfile.TemporaryDirectory() as output_dirspec:
+        subprocess.run([sys.executable, str(GENERATOR_FILESPEC), '-f', file_format, '-c', str(corpus_dirpath),
+                        '-t', str(SRC_DIRPATH.parent / 'templates'), '-o', output_dirspec, '--no-cache',
+                        '--jobs', str(jobs), *options], stdout=subprocess.DEVNULL, check=True)
+        return (Path(output_dirspec) / file_format / 'vim' / 'syntax' / (file_format + '.vim')).read_bytes()
+
+
+def check_same_output(corpus_dirpath: Path, file_format: str, jobs: int) -> None:
+    """
+    Build a syntax tree with one job and with several, with every set of emit options.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param file_format: the file format
+    :type file_format: `str`
+    :param jobs: number of worker processes to compare with one
+    :type jobs: `int`
+    :return: None
+    :rtype: `None`
+    """
+    for this_options in EMIT_OPTIONS:
+        serial_output = build(corpus_dirpath, file_format, 1, this_options)
+        parallel_output = build(corpus_dirpath, file_format, jobs, this_options)
+        assert parallel_output == serial_output, \
+            f"{corpus_dirpath}: {file_format} {' '.join(this_options)}: --jobs {jobs} differs from --jobs 1"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test that parallel builds write the same syntax file')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    parser.add_argument('-j', '--jobs', metavar='N', type=int, default=4,
+                        help='Number of worker processes to compare with one (default is 4)')
+    args = parser.parse_args()
+    for this_file_format in FILE_FORMATS:
+        check_same_output(args.corpus, this_file_format, args.jobs)
+        print(f"PASS: {this_file_format}: --jobs 1 and --jobs {args.jobs} write the same bytes, "
+              f"with {len(EMIT_OPTIONS)} sets of options")
+
+    with tempfile.TemporaryDirectory() as copy_dirspec:
+        copy_dirpath = Path(copy_dirspec)
+        for this_part in ('syntax-tree', 'vim'):
+            shutil.copytree(args.corpus / 'nftables' / this_part, copy_dirpath / 'nftables' / this_part,
+                            symlinks=True)
+        tree_dirpath = copy_dirpath / 'nftables' / 'syntax-tree'
+        for this_name in COPIED_SUBTREES:
+            # its symlinks are relative: they point within the copy
+            shutil.copytree(tree_dirpath / 'add', tree_dirpath / this_name, symlinks=True)
+        check_same_output(copy_dirpath, 'nftables', args.jobs)
+        print(f"PASS: nftables with {len(COPIED_SUBTREES) + 1} top-level subtrees: --jobs 1 and --jobs {args.jobs} "
+              f"write the same bytes, with {len(EMIT_OPTIONS)} sets of options")
+
+
+if __name__ == '__main__':
+    main()
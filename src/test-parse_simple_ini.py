@@ -0,0 +1,113 @@
+"""
+File: test-parse_simple_ini.py
+Purpose: Read the node config files of a syntax tree through the config cache, counting the stat and open calls.
+
+Usage: python src/test-parse_simple_ini.py [-c corpus]
+
+The config files of a copy of each syntax tree are read with load_many():
+each is opened once; read again within the same cache generation, none is
+stat'ed or opened; in a new generation, each is stat'ed but only a changed
+one is opened again.  Stats given along (as from a directory listing) save
+the stat calls, and an invalid option fails as it would one by one.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import build_profile
+import parse_simple_ini
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+FILE_FORMATS: Sequence[str] = ('ini', 'nftables')
+
+
+def count_calls(node_config_paths: List[Path], stat_results: Optional[Dict[Path, os.stat_result]] = None) \
+        -> Dict[str, int]:
+    """
+    Read config files with load_many(), counting the calls it makes.
+    :param node_config_paths: the config files
+    :type node_config_paths: `List[Path]`
+    :param stat_results: their stats, if already known
+    :type stat_results: `Optional[Dict[Path, os.stat_result]]`
+    :return: the number of each call made ('stat', 'open' and 'config cache hits')
+    :rtype: `Dict[str, int]`
+    """
+    build_profile.reset()
+    all_node_options = parse_simple_ini.load_many(node_config_paths, stat_results)
+    assert list(all_node_options) == node_config_paths
+    for this_path, this_options in all_node_options.items():
+        assert this_options == parse_simple_ini.read(this_path), this_path
+    counters = build_profile.snapshot().counters
+    return {this_name: counters.get(this_name, 0) for this_name in ('stat', 'open', 'config cache hits')}
+
+
+def check_tree(tree_dirpath: Path) -> int:
+    """
+    Read the config files of a syntax tree again and again, as the generator would over its runs.
+    :param tree_dirpath: the syntax tree directory (a copy: one of its config files gets changed)
+    :type tree_dirpath: `Path`
+    :return: the number of config files
+    :rtype: `int`
+    """
+    node_config_paths = sorted(tree_dirpath.rglob('.config.ini'))
+    count = len(node_config_paths)
+    assert count > 1, f"{tree_dirpath}: {count} config files"
+
+    parse_simple_ini.new_config_cache_generation()
+    assert count_calls(node_config_paths) == {'stat': count, 'open': count, 'config cache hits': 0}
+    # the same generation: nothing to check again
+    assert count_calls(node_config_paths) == {'stat': 0, 'open': 0, 'config cache hits': count}
+
+    # a new generation: each is stat'ed, and only the changed one read again
+    changed_path = node_config_paths[0]
+    changed_path.write_text(changed_path.read_text() + '\n# changed\n')
+    parse_simple_ini.new_config_cache_generation()
+    assert count_calls(node_config_paths) == {'stat': count, 'open': 1, 'config cache hits': count - 1}
+
+    # stats already known save the stat calls
+    parse_simple_ini.new_config_cache_generation()
+    stat_results = {this_path: this_path.stat() for this_path in node_config_paths}
+    assert count_calls(node_config_paths, stat_results) == {'stat': 0, 'open': 0, 'config cache hits': count}
+    return count
+
+
+def check_invalid_option(work_dirpath: Path) -> None:
+    """
+    An invalid option fails load_many() with a ValueError naming the file.
+    :param work_dirpath: an empty directory
+    :type work_dirpath: `Path`
+    :return: None
+    :rtype: `None`
+    """
+    invalid_path = work_dirpath / '.config.ini'
+    invalid_path.write_text("no_such_option = 'x'\n")
+    try:
+        parse_simple_ini.load_many([invalid_path])
+    except ValueError as error:
+        assert str(invalid_path) in str(error), error
+    else:
+        raise AssertionError(f"{invalid_path}: no ValueError")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test reading node config files through the config cache')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    args = parser.parse_args()
+    build_profile.enable()
+    for this_file_format in FILE_FORMATS:
+        with tempfile.TemporaryDirectory() as copy_dirspec:
+            tree_dirpath = Path(copy_dirspec) / 'syntax-tree'
+            shutil.copytree(args.corpus / this_file_format / 'syntax-tree', tree_dirpath, symlinks=True)
+            count = check_tree(tree_dirpath)
+        print(f"PASS: {this_file_format}: {count} config files opened once, stat'ed once per cache generation")
+    with tempfile.TemporaryDirectory() as work_dirspec:
+        check_invalid_option(Path(work_dirspec))
+    print('PASS: an invalid option fails load_many()')
+
+
+if __name__ == '__main__':
+    main()
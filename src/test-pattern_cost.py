@@ -0,0 +1,102 @@
+"""
+File: test-pattern_cost.py
+Purpose: Score the cost of node patterns, checking each kind of finding and the --max-pattern-cost build gate.
+
+Usage: python src/test-pattern_cost.py [-c corpus]
+
+Each costly construct is reported once: a nested unbounded quantifier covers
+the repetitions within it, and a repeated overlapping alternation covers the
+overlap.  The build fails with the patterns over --max-pattern-cost, and goes
+on at the most expensive pattern cost of the tree.
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Sequence, Tuple
+
+import pattern_cost
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+GENERATOR_FILESPEC: Path = SRC_DIRPATH / 'test-traverse_dirs_and_ast.py'
+FILE_FORMAT: str = 'ini'
+UNBOUNDED = (pattern_cost.UNBOUNDED_REPETITION_COST, pattern_cost.UNBOUNDED_REPETITION)
+OVERLAPPING = (pattern_cost.OVERLAPPING_ALTERNATION_COST, pattern_cost.OVERLAPPING_ALTERNATION)
+REPEATED_OVERLAPPING = (pattern_cost.REPEATED_OVERLAPPING_ALTERNATION_COST, 'repeated overlapping alternation')
+NESTED = (pattern_cost.NESTED_QUANTIFIER_COST, 'nested quantifiers')
+NESTED_UNBOUNDED = (pattern_cost.NESTED_UNBOUNDED_QUANTIFIER_COST,
+                    'nested unbounded quantifiers (catastrophic backtracking)')
+LEADING_ANY = (pattern_cost.LEADING_ANY_REPETITION_COST, "unanchored leading '.*' (retried from every column)")
+BACKTRACKING_ANY = (pattern_cost.BACKTRACKING_ANY_REPETITION_COST,
+                    "'.*' with more pattern after it (backtracks over the rest of the line)")
+# pattern: its cost, and its findings (offset, (cost, description))
+EXPECTED_COSTS: Sequence[Tuple[str, int, Tuple[Tuple[int, Tuple[int, str]], ...]]] = (
+    ('\\=', 1, ()),
+    ('[a-z]{1,5}', 1, ()),
+    ('(ab|cd)', 5, ()),
+    ('a+', 11, ((0, UNBOUNDED),)),
+    ('a{1,}', 11, ((0, UNBOUNDED),)),
+    ('^\\s*#.*$', 23, ((1, UNBOUNDED), (5, UNBOUNDED))),
+    ('(a|ab)', 24, ((0, OVERLAPPING),)),
+    ('(a|ab){2}', 104, ((0, REPEATED_OVERLAPPING),)),
+    ('(a|ab)+', 114, ((0, REPEATED_OVERLAPPING), (0, UNBOUNDED))),
+    ('(a{2}){3}', 42, ((0, NESTED),)),
+    ('(a+){2}', 52, ((1, UNBOUNDED), (0, NESTED))),
+    # the nested unbounded quantifier is all there is to report: not the repetitions within it too
+    ('(a+)*', 202, ((0, NESTED_UNBOUNDED),)),
+    ('x(a*b+)+', 204, ((1, NESTED_UNBOUNDED),)),
+    ('.*', 51, ((0, LEADING_ANY),)),
+    ('.*foo', 54, ((0, LEADING_ANY),)),
+    # anchored, or after an atom: not retried from every column, yet it backtracks to find the rest
+    ('^.*foo', 34, ((1, BACKTRACKING_ANY),)),
+    ('x.*foo', 35, ((1, BACKTRACKING_ANY),)),
+    ('x(.*)foo', 36, ((2, BACKTRACKING_ANY),)),
+    # with nothing after it, or only an alternative
+    ('x.*$', 12, ((1, UNBOUNDED),)),
+    ('(x.*|y)', 14, ((2, UNBOUNDED),)),
+)
+
+
+def generate(corpus_dirpath: Path, max_pattern_cost: int) -> subprocess.CompletedProcess:
+    """
+    Run the generator with a maximum pattern cost.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param max_pattern_cost: the maximum pattern cost
+    :type max_pattern_cost: `int`
+    :return: the finished run
+    :rtype: `subprocess.CompletedProcess`
+    """
+    with tempfile.TemporaryDirectory() as output_dirspec:
+        return subprocess.run([sys.executable, str(GENERATOR_FILESPEC), '-f', FILE_FORMAT, '-c', str(corpus_dirpath),
+                               '-t', str(SRC_DIRPATH.parent / 'templates'), '-o', output_dirspec, '--no-cache',
+                               '--max-pattern-cost', str(max_pattern_cost)],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test the cost of node patterns')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    args = parser.parse_args()
+    for this_pattern, this_cost, these_findings in EXPECTED_COSTS:
+        cost, findings = pattern_cost.analyze(this_pattern)
+        described = tuple((this_finding.offset, (this_finding.cost, this_finding.description))
+                          for this_finding in findings)
+        assert (cost, described) == (this_cost, these_findings), f"{this_pattern!r}: {cost}, {described}"
+    print(f"PASS: {len(EXPECTED_COSTS)} patterns scored, each construct reported once")
+
+    # the ini tree: its most expensive pattern is '^\s*#.*$'
+    top_cost = pattern_cost.analyze('^\\s*#.*$')[0]
+    passed_run = generate(args.corpus, top_cost)
+    assert passed_run.returncode == 0, passed_run.stdout + passed_run.stderr
+    failed_run = generate(args.corpus, top_cost - 1)
+    assert failed_run.returncode != 0 and 'Build failed: 1 pattern(s) over the maximum pattern cost' in \
+        failed_run.stderr, failed_run.stdout + failed_run.stderr
+    assert f"{top_cost:>6}  \\v^\\s*#.*$" in failed_run.stdout, failed_run.stdout
+    print(f"PASS: {FILE_FORMAT}: --max-pattern-cost {top_cost} builds, {top_cost - 1} fails on the one pattern over it")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+File: test-pattern_specificity.py
+Purpose: Order sibling patterns by specificity, checking that the most specific sibling is emitted lastly.
+
+Usage: python src/test-pattern_specificity.py [-c corpus]
+
+Vim prefers the last defined of the items matching at the same column, so the
+order of the 'syntax match' lines decides which sibling wins.  Patterns are
+scored against each other (README items 5 and 6), then a copy of the ini
+syntax tree gets a literal 'on' and a '[a-z]+' class next to the VALUE node:
+the literal must be defined after both, and listed firstly in 'nextgroup='.
+"""
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Sequence
+
+import lsp_server
+import pattern_specificity
+import tree_lexer
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+GENERATOR_FILESPEC: Path = SRC_DIRPATH / 'test-traverse_dirs_and_ast.py'
+FILE_FORMAT: str = 'ini'
+# patterns, most specific firstly
+ORDERED_PATTERNS: Sequence[str] = (
+    'table',  # the longest literal
+    'ip6',
+    'ip',
+    'ta[a-z]+',  # a literal prefix, then a class
+    '[a-z]{1,5}',  # bounded
+    '\\d+',  # unbounded, narrow class
+    '[a-z]+',
+    '.*',  # unbounded, any character
+)
+# the siblings added next to KEYWORD/=/VALUE (its pattern is a bounded alternation): their 'pattern' option
+ADDED_SIBLINGS = {'on': None, 'WORD': '[a-z]+'}
+# the group names of the siblings, most specific firstly
+EXPECTED_SIBLING_ORDER: Sequence[str] = ('nft_KEYWORD_equal_on', 'nft_KEYWORD_equal_VALUE', 'nft_KEYWORD_equal_WORD')
+
+
+def add_siblings(corpus_dirpath: Path, copy_dirpath: Path) -> None:
+    """
+    Copy the ini syntax tree, adding the siblings of KEYWORD/=/VALUE.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param copy_dirpath: an empty directory to copy it into
+    :type copy_dirpath: `Path`
+    :return: None
+    :rtype: `None`
+    """
+    for this_part in ('syntax-tree', 'vim'):
+        shutil.copytree(corpus_dirpath / FILE_FORMAT / this_part, copy_dirpath / FILE_FORMAT / this_part,
+                        symlinks=True)
+    equal_dirpath = copy_dirpath / FILE_FORMAT / 'syntax-tree' / 'KEYWORD' / '='
+    for this_name, this_pattern in ADDED_SIBLINGS.items():
+        (equal_dirpath / this_name).mkdir()
+        if this_pattern is not None:
+            (equal_dirpath / this_name / '.config.ini').write_text(f"pattern = '{this_pattern}'\n")
+
+
+def emitted_group_order(corpus_dirpath: Path, output_dirpath: Path) -> List[str]:
+    """
+    Emit the Vimscript of the syntax tree, and give the sibling groups in the order they are defined.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param output_dirpath: an empty output directory
+    :type output_dirpath: `Path`
+    :return: the group names of the siblings, in definition order
+    :rtype: `List[str]`
+    """
+    subprocess.run([sys.executable, str(GENERATOR_FILESPEC), '-f', FILE_FORMAT, '-c', str(corpus_dirpath),
+                    '-t', str(SRC_DIRPATH.parent / 'templates'), '-o', str(output_dirpath), '--no-cache'],
+                   stdout=subprocess.DEVNULL, check=True)
+    syntax_filespec = output_dirpath / FILE_FORMAT / 'vim' / 'syntax' / (FILE_FORMAT + '.vim')
+    lines = syntax_filespec.read_text().splitlines()
+    defined = [this_line.split()[2] for this_line in lines if this_line.startswith('syntax match ')]
+    # the 'nextgroup=' list of their parent node lists them too, most specific firstly
+    parent_index = next(this_index for this_index, this_line in enumerate(lines)
+                        if this_line.startswith('syntax match nft_KEYWORD_equal '))
+    listed = [this_line.lstrip('\\ ').rstrip(',') for this_line in lines[parent_index + 2:parent_index + 5]]
+    assert listed == list(EXPECTED_SIBLING_ORDER), f"nextgroup= lists {listed}"
+    return [this_name for this_name in defined if this_name in EXPECTED_SIBLING_ORDER]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test the order of sibling nodes by pattern specificity')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    args = parser.parse_args()
+    for this_pattern, this_next_pattern in zip(ORDERED_PATTERNS, ORDERED_PATTERNS[1:]):
+        assert pattern_specificity.score(this_pattern).sort_key() < \
+            pattern_specificity.score(this_next_pattern).sort_key(), f"{this_pattern!r} after {this_next_pattern!r}"
+    assert pattern_specificity.score_literal('ip6') == pattern_specificity.score('ip6')
+    print(f"PASS: {len(ORDERED_PATTERNS)} patterns scored most specific firstly")
+
+    with tempfile.TemporaryDirectory() as copy_dirspec:
+        copy_dirpath = Path(copy_dirspec)
+        add_siblings(args.corpus, copy_dirpath / 'corpus')
+        (copy_dirpath / 'output').mkdir()
+        defined = emitted_group_order(copy_dirpath / 'corpus', copy_dirpath / 'output')
+        assert defined == list(reversed(EXPECTED_SIBLING_ORDER)), f"defined in the order {defined}"
+        print(f"PASS: {FILE_FORMAT}: the literal sibling is defined after the '[a-z]+' class, and listed firstly")
+
+        # the lexer tries the siblings in the order Vim prefers them
+        lexer = lsp_server.load_lexer(copy_dirpath / 'corpus', FILE_FORMAT)
+        for this_line, this_node_path in (('k=on', 'KEYWORD/=/on'), ('k=off', 'KEYWORD/=/VALUE')):
+            line_result = tree_lexer.lex_line(lexer, this_line)
+            assert line_result.is_valid and lexer.describe(line_result.tokens[-1].row) == this_node_path, \
+                f"{this_line!r}: {[lexer.describe(this_token.row) for this_token in line_result.tokens]}"
+        print(f"PASS: {FILE_FORMAT}: the lexer picks the literal sibling, where it matches")
+
+
+if __name__ == '__main__':
+    main()
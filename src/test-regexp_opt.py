@@ -0,0 +1,110 @@
+"""
+File: test-regexp_opt.py
+Purpose: Fold keywords into prefix-trie regexes, checking the regexes and what they match (and Vim agrees).
+
+Usage: python src/test-regexp_opt.py
+
+Each folded regex shares the prefixes of its words, makes a word that is the
+prefix of another optional with very magic '=' (never '?'), and matches a
+word whole: never a shorter prefix of it, and never the start of a longer
+word.  What it matches is checked through the lexer translation into a Python
+'re' regex and, where Vim is installed, with Vim's matchstr() as well.
+"""
+import re
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import regexp_opt
+import tree_lexer
+
+# words: the folded regex
+EXPECTED_REGEXES: Sequence[Tuple[Sequence[str], str]] = (
+    (('chain', 'change', 'create'), '<c%(ha%(in|nge)|reate)>'),
+    (('ip', 'ip6'), '<ip6=>'),
+    (('ip6', 'ip', 'ip'), '<ip6=>'),
+    (('arp', 'bridge', 'inet', 'ip', 'ip6', 'netdev'), '<%(arp|bridge|i%(net|p6=)|netdev)>'),
+    (('a', 'abc', 'ab'), '<a%(bc=)=>'),
+    (('add', 'delete'), '<%(add|delete)>'),
+    (('add',), '<add>'),
+)
+# words: (text, what the folded regex matches at its start: '' for nothing)
+EXPECTED_MATCHES: Sequence[Tuple[Sequence[str], Sequence[Tuple[str, str]]]] = (
+    (('arp', 'bridge', 'inet', 'ip', 'ip6', 'netdev'), (
+        ('ip', 'ip'), ('ip6', 'ip6'), ('ip T', 'ip'), ('ip6;', 'ip6'), ('inet', 'inet'), ('netdev', 'netdev'),
+        # whole words only
+        ('ipx', ''), ('ip6x', ''), ('ip66', ''), ('inetdev', ''), ('i', ''), ('in', ''), ('xip', ''),
+    )),
+    (('a', 'abc', 'ab'), (('a', 'a'), ('ab', 'ab'), ('abc', 'abc'), ('abcd', ''), ('ac', ''), ('a b', 'a'))),
+)
+
+
+def python_match(regex: str, text: str) -> str:
+    """
+    Match a folded regex at the start of a text, as the lexer would.
+    :param regex: a Vim very-magic regex (without the leading '\\v')
+    :type regex: `str`
+    :param text: the text
+    :type text: `str`
+    :return: what it matches ('' for nothing)
+    :rtype: `str`
+    """
+    match = re.match(tree_lexer.translate_very_magic(regex), text)
+    return '' if match is None else match[0]
+
+
+def vim_matches(cases: Sequence[Tuple[str, str]]) -> List[str]:
+    """
+    Match folded regexes at the start of texts, with Vim's matchstr().
+    :param cases: (regex, text) pairs
+    :type cases: `Sequence[Tuple[str, str]]`
+    :return: what each regex matches ('' for nothing)
+    :rtype: `List[str]`
+    """
+    with tempfile.TemporaryDirectory() as work_dirspec:
+        # one regex and its text per line pair, read back as they are (no quoting)
+        cases_filespec = Path(work_dirspec) / 'cases.txt'
+        matches_filespec = Path(work_dirspec) / 'matches.txt'
+        cases_filespec.write_text(''.join(f"\\v^{this_regex}\n{this_text}\n" for this_regex, this_text in cases))
+        subprocess.run(['vim', '-N', '-u', 'NONE', '-i', 'NONE', '-n', '-es',
+                        '-c', f"let g:lines = readfile('{cases_filespec}')",
+                        '-c', f"call writefile(map(range(0, len(g:lines) - 1, 2), "
+                              f"{{_, i -> matchstr(g:lines[i + 1], g:lines[i])}}), '{matches_filespec}')",
+                        '-c', 'qa!'], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, check=True)
+        return matches_filespec.read_text().splitlines()
+
+
+def main() -> None:
+    for this_words, this_regex in EXPECTED_REGEXES:
+        assert regexp_opt.optimize(this_words) == this_regex, f"{this_words}: {regexp_opt.optimize(this_words)}"
+        assert '?' not in this_regex
+    try:
+        regexp_opt.optimize(())
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('no words: no ValueError')
+    print(f"PASS: {len(EXPECTED_REGEXES)} folds: prefixes shared, optional endings with '=', whole words")
+
+    expected: Dict[Tuple[str, str], str] = {}
+    for this_words, this_cases in EXPECTED_MATCHES:
+        this_regex = regexp_opt.optimize(this_words)
+        for this_text, this_match in this_cases:
+            assert python_match(this_regex, this_text) == this_match, \
+                f"{this_regex}: {this_text!r}: {python_match(this_regex, this_text)!r}"
+            expected[(this_regex, this_text)] = this_match
+    print(f"PASS: {len(expected)} texts matched as expected, through the lexer translation")
+    if shutil.which('vim') is None:
+        print('SKIP: no vim')
+        return
+    vim_results = vim_matches(list(expected))
+    assert vim_results == list(expected.values()), \
+        [(this_case, this_result) for this_case, this_result in zip(expected, vim_results)
+         if expected[this_case] != this_result]
+    print(f"PASS: {len(expected)} texts matched as expected, by Vim")
+
+
+if __name__ == '__main__':
+    main()
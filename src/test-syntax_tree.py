@@ -0,0 +1,123 @@
+"""
+File: test-syntax_tree.py
+Purpose: Load a syntax tree with symlinks (renamed, shared and cyclic), checking the nodes and the Vimscript emitted.
+
+Usage: python src/test-syntax_tree.py [-c corpus]
+
+A copy of the ini syntax tree gets a subtree 'aaa/FAMILY' and three symlinks
+to it: 'ddd/FAM' (by another name), 'eee/FAMILY' (by the same name) and
+'aaa/FAMILY/x/FAMILY' (a cycle).  Whichever directory gets listed firstly,
+'FAM' is a keyword of its own, and 'FAMILY' and its subtree are emitted once.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Sequence, Tuple
+
+import parse_simple_ini
+import syntax_tree
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+GENERATOR_FILESPEC: Path = SRC_DIRPATH / 'test-traverse_dirs_and_ast.py'
+FILE_FORMAT: str = 'ini'
+# symlink: where it leads
+SYMLINKS: Dict[str, str] = {
+    'ddd/FAM': '../aaa/FAMILY',
+    'eee/FAMILY': '../aaa/FAMILY',
+    'aaa/FAMILY/x/FAMILY': '../../FAMILY',
+}
+# (node name, node path) of every node added, back references aside
+EXPECTED_NODES: Sequence[Tuple[str, str]] = (
+    ('aaa', 'aaa'), ('FAMILY', 'aaa/FAMILY'), ('x', 'aaa/FAMILY/x'), ('ddd', 'ddd'), ('FAM', 'ddd/FAM'),
+    ('eee', 'eee'),
+)
+# Vimscript lines expected exactly once
+EXPECTED_LINES: Sequence[str] = (
+    "syntax match nft_aaa_FAMILY '\\vFAMILY' contained",
+    "syntax match nft_ddd_FAM '\\vFAM' contained",
+    "syntax match nft_aaa_FAMILY_x '\\vx' contained",
+)
+
+
+def add_symlinked_subtree(corpus_dirpath: Path, copy_dirpath: Path) -> Path:
+    """
+    Copy the ini syntax tree, adding a subtree and the symlinks to it.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param copy_dirpath: an empty directory to copy it into
+    :type copy_dirpath: `Path`
+    :return: the syntax tree directory of the copy
+    :rtype: `Path`
+    """
+    for this_part in ('syntax-tree', 'vim'):
+        shutil.copytree(corpus_dirpath / FILE_FORMAT / this_part, copy_dirpath / FILE_FORMAT / this_part,
+                        symlinks=True)
+    tree_dirpath = copy_dirpath / FILE_FORMAT / 'syntax-tree'
+    for this_dirpath in ('aaa/FAMILY/x', 'ddd', 'eee'):
+        (tree_dirpath / this_dirpath).mkdir(parents=True)
+    for this_link, this_target in SYMLINKS.items():
+        (tree_dirpath / this_link).symlink_to(this_target)
+    return tree_dirpath
+
+
+def check_nodes(tree_dirpath: Path) -> None:
+    """
+    Load the syntax tree: every node added is there once, with a path of its own.
+    :param tree_dirpath: the syntax tree directory
+    :type tree_dirpath: `Path`
+    :return: None
+    :rtype: `None`
+    """
+    tree = syntax_tree.load(tree_dirpath, parse_simple_ini.get_main_options(tree_dirpath)['symbol_name_prefix'])
+    root_path = tree.root.path_string
+    nodes = [(tree.node(this_row).name, os.path.relpath(tree.node(this_row).path_string, root_path))
+             for this_row in range(len(tree)) if not tree.node(this_row).is_back_reference]
+    paths = [this_path for _, this_path in nodes]
+    assert len(paths) == len(set(paths)), f"nodes sharing a path: {sorted(nodes, key=lambda n: n[1])}"
+    for this_node in EXPECTED_NODES:
+        assert this_node in nodes, f"no node {this_node}"
+    assert not any(this_path.startswith('eee' + os.sep) for this_path in paths), 'eee/FAMILY is loaded again'
+
+
+def check_vimscript(corpus_dirpath: Path, output_dirpath: Path) -> None:
+    """
+    Emit the Vimscript of the syntax tree: the renamed symlink and the subtree it leads to are both emitted, once.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param output_dirpath: an empty output directory
+    :type output_dirpath: `Path`
+    :return: None
+    :rtype: `None`
+    """
+    subprocess.run([sys.executable, str(GENERATOR_FILESPEC), '-f', FILE_FORMAT, '-c', str(corpus_dirpath),
+                    '-t', str(SRC_DIRPATH.parent / 'templates'), '-o', str(output_dirpath), '--no-cache'],
+                   stdout=subprocess.DEVNULL, check=True)
+    syntax_filespec = output_dirpath / FILE_FORMAT / 'vim' / 'syntax' / (FILE_FORMAT + '.vim')
+    lines = syntax_filespec.read_text().splitlines()
+    for this_line in EXPECTED_LINES:
+        assert lines.count(this_line) == 1, f"{lines.count(this_line)} times: {this_line}"
+    assert not any(this_line.startswith('syntax match nft_eee_FAMILY') for this_line in lines), \
+        'eee/FAMILY is emitted again'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test loading and emitting a syntax tree with symlinks')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as copy_dirspec:
+        copy_dirpath = Path(copy_dirspec)
+        tree_dirpath = add_symlinked_subtree(args.corpus, copy_dirpath / 'corpus')
+        check_nodes(tree_dirpath)
+        print(f"PASS: {FILE_FORMAT}: a symlink by another name is a node with a path of its own")
+        (copy_dirpath / 'output').mkdir()
+        check_vimscript(copy_dirpath / 'corpus', copy_dirpath / 'output')
+        print(f"PASS: {FILE_FORMAT}: the renamed symlink and the subtree it leads to are each emitted once")
+
+
+if __name__ == '__main__':
+    main()
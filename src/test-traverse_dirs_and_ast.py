@@ -2,471 +2,1149 @@
 The Right Stuff
 """
 import argparse
+import os
+import re
+import sys
+import tracemalloc
 from argparse import Namespace
-from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import cast, Set, Dict, Optional, Any, Deque, List, Tuple
+from typing import AbstractSet, Set, Dict, Optional, Any, Deque, Iterable, List, NamedTuple, Sequence, TextIO, Tuple
 
+import build_profile
+import compact_tree
 import construct_symbol_name
+import corpus_runner
+import corpus_watch
+import error_handlers
+import node_patterns
 import parse_simple_ini
+import pattern_cost
+import regexp_opt
+import syntax_tree
+import tree_cache
+import tree_compress
+import tree_document
+import tree_lexer
+import tree_walk
+import vim_fragments
+import vim_output
+from compact_tree import CompactNode
+from syntax_tree import StatSignature
+from vim_fragments import ChildEntry, EmittedNode, FoldedSibling, FragmentBuilder, FragmentStore
 
-target_symbol_prefix: str = ''
-target_file_format: str = ''
 TARGET_EDITOR_PLATFORM: str = 'vim'
-target_error_defined: List[Tuple[str, str, str]] = []
-target_highlights_found: Set[Tuple[str, str, str]] = set()
-target_highlights_printed: List[str] = []
-target_corpus_fileformat_tree_dirpath: Path = Path('.')
+# the generic highlight label of every error group
+ERROR_HIGHLIGHT_LABEL: str = 'Error'
+# Vim 'iskeyword' default: letters, digits and underscore
+LITERAL_KEYWORD_REGEX = re.compile(r'[A-Za-z0-9_]+')
+# The document sizes (in lines) of --edit-benchmark
+EDIT_BENCHMARK_LINE_COUNTS: Tuple[int, ...] = (1000, 10000, 100000)
 
 
-def is_root_node(stack: Deque[Path]) -> bool:
+@dataclass(frozen=True)
+class EmitOptions:
     """
-    Check if a node is the root of the syntax tree.
-    :param stack: a stack of Path objects representing the current traversal path
-    :type stack: `Deque[Path]`
-    :return: Returns True if a given node is the tree root
-    :rtype: `bool`
+    How the Vimscript is emitted; the same for every generator job of a run.
+    """
+    # emit literal keywords as 'syntax keyword' instead of 'syntax match'
+    use_syntax_keywords: bool = False
+    # fold sibling literal keywords of equal options and equal continuations into one group
+    fold_sibling_keywords: bool = False
+    # emit a 'syntax cluster' for every repeated 'nextgroup=' list
+    cluster_nextgroups: bool = False
+    # end the 'nextgroup=' list of a node without 'follow_on_to_only' with the default error group
+    default_error_group: bool = False
+
+
+@dataclass
+class GeneratorState:
     """
-    # root node has only one item in the stack
-    if len(stack) == 1:
-        return True
-    return False
+    Everything that one generator job reads and accumulates while emitting Vimscript.
+
+    Each job (a whole run, or one top-level subtree under --jobs) has its own state,
+    so jobs can run in separate processes and be merged afterward.
+    """
+    symbol_prefix: str
+    file_format: str
+    emit_options: EmitOptions = field(default_factory=EmitOptions)
+    fragment: FragmentBuilder = field(default_factory=FragmentBuilder)
+    # the error groups referenced, by group name: each is defined once
+    error_defined: Dict[str, Tuple[str, str, str]] = field(default_factory=dict)
+    subtree_signatures: Dict[str, str] = field(default_factory=dict)
+    removed_match_count: int = 0
+    # fragments emitted (not re-used) by this job
+    emitted_count: int = 0
+    tree_root_path: str = ''
+    canonical_symbol_names: Dict[str, Tuple[str, str, str]] = field(default_factory=dict)
+
+
+def output_line(state: GeneratorState, line: str) -> None:
+    """
+    Output a Vimscript line into the fragment being emitted
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param line: a Vimscript line
+    :type line: `str`
+    :return: None
+    :rtype: `None`
+    """
+    state.fragment.add_line(line)
 
 
-def output_vimscript_comment(comment_line: str) -> None:
+def output_vimscript_comment(state: GeneratorState, comment_line: str) -> None:
     """
     Generate a Vimscript comment line
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
     :param comment_line: a comment line
     :type comment_line: `str`
     :return: None
     :rtype: `None`
     """
     # print a Vimscript comment line
-    print("\" %s" % comment_line)
+    output_line(state, "\" %s" % comment_line)
 
 
-def output_highlights_found() -> None:
-    """
-    Output a list of highlight group name found in all the
-    `.config.ini` files of a syntax tree.
-    :return: None
-    :rtype: `None`
+def output_vimscript_highlight_defaults(state: GeneratorState, tree_root: CompactNode) -> None:
     """
-    # Output a list of highlight group names found
-    output_vimscript_comment('Highlights found:')
-    # de-duplicate the set of highlights found
-    if target_highlights_found:
-        # cast to a Set[str] for mypy
-        have_target_highlights = cast(Set[str], target_highlights_found)
-        for this_highlight in have_target_highlights:
-            # unpack the tuple
-            group_name = this_highlight[0]
-            label_name = this_highlight[1]
-            referenced_by = this_highlight[2]
-            # avoid re-printing the same highlight group name
-            if group_name in target_highlights_printed:
-                continue
-            # track what we have printed
-            target_highlights_printed.append(group_name)
-            # print a comment line for reference
-            output_vimscript_comment('  Highlight \'' + group_name + '\' referenced by ' + referenced_by)
-            # print the actual Vimscript highlight link command
-            if any(group_name not in item[0] for item in have_target_highlights):
-                print('highlight link ' + group_name + ' ' + label_name)
-
-
-def output_vimscript_highlight_defaults(syntax_tree_path: Path) -> None:
-    """
-
-    :param syntax_tree_path: Path to the root of syntax tree
-    :type syntax_tree_path: `Path`
+    Output the default highlight links used in this syntax tree, in name order.
+
+    The highlights come from the options read by the (single) tree load; the
+    syntax tree is not walked again.
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param tree_root: the root node of the syntax tree
+    :type tree_root: `CompactNode`
     :return: None
     :rtype: `None`
     """
+    # Output a list of highlight group names found in .config.ini files
+    output_vimscript_comment(state, 'Default highlights found:')
+    highlight_prefix = state.symbol_prefix.rstrip('_') + 'HL_'
+    compact_syntax_tree = tree_root.tree
+    for system_highlight in sorted(compact_syntax_tree.distinct_strings(compact_syntax_tree.highlight_ids)):
+        platform_specific_highlight = highlight_prefix + system_highlight
+        # print the actual Vimscript highlight link command
+        output_line(state, f"highlight default link {platform_specific_highlight} {system_highlight}")
 
-    def collect_all_highlights(syntax_tree: Path) -> Set[Optional[str]]:
-        """
-        Read a specific key from all '.config.ini' files in subdirectories.
-        Handles non-standard INI files without sections.
-        Returns a dictionary mapping file paths to the key's value (or None if not found).
-        :param syntax_tree: Path to the root of syntax tree
-        :type syntax_tree: `Path`
-        :return:   A set of generic highlight labels
-        :rtype: `Set[Optional[str]]`
-        """
-        key_name: str = "highlight_color_name"
-        set_of_default_highlights: Set[Optional[str]] = set()
-
-        # Find all .config.ini files in subdirectories
-        for config_file in syntax_tree.rglob(".config.ini"):
-            try:
-                # Read the file line by line
-                with open(config_file, 'r') as f:
-                    for line in f:
-                        # Skip comments and empty lines
-                        line = line.strip()
-                        if not line or line.startswith('#'):
-                            continue
-                        # Split on first '=' to handle values containing '='
-                        if '=' in line:
-                            k, v = map(str.strip, line.split('=', 1))
-                            if k == key_name:
-                                # Store non-duplicative encounters
-                                set_of_default_highlights.add(v)
-                                break
-            except (IOError, UnicodeDecodeError):
-                pass
-        return set_of_default_highlights
-
-    def output_highlight_default_links_found(default_highlights: Set[str], prefix: str) -> None:
-        """
-        Output the default highlight links used in this syntax tree.
-        :param default_highlights: Set of generic highlight labels
-        :type default_highlights: `Set[str]`
-        :param prefix: a prefix for the highlight group names
-        :type prefix: `str`
-        :return: None
-        :rtype: `None`
-        """
-        # Output a list of highlight group names found in .config.ini files
-        output_vimscript_comment('Default highlights found:')
-        for this_hi in default_highlights:
-            # print a comment line for reference
-            system_highlight = this_hi
-            # print the actual Vimscript highlight link command
-            highlight_prefix = prefix.rstrip('_') + 'HL_'
-            # avoid re-printing the same highlight group name
-            platform_specific_highlight = highlight_prefix + this_hi
-            # track what we have printed
-            if platform_specific_highlight in target_highlights_printed:
-                continue
-            target_highlights_printed.append(platform_specific_highlight)
-            print(f"highlight default link {platform_specific_highlight} {system_highlight}")
-
-    list_of_default_highlights = collect_all_highlights(syntax_tree_path)
-    # Filter out None values to ensure type is Set[str]
-    filtered_highlights: Set[str] = {x for x in list_of_default_highlights if x is not None}
-    output_highlight_default_links_found(filtered_highlights, target_symbol_prefix)
-    return
-
-
-def output_error_labels_defined() -> None:
+
+def output_error_labels_defined(state: GeneratorState) -> None:
     """
     Output a list of error-related group names
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
     :return: None
     :rtype: `None`
     """
-    output_vimscript_comment(' Error Handlers encountered')
-    for this_error_handler in target_error_defined:
-        group_name = this_error_handler[0]
-        # symbol = this_error_handler[1]
+    output_vimscript_comment(state, ' Error Handlers encountered')
+    if not state.error_defined:
+        return
+    error_highlight = state.file_format.rstrip('_') + 'HL_' + ERROR_HIGHLIGHT_LABEL
+    output_line(state, f"highlight default link {error_highlight} {ERROR_HIGHLIGHT_LABEL}")
+    for group_name, this_error_handler in state.error_defined.items():
+        # characters = this_error_handler[1]
         pattern = this_error_handler[2]
-        print('syntax match ' + group_name + ' \'' + pattern + '\' contained')
+        output_line(state, 'syntax match ' + group_name + ' \'' + pattern + '\' contained')
+        output_line(state, 'highlight link ' + group_name + ' ' + error_highlight)
 
 
-def any_child_node_exists(node_path: Path) -> bool:
+def any_child_node_exists(node: CompactNode) -> bool:
     """
     Check a node if any child node exists.
-    :param node_path: a filepath to a node
-    :type path: `Path`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
     :return: Returns True if a child node exists.
     :rtype: `bool`
     """
-    found = False
-    for this_child in node_path.iterdir():
-        # we are looking for ordinary (non-block) child nodes
-        if not this_child.name.startswith('block_'):
-            if this_child.is_dir():
-                found = True
-                break
-    return found
+    # we are looking for ordinary (non-block) child nodes
+    return not node.is_terminal
 
 
-def any_block_related_child_node_exists(node_path: Path) -> bool:
+def output_vimscript_highlight(state: GeneratorState, symbol_name: str, highlight_link_label: str) -> None:
     """
-    Check a node if any block-related child node exists.
-    :param node_path: a filepath to a node
-    :type path: `Path`
-    :return: Returns True if a child node exists.
+    Generate a Vimscript highlight command
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param symbol_name: The group name to be highlighted.
+    :type symbol_name: `str`
+    :param highlight_link_label:
+    :type highlight_link_label: `str`
+    :return: None
+    :rtype: `None`
+    """
+    group_name = state.file_format.rstrip('_') + 'HL_' + highlight_link_label
+    # iterate and collect name of next keywords
+    output_line(state, "highlight link %s %s" % (symbol_name, group_name))
+
+
+def is_literal_keyword(node: CompactNode) -> bool:
+    """
+    Check if a node is a literal keyword: no 'pattern' option and a name made only of keyword characters.
+
+    An all-uppercase name (e.g. 'TABLE') is a placeholder, not a keyword.
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :return: Returns True if the node can be emitted as a 'syntax keyword'
     :rtype: `bool`
     """
-    found = False
-    for this_child in node_path.iterdir():
-        # we are only looking for block-related child nodes
-        if this_child.name.startswith('block_'):
-            if this_child.is_dir():
-                found = True
-                break
-    return found
+    if node.pattern is not None:
+        return False
+    if node.name.isupper():
+        return False
+    return LITERAL_KEYWORD_REGEX.fullmatch(node.name) is not None
 
 
-def process_terminal_token_end_node(symbol_name: str) -> None:
+def subtree_signature(state: GeneratorState, node: CompactNode) -> str:
     """
-    We are at the terminal end of a "AST"; process end-node.
-    :param symbol_name: group name
-    :type symbol_name: `str`
-    :return: None
-    :rtype: `None`
+    Fingerprint the structure of a subtree: the names and options of its nodes, but not where it is.
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :return: a hex digest
+    :rtype: `str`
     """
-    #    print("  File: %s" % entry.name)
-    #    print("  Stack: %s" % [p.name for p in stack])  # Debug: show full stack
-    output_vimscript_comment("End-node Terminal Symbol Name (file): %s" % symbol_name)
+    def expand_unsigned(this_node: CompactNode, context: Any) -> Iterable[Tuple[CompactNode, Any]]:
+        """
+        Give the child nodes not signed yet.
+        :param this_node: a node of the syntax tree
+        :type this_node: `CompactNode`
+        :param context: unused
+        :type context: `Any`
+        :return: (child node, None) pairs
+        :rtype: `Iterable[Tuple[CompactNode, Any]]`
+        """
+        return ((this_child, None) for this_child in this_node.children
+                if this_child.path_string not in state.subtree_signatures)
+
+    def sign_node(this_node: CompactNode, context: Any, ancestors: Deque[CompactNode]) -> None:
+        """
+        Sign a node, once all of its child nodes are signed (post-order)
+        :param this_node: a node of the syntax tree
+        :type this_node: `CompactNode`
+        :param context: unused
+        :type context: `Any`
+        :param ancestors: unused
+        :type ancestors: `Deque[CompactNode]`
+        :rtype: None
+        """
+        state.subtree_signatures[this_node.path_string] = vim_fragments.fingerprint(
+            this_node.name, this_node.options_key,
+            [state.subtree_signatures[this_child.path_string] for this_child in this_node.children])
+
+    node_key = node.path_string
+    if node_key not in state.subtree_signatures:
+        tree_walk.walk(node, None, expand_unsigned, post_order=sign_node)
+    return state.subtree_signatures[node_key]
 
 
-def output_vimscript_highlight(symbol_name: str, highlight_link_label: str) -> None:
+def count_removed_match_items(state: GeneratorState, tree_root: CompactNode, nodes: Dict[str, EmittedNode]) -> int:
     """
-    Generate a Vimscript highlight command
-    :param symbol_name: The group name to be highlighted.
-    :type symbol_name: `str`
-    :param highlight_link_label:
-    :type highlight_link_label: `str`
+    Count the match items that folding sibling keywords removed: the folded nodes, and the nodes of
+    their subtrees, unless emitted through another pathway (e.g. a shared subtree) all the same.
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param tree_root: the root node of the syntax tree
+    :type tree_root: `CompactNode`
+    :param nodes: the emitted nodes, keyed by their path
+    :type nodes: `Dict[str, EmittedNode]`
+    :return: the number of match items removed
+    :rtype: `int`
+    """
+    tree = tree_root.tree
+    removed_keys: Set[str] = set()
+    # the sibling keywords folded into the group of another one, as their parent nodes list them
+    pending_nodes = [tree.node(tree.find_row(this_key, this_name)) for this_node in nodes.values()
+                     for _, _, _, these_folded_siblings in this_node.child_entries
+                     for this_key, this_name in these_folded_siblings]
+    while pending_nodes:
+        node = pending_nodes.pop()
+        node_key = node.path_string
+        # a back reference (a cycle) stands for an ancestor, which is emitted
+        if node.is_back_reference or node_key in nodes or node_key in removed_keys:
+            continue
+        removed_keys.add(node_key)
+        pending_nodes.extend(node.children)
+    return len(removed_keys)
+
+
+def plan_sibling_folds(state: GeneratorState, node: CompactNode) -> List[Tuple[CompactNode, ...]]:
+    """
+    Group the child nodes of a node into the match items that its 'nextgroup=' lists, most specific firstly.
+
+    Sibling literal keywords fold into one group when they share their options
+    (highlight, whitespace, error handlers) and their subtrees are alike, so
+    that one continuation serves them all.  Every other child node is a group
+    of its own.  A group takes the place of its first (most specific) member.
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :return: groups of child nodes, most specific firstly
+    :rtype: `List[Tuple[CompactNode, ...]]`
+    """
+    ordered_children = node_patterns.order_by_specificity(node.children)
+    if not state.emit_options.fold_sibling_keywords:
+        return [(this_child,) for this_child in ordered_children]
+    fold_groups: Dict[Any, List[CompactNode]] = {}
+    for this_child in ordered_children:
+        if is_literal_keyword(this_child):
+            fold_key: Any = repr((this_child.options_key,
+                                  [subtree_signature(state, this_grandchild) for this_grandchild in this_child.children]))
+        else:
+            fold_key = id(this_child)
+        fold_groups.setdefault(fold_key, []).append(this_child)
+    return [tuple(this_group) for this_group in fold_groups.values()]
+
+
+def output_vimscript_syn_keyword(state: GeneratorState, is_top_level: bool, node: CompactNode,
+                                 group_name: str, fold_group: Tuple[CompactNode, ...]) -> None:
+    """
+    Generate a Vimscript 'syntax keyword' for a literal keyword; Vim finds keywords by a hash lookup
+    instead of trying a regex at every column.
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param is_top_level: the node is a child node of the tree root
+    :type is_top_level: `bool`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :param group_name: The group name to be highlighted.
+    :type group_name: `str`
+    :param fold_group: the sibling nodes folded into this group (the node itself firstly)
+    :type fold_group: `Tuple[CompactNode, ...]`
     :return: None
     :rtype: `None`
     """
-    global target_file_format
-
-    group_name = target_file_format.rstrip('_') + 'HL_' + highlight_link_label
-    # iterate and collect name of next keywords
-    print("highlight link %s %s" % (symbol_name, group_name))
-    # print("highlight link %s %s" % (group_name, highlight_link_label))
-    # track all highlight group names for later output
-    my_tuple: Tuple[str, str, str] = (group_name, highlight_link_label, symbol_name)
-    target_highlights_found.add(my_tuple)
+    keywords = ' '.join(this_node.name for this_node in fold_group)
+    # 'skipwhite' stands in for the whitespace that 'syntax match' puts into its regex
+    if is_top_level:
+        output_line(state, "syntax keyword %s %s skipwhite" % (group_name, keywords))
+    else:
+        output_line(state, "syntax keyword %s %s skipwhite contained" % (group_name, keywords))
 
 
-def output_vimscript_syn_match(stack: Deque[Path], path: Path, group_name: str, node_options: Dict[str, Any],
-                               non_terminal: bool) -> None:
+def output_vimscript_syn_match(state: GeneratorState, is_top_level: bool, node: CompactNode,
+                               group_name: str, non_terminal: bool, fold_group: Tuple[CompactNode, ...]) -> None:
     """
 
-    :param stack: a stack of Path objects representing the current traversal path
-    :type stack: `Deque[Path]`
-    :param path: a filepath to a node
-    :type path: `Path`
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param is_top_level: the node is a child node of the tree root
+    :type is_top_level: `bool`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
     :param group_name: The group name to be highlighted.
     :type group_name: `str`
-    :param node_options: options from .config.ini file
-    :type node_options: `Dict[str, Any]`
     :param non_terminal: True if non-terminal node, False if terminal node
     :type non_terminal: `bool`
+    :param fold_group: the sibling nodes folded into this group (the node itself firstly)
+    :type fold_group: `Tuple[CompactNode, ...]`
     :return: None
     :rtype: `None`
     """
+    if state.emit_options.use_syntax_keywords and is_literal_keyword(node):
+        output_vimscript_syn_keyword(state, is_top_level, node, group_name, fold_group)
+        return
+
     # Use default
-    pattern = '\\v' + path.name
-
-    # 'skipwhite' Vimscript syntax option is mostly useless here (only does '\s*' or not)
-    # for a deterministic syntax pathway, we default to 'atleastwhitespace' '\s+', so we do this in regex
-    if node_options:
-        if 'pattern' in node_options:
-            option_pattern: str = node_options['pattern']
-            regex_pattern = option_pattern
-            regex_pattern = regex_pattern.rstrip('\'').lstrip('\'')
-            if non_terminal:
-                pattern = '\\v' + regex_pattern
-            elif not non_terminal:
-                pattern = '\\v' + regex_pattern
-
-        # Pretty much always expect a space after each keyword so make that its default
-        minimum_whitespace = ''
-        if node_options['squishable_with_next_token']:
-            squished_tokens = node_options['squishable_with_next_token']
-            if squished_tokens:
-                # Also, one other thing: do NOT USE '\s'; use '[ \t]'...  too many syntax options differentiate those
-                minimum_whitespace = '[ \\t]{0,5}'
-            else:
-                minimum_whitespace = '[ \\t]{1,5}'
-
-        pattern = pattern + minimum_whitespace
+    default_regex = None
+    if len(fold_group) > 1:
+        # one prefix-trie regex for all folded sibling keywords
+        default_regex = regexp_opt.optimize([this_node.name for this_node in fold_group])
+    pattern = '\\v' + node_patterns.match_regex(node, default_regex)
 
     # TODO: Root-level keywords do not use 'contained' syntax option in a deterministic pathway design (LL(1))
-    if is_root_node(stack):
-        print("syntax match %s '%s'" % (group_name, pattern))
+    if is_top_level:
+        output_line(state, "syntax match %s '%s'" % (group_name, pattern))
     else:
-        print("syntax match %s '%s' contained" % (group_name, pattern))
+        output_line(state, "syntax match %s '%s' contained" % (group_name, pattern))
+
+
+def get_canonical_symbol_names(state: GeneratorState, node: CompactNode) -> Tuple[str, str, str]:
+    """
+    Name a node after its real place in the syntax tree, however it was reached (e.g. through a symlink).
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :return: its group name, the symbol name that the group names of its child nodes extend,
+             and the converted part of its name
+    :rtype: `Tuple[str, str, str]`
+    """
+    node_key = node.path_string
+    names = state.canonical_symbol_names.get(node_key)
+    if names is None:
+        with build_profile.phase('symbol construction'):
+            dir_symbol_name = construct_symbol_name.get_root_dir(state.symbol_prefix)
+            component = ''
+            parent_name = os.path.basename(state.tree_root_path)
+            symbol_name = dir_symbol_name
+            for this_part in Path(node_key).relative_to(state.tree_root_path).parts:
+                symbol_name = construct_symbol_name.get_child(dir_symbol_name, parent_name, this_part)
+                dir_symbol_name, component = construct_symbol_name.get_child_dir(dir_symbol_name, component,
+                                                                                 this_part)
+                parent_name = this_part
+        names = (symbol_name, dir_symbol_name, component)
+        state.canonical_symbol_names[node_key] = names
+    return names
+
+
+def is_linked_child(state: GeneratorState, node: CompactNode, child: CompactNode) -> bool:
+    """
+    Check if a child node really lives elsewhere in the syntax tree (it was reached through a symlink).
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :param child: a child node of that node
+    :type child: `CompactNode`
+    :return: Returns True if the child node is to be named after its real place
+    :rtype: `bool`
+    """
+    # a symlink out of the syntax tree is named where it is found
+    child_path = child.path_string
+    return (os.path.dirname(child_path) != node.path_string
+            and (child_path == state.tree_root_path or child_path.startswith(state.tree_root_path + os.sep)))
 
 
-def output_vimscript_nextgroup(path: Path, group_name: str) -> None:
+def get_child_symbol_name(state: GeneratorState, node: CompactNode, dir_symbol_name: str, child: CompactNode) -> str:
+    """
+    Give the group name that a child node is defined with; a shared subtree has the one name of its real place.
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :param dir_symbol_name: The symbol name that the group names of child nodes extend.
+    :type dir_symbol_name: `str`
+    :param child: a child node of that node
+    :type child: `CompactNode`
+    :return: the group name of the child node
+    :rtype: `str`
+    """
+    if is_linked_child(state, node, child):
+        return get_canonical_symbol_names(state, child)[0]
+    with build_profile.phase('symbol construction'):
+        return construct_symbol_name.get_child(dir_symbol_name, node.name, child.name)
+
+
+def output_vimscript_nextgroup(state: GeneratorState, node: CompactNode, dir_symbol_name: str) -> None:
     """
     Output the 'nextgroup=' and all its group names. If no child nodes, then no 'nextgroup='
-    :param path: a filepath to a node
-    :type path: `Path`
-    :param group_name: The group name to be highlighted.
-    :type group_name: `str`
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :param dir_symbol_name: The symbol name that the group names of child nodes extend.
+    :type dir_symbol_name: `str`
     :return: None
     :rtype: `None`
     """
-    if any_child_node_exists(path):
-        print("\\ nextgroup=")
-        # compile a list of group labels (store their pattern length/complexity)
-        for this_filename in path.iterdir():
-            if this_filename.name.startswith('.'):
-                continue
-            this_keyword = this_filename.name
-            this_symbol_name = construct_symbol_name.convert(group_name, this_keyword)
-            this_group_name = group_name + '_' + this_symbol_name
-            print("\\    %s," % this_group_name)  # output the length-lexical sort order of group names
+    if any_child_node_exists(node):
+        # compile a list of group labels, sorted by their pattern specificity (length/complexity)
+        for this_fold_group in plan_sibling_folds(state, node):
+            # exactly the group name that the child node (or its fold group) is defined with
+            this_group_name = get_child_symbol_name(state, node, dir_symbol_name, this_fold_group[0])
+            state.fragment.add_nextgroup(this_group_name)
 
 
-def output_vimscript_nextgroup_error_handlers(error_options: Dict[str, Any]) -> None:
+def output_vimscript_nextgroup_error_handlers(state: GeneratorState, node: CompactNode) -> None:
     """
     Fill out the end of Vimscript syntax 'nextgroup=' with more Error Handlers
-    :param error_options: options from .config.ini file
-    :type error_options: `Dict[str, Any]`
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
     :return: None
     :rtype: `None`
     """
-    global target_symbol_prefix
-
-    if not error_options:
-        print('\\    nft_Error')
-        return
-    if 'follow_on_to_only' not in error_options:
-        print('\\    nft_Error')
-        return
-    follow_on_to_only = error_options['follow_on_to_only']
-    #  new_line,end_of_statement,start_block_delimiter,end_block_delimiter,equal,start_parenthesis,end_parenthesis,slash,at_symbol,dot,comma,colon,plus,dash,asterisk
-
-    list_of_foto = follow_on_to_only.split(',')
-    # concatenate a list of antipattern firstly
-
-    if 'equal' in list_of_foto:
-        list_of_foto.remove('equal')
-        add_on_pattern = '='
-        new_error_group_name = target_symbol_prefix + 'Error_equal_not_found'
-        print('\\    %s' % new_error_group_name)
-        final_antipattern = r'\v[^' + add_on_pattern + ']'
-        target_error_defined.append((new_error_group_name, add_on_pattern,
-                                     final_antipattern))  # print('error_defined (running): ', errors_defined)
-    # TODO: construct unique error handler
-    if not not list_of_foto:
-        print('" WARNING: remaining unprogrammed follow_on_to_only options: ', list_of_foto)
+    follow_on_to_only = node.follow_on_to_only
+    if follow_on_to_only is None:
+        if not state.emit_options.default_error_group:
+            return
+        error_handler = error_handlers.compile_default(state.symbol_prefix)
+    else:
+        # one antipattern group per distinct set of follow-on tokens, shared by every node listing that set
+        error_handler = error_handlers.compile_follow_on(state.symbol_prefix, follow_on_to_only)
+        if error_handler is None:
+            # no follow-on token listed: anything may follow
+            return
+    state.fragment.add_nextgroup(error_handler.group_name)
+    state.fragment.add_error(tuple(error_handler))
 
 
-def process_node_nonterminal(path: Path, symbol_name: str, stack: Deque[Path]) -> None:
+def process_node_nonterminal(state: GeneratorState, node: CompactNode, symbol_name: str, dir_symbol_name: str,
+                             is_top_level: bool, fold_group: Tuple[CompactNode, ...]) -> None:
     """
     Process non-terminal node into a Vimscript group name and emit appropriate Vimscript syntax statements.
-    :param path: a filepath to a node
-    :type path: `Path`
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
     :param symbol_name: The group name to be highlighted.
     :type symbol_name: `str`
-    :param stack: a stack of Path objects representing the current traversal path
-    :type stack: `Deque[Path]`
+    :param dir_symbol_name: The symbol name that the group names of child nodes extend.
+    :type dir_symbol_name: `str`
+    :param is_top_level: the node is a child node of the tree root
+    :type is_top_level: `bool`
+    :param fold_group: the sibling nodes folded into this group (the node itself firstly)
+    :type fold_group: `Tuple[CompactNode, ...]`
     :return: None
     :rtype: `None`
     """
     #    print("  File: %s" % entry)
     #    print("  Stack: %s" % [p.name for p in stack])  # Debug: show full stack
-    node_options = parse_simple_ini.get_node_options(path)
-    if node_options and 'pattern' in node_options:
-        pattern = '\\v' + node_options['pattern'].rstrip('\'').lstrip('\'')
-        output_vimscript_comment("Non-terminal symbol (dir): ' + symbol_name + ' (has .config.ini; pattern: " + pattern)
+    if node.pattern is not None:
+        pattern = '\\v' + node.pattern.rstrip('\'').lstrip('\'')
+        output_vimscript_comment(state, "Non-terminal symbol (dir): ' + symbol_name + ' (has .config.ini; pattern: " + pattern)
     else:
-        output_vimscript_comment("Non-terminal symbol (dir): %s" % path.name)
-    output_vimscript_comment(str(path))
-    if 'highlight_color_name' in node_options:
-        output_vimscript_highlight(symbol_name, node_options['highlight_color_name'])
+        output_vimscript_comment(state, "Non-terminal symbol (dir): %s" % node.name)
+    output_vimscript_comment(state, node.path_string)
+    if node.highlight_color_name is not None:
+        output_vimscript_highlight(state, symbol_name, node.highlight_color_name)
 
     # There is a loop here for multiple patterns using exact same group name
-    output_vimscript_syn_match(stack, path, symbol_name, node_options, non_terminal=True)
-    output_vimscript_nextgroup(path, symbol_name)
-    output_vimscript_nextgroup_error_handlers(node_options)
-    output_vimscript_comment('')
+    if len(fold_group) > 1:
+        output_vimscript_comment(state, "Folded sibling keywords: %s" % ', '.join(n.name for n in fold_group))
+    output_vimscript_syn_match(state, is_top_level, node, symbol_name, non_terminal=True, fold_group=fold_group)
+    with build_profile.phase('nextgroup emission'):
+        output_vimscript_nextgroup(state, node, dir_symbol_name)
+        output_vimscript_nextgroup_error_handlers(state, node)
+    output_vimscript_comment(state, '')
 
 
-def process_end_node_terminal(path: Path, symbol_name: str, stack: Deque[Path]) -> None:
+def process_end_node_terminal(state: GeneratorState, node: CompactNode, symbol_name: str,
+                              is_top_level: bool, fold_group: Tuple[CompactNode, ...]) -> None:
     """
 
-    :param path: a filepath to a node
-    :type path: `Path`
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
     :param symbol_name: The group name to be highlighted.
     :type symbol_name: `str`
-    :param stack: a stack of Path objects representing the current traversal path
-    :type stack: `Deque[Path]`
+    :param is_top_level: the node is a child node of the tree root
+    :type is_top_level: `bool`
+    :param fold_group: the sibling nodes folded into this group (the node itself firstly)
+    :type fold_group: `Tuple[CompactNode, ...]`
     :return: None
     :rtype: `None`
     """
-    node_options = parse_simple_ini.get_node_options(path)
-    if node_options:
-        output_vimscript_comment("Terminal symbol (dir): ' + symbol_name + ' (has .config.ini)")
-        if 'pattern' in node_options:
-            output_vimscript_comment("(pattern defined)")
+    if node.has_options:
+        output_vimscript_comment(state, "Terminal symbol (dir): ' + symbol_name + ' (has .config.ini)")
+        if node.pattern is not None:
+            output_vimscript_comment(state, "(pattern defined)")
         else:
-            output_vimscript_comment("(default pattern used)")
+            output_vimscript_comment(state, "(default pattern used)")
     else:
-        output_vimscript_comment("Terminal symbol (dir): " + symbol_name)
+        output_vimscript_comment(state, "Terminal symbol (dir): " + symbol_name)
 
     # There is a loop here for multiple patterns using exact same group name
-    output_vimscript_comment(str(path))
-    if 'highlight_color_name' in node_options:
-        output_vimscript_highlight(symbol_name, node_options['highlight_color_name'])
-    output_vimscript_syn_match(stack, path, symbol_name, node_options, non_terminal=False)
-    output_vimscript_comment('')
+    output_vimscript_comment(state, node.path_string)
+    if node.highlight_color_name is not None:
+        output_vimscript_highlight(state, symbol_name, node.highlight_color_name)
+    if len(fold_group) > 1:
+        output_vimscript_comment(state, "Folded sibling keywords: %s" % ', '.join(n.name for n in fold_group))
+    output_vimscript_syn_match(state, is_top_level, node, symbol_name, non_terminal=False, fold_group=fold_group)
+    output_vimscript_comment(state, '')
 
 
-def start_directory_traverse(start_dirpath: Path, hidden_prefix: str, prefix: str = 'nft_') -> None:
+class NodeContext(NamedTuple):
+    """
+    What the traversal carries down to a node from its parent node.
     """
+    symbol_name: str  # the group name of the node
+    dir_symbol_name: str  # the finished symbol name of the node that child names extend
+    component: str  # the converted part of the node name
+    fold_group: Tuple[CompactNode, ...]  # the sibling nodes folded into the group of the node (itself firstly)
+    is_top_level: bool  # the node is a child node of the tree root
+    is_tree_root: bool = False
 
-    :param start_dirpath: Path to the root of syntax tree
-    :type start_dirpath: `Path`
-    :param hidden_prefix: a prefix for hidden files
-    :type hidden_prefix: `str`
-    :param prefix: a prefix for the highlight group names
-    :type prefix: `str`
-    :return: None
-    :rtype: `None`
+    @property
+    def symbol_names(self) -> Tuple[str, str, str]:
+        """The names of the node, as an emitted node keeps them."""
+        return self.symbol_name, self.dir_symbol_name, self.component
+
+    @property
+    def folded_siblings(self) -> Tuple[FoldedSibling, ...]:
+        """The sibling keywords folded into the group of the node, as an emitted node keeps them."""
+        return tuple((this_node.path_string, this_node.name) for this_node in self.fold_group[1:])
+
+
+class WalkedNode(NamedTuple):
+    """
+    A node as the traversal meets it: a node of the tree, or one that a previous run listed as a child node.
+    """
+    key: str
+    name: str
+    node: Optional[CompactNode]  # None until it is looked up in the tree (a re-used node never is)
+
+
+def get_child_symbol_names(state: GeneratorState, node: CompactNode, context: NodeContext,
+                           child: CompactNode) -> Tuple[str, str, str]:
+    """
+    Give the names that a child node is emitted with; a shared subtree has the names of its real place.
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :param context: the context of the node
+    :type context: `NodeContext`
+    :param child: a child node of that node
+    :type child: `CompactNode`
+    :return: its group name, the symbol name that the group names of its child nodes extend,
+             and the converted part of its name
+    :rtype: `Tuple[str, str, str]`
+    """
+    if is_linked_child(state, node, child):
+        return get_canonical_symbol_names(state, child)
+    # only the new path component gets converted
+    with build_profile.phase('symbol construction'):
+        return (construct_symbol_name.get_child(context.dir_symbol_name, node.name, child.name),
+                *construct_symbol_name.get_child_dir(context.dir_symbol_name, context.component, child.name))
+
+
+def find_child_entries(state: GeneratorState, node: CompactNode, context: NodeContext) \
+        -> Tuple[Tuple[ChildEntry, ...], List[Tuple[WalkedNode, NodeContext]]]:
+    """
+    Give the child nodes of a node to traverse, in traversal order, each with its context.
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :param context: the context of the node
+    :type context: `NodeContext`
+    :return: the child entries (as an emitted node keeps them), and (child node, child context) pairs
+    :rtype: `Tuple[Tuple[ChildEntry, ...], List[Tuple[WalkedNode, NodeContext]]]`
+    """
+    if context.is_tree_root:
+        # top-level nodes are in no 'nextgroup=', so they are never folded; they compete at every
+        # column too: the most specific one is defined lastly
+        fold_groups: List[Tuple[CompactNode, ...]] = [
+            (this_child,) for this_child in reversed(node_patterns.order_by_specificity(node.children))]
+    else:
+        # Vim prefers the last defined of the items matching at the same column, so the most
+        # specific sibling is defined lastly (README item 4)
+        fold_groups = list(reversed(plan_sibling_folds(state, node)))
+    child_entries: List[ChildEntry] = []
+    child_contexts: List[Tuple[WalkedNode, NodeContext]] = []
+    for this_fold_group in fold_groups:
+        # the other members of a fold group (and their alike subtrees) are served by the first one
+        this_child = this_fold_group[0]
+        # a back reference (a cycle) stands for an ancestor
+        if this_child.is_back_reference:
+            continue
+        child_symbol_names = get_child_symbol_names(state, node, context, this_child)
+        child_context = NodeContext(*child_symbol_names, this_fold_group, context.is_tree_root)
+        child_entries.append((this_child.path_string, this_child.name, child_symbol_names,
+                              child_context.folded_siblings))
+        child_contexts.append((WalkedNode(this_child.path_string, this_child.name, this_child), child_context))
+    return tuple(child_entries), child_contexts
+
+
+def emit_fragment(state: GeneratorState, node: CompactNode, context: NodeContext,
+                  child_entries: Tuple[ChildEntry, ...]) -> EmittedNode:
+    """
+    Emit the Vimscript fragment of a node.
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :param context: the context of the node
+    :type context: `NodeContext`
+    :param child_entries: its child nodes to traverse, in traversal order
+    :type child_entries: `Tuple[ChildEntry, ...]`
+    :return: the emitted node
+    :rtype: `EmittedNode`
+    """
+    dependencies = (node.path_string, *(this_child.path_string for this_child in node.children))
+    if context.is_tree_root:
+        # the tree root itself is emitted by no one
+        return EmittedNode(node.name, None, context.symbol_names, False, (), child_entries, dependencies)
+    if state.emit_options.fold_sibling_keywords:
+        # which sibling keywords fold together depends on their child nodes too (on which copy each is,
+        # as alike subtrees are merged into one)
+        dependencies += tuple(this_grandchild.path_string for this_child in node.children
+                              for this_grandchild in this_child.children)
+    state.fragment = FragmentBuilder()
+    fold_group = context.fold_group or (node,)
+    # Lookahead for not non-terminal (terminal) node
+    if any_child_node_exists(node):
+        process_node_nonterminal(state, node, context.symbol_name, context.dir_symbol_name, context.is_top_level,
+                                 fold_group)
+    else:
+        process_end_node_terminal(state, node, context.symbol_name, context.is_top_level, fold_group)
+    state.emitted_count += 1
+    return EmittedNode(node.name, state.fragment.build(), context.symbol_names, context.is_top_level,
+                       context.folded_siblings, child_entries, dependencies)
+
+
+def look_up_fold_group(tree: compact_tree.CompactTree, key: str, name: str,
+                       folded_siblings: Tuple[FoldedSibling, ...]) -> Optional[Tuple[CompactNode, ...]]:
+    """
+    Look up the fold group of a node that a previous run listed, in the tree.
+    :param tree: the compact syntax tree
+    :type tree: `compact_tree.CompactTree`
+    :param key: the key of the node
+    :type key: `str`
+    :param name: the name of the node
+    :type name: `str`
+    :param folded_siblings: the sibling keywords that were folded into its group
+    :type folded_siblings: `Tuple[FoldedSibling, ...]`
+    :return: the node and its folded siblings, none if it has none; None if one of them is gone from the tree
+    :rtype: `Optional[Tuple[CompactNode, ...]]`
+    """
+    if not folded_siblings:
+        return ()
+    rows = [tree.find_row(this_key, this_name) for this_key, this_name in ((key, name), *folded_siblings)]
+    if None in rows:
+        return None
+    return tuple(tree.node(this_row) for this_row in rows)
+
+
+def traverse_subtree(state: GeneratorState, tree_root: CompactNode, subtree: WalkedNode, subtree_context: NodeContext,
+                     nodes: Dict[str, EmittedNode], previous_nodes: Optional[Dict[str, EmittedNode]] = None,
+                     affected_keys: AbstractSet[str] = frozenset()) -> Dict[str, EmittedNode]:
+    """
+    Traverse one top-level subtree and emit a Vimscript fragment for each of its nodes.
+
+    A subtree shared by many pathways (through symlinks) is emitted once, at the
+    first pathway reaching it, and named after its real place; the other
+    pathways only refer to it.  A node of a previous run that no change affects,
+    met with the same names, is re-used along with its child entries: the tree
+    is only looked up for the other nodes.
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param tree_root: the root node of the syntax tree
+    :type tree_root: `CompactNode`
+    :param subtree: a top-level node
+    :type subtree: `WalkedNode`
+    :param subtree_context: the context of the top-level node
+    :type subtree_context: `NodeContext`
+    :param nodes: nodes emitted so far (by other subtrees), to add to
+    :type nodes: `Dict[str, EmittedNode]`
+    :param previous_nodes: the nodes of a previous run, if any
+    :type previous_nodes: `Optional[Dict[str, EmittedNode]]`
+    :param affected_keys: the nodes of the previous run whose fragment may differ now
+    :type affected_keys: `AbstractSet[str]`
+    :return: nodes keyed by their path, in output order
+    :rtype: `Dict[str, EmittedNode]`
     """
+    state.tree_root_path = tree_root.path_string
+    tree = tree_root.tree
+    # the child entries that expand_node() found in the tree, for emit_node()
+    found_child_entries: Dict[str, Tuple[ChildEntry, ...]] = {}
+
+    def find_reusable(walked: WalkedNode, context: NodeContext) -> Optional[EmittedNode]:
+        """
+        Give the node of the previous run that a node can be re-used from
+        :param walked: a node met by the traversal
+        :type walked: `WalkedNode`
+        :param context: the context of the node
+        :type context: `NodeContext`
+        :return: the node of the previous run, None if the node is to be emitted again
+        :rtype: `Optional[EmittedNode]`
+        """
+        if previous_nodes is None or walked.key in affected_keys:
+            return None
+        previous_node = previous_nodes.get(walked.key)
+        if (previous_node is None or previous_node.symbol_names != context.symbol_names
+                or previous_node.is_top_level != context.is_top_level
+                or previous_node.folded_siblings != context.folded_siblings):
+            return None
+        return previous_node
+
+    def look_up(walked: WalkedNode) -> CompactNode:
+        """
+        Give the node of the tree that a node met by the traversal is
+        :param walked: a node met by the traversal
+        :type walked: `WalkedNode`
+        :return: the node of the syntax tree
+        :rtype: `CompactNode`
+        """
+        if walked.node is not None:
+            return walked.node
+        # an unaffected parent node keeps its child nodes: they are still in the tree
+        return tree.node(tree.find_row(walked.key, walked.name))
+
+    def expand_node(walked: WalkedNode, context: NodeContext) -> Iterable[Tuple[WalkedNode, NodeContext]]:
+        """
+        Give the child nodes to traverse, each with its context; the names are carried down from the node.
+        :param walked: a node met by the traversal
+        :type walked: `WalkedNode`
+        :param context: the context of the node
+        :type context: `NodeContext`
+        :return: (child node, child context) pairs, in traversal order
+        :rtype: `Iterable[Tuple[WalkedNode, NodeContext]]`
+        """
+        if context.is_tree_root:
+            return [(subtree, subtree_context)]
+        previous_node = find_reusable(walked, context)
+        if previous_node is not None:
+            # a folded child node is looked up along with its siblings, should it be emitted again
+            child_contexts = [(WalkedNode(this_key, this_name, None),
+                               NodeContext(*this_symbol_names,
+                                           look_up_fold_group(tree, this_key, this_name, these_folded_siblings),
+                                           False))
+                              for this_key, this_name, this_symbol_names, these_folded_siblings
+                              in previous_node.child_entries]
+        else:
+            found_child_entries[walked.key], child_contexts = find_child_entries(state, look_up(walked), context)
+        # a shared subtree is emitted once: a child node is skipped if an earlier sibling's
+        # subtree emitted it, so the check is made as the walk reaches each one
+        return ((this_child, this_context) for this_child, this_context in child_contexts
+                if this_child.key not in nodes)
 
-    def traverse_recursively(path: Path, stack: Deque[Path] = deque()) -> None:
+    def emit_node(walked: WalkedNode, context: NodeContext, ancestors: Deque[WalkedNode]) -> None:
         """
-        Traverse the directory tree, that is used for an abstract syntax tree
-        :param path: a filepath to a node
-        :type path: `Path`
-        :param stack: a stack of Path objects representing the current traversal path
-        :type stack: `Deque[Path]`
+        Emit the fragment of a node (or re-use it), once all of its child nodes are emitted (post-order)
+        :param walked: a node met by the traversal
+        :type walked: `WalkedNode`
+        :param context: the context of the node
+        :type context: `NodeContext`
+        :param ancestors: unused
+        :type ancestors: `Deque[WalkedNode]`
         :rtype: None
         """
-        stack.append(path)
-        try:
-            for entry in path.iterdir():
-                # Skip hidden files, nft_* files, and config files
-                if entry.name.startswith('.'):
-                    continue
-                if entry.name.startswith(hidden_prefix):
-                    continue
-                if entry.name.startswith('.config'):
-                    continue
-                if entry.name.endswith('.nft'):
-                    continue
+        if context.is_tree_root:
+            return
+        previous_node = find_reusable(walked, context)
+        if previous_node is not None:
+            nodes[walked.key] = previous_node
+        else:
+            nodes[walked.key] = emit_fragment(state, look_up(walked), context,
+                                              found_child_entries.pop(walked.key))
 
-                # Process directories and files appropriately
-                if entry.is_dir():
-                    traverse_recursively(entry, stack)
-                    full_symbol_name = construct_symbol_name.get_dir(stack, prefix)
-                    entry_symbol_name = full_symbol_name + '_' + construct_symbol_name.convert(path.name, entry.name)
-
-                    # Lookahead for not non-terminal (terminal) node
-                    if any_child_node_exists(entry):
-                        process_node_nonterminal(entry, entry_symbol_name, stack)
-                    else:
-                        process_end_node_terminal(entry, entry_symbol_name, stack)
-                elif entry.is_file():
-                    raise NotADirectoryError('Not sure what to do with this file', entry,
-                                             ": try cd into directory containing 'syntax-tree'")  # not sure  # full_symbol_name = construct_symbol_name.get_file(stack, path.name, prefix)  # process_terminal_token_end_node(full_symbol_name)
-
-        except PermissionError:
-            print("  Permission denied: %s" % path.name)
-        stack.pop()
-
-    # Run start_directory_traverse() with pathspec to its top-level directory
-    start_path = start_dirpath.resolve()  # Convert to Path and resolve
-    if start_path.is_file():
-        print("Path %s is a file, not a directory; aborted." % start_path.name)
-        return
-    if not start_path.is_dir():
-        print("Path %s is not a directory; aborted." % start_path.name)
+    root_context = NodeContext('', construct_symbol_name.get_root_dir(state.symbol_prefix), '', (), False, True)
+    tree_walk.walk(WalkedNode(tree_root.path_string, tree_root.name, tree_root), root_context, expand_node,
+                   post_order=emit_node)
+    state.fragment = FragmentBuilder()
+    return nodes
+
+
+def collect_fragment_findings(state: GeneratorState, nodes: Dict[str, EmittedNode]) -> None:
+    """
+    Collect what every fragment found (including re-used ones), in output order
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param nodes: nodes keyed by their path, in output order
+    :type nodes: `Dict[str, EmittedNode]`
+    :return: None
+    :rtype: `None`
+    """
+    for this_node in nodes.values():
+        if this_node.fragment is None:
+            continue
+        for this_error_handler in this_node.fragment.errors:
+            state.error_defined.setdefault(this_error_handler[0], this_error_handler)
+
+
+def run_subtree_job(symbol_prefix: str, file_format: str, emit_options: EmitOptions, tree_root: CompactNode,
+                    subtree: WalkedNode, subtree_context: NodeContext) \
+        -> Tuple[Dict[str, EmittedNode], int, Optional[build_profile.ProfileReport]]:
+    """
+    Emit the fragments of one top-level subtree with a state of its own (runs in a worker process).
+    :param symbol_prefix: a prefix for the highlight group names
+    :type symbol_prefix: `str`
+    :param file_format: the file format
+    :type file_format: `str`
+    :param emit_options: how the Vimscript is emitted
+    :type emit_options: `EmitOptions`
+    :param tree_root: the root node of the syntax tree
+    :type tree_root: `CompactNode`
+    :param subtree: a top-level node
+    :type subtree: `WalkedNode`
+    :param subtree_context: the context of the top-level node
+    :type subtree_context: `NodeContext`
+    :return: the emitted nodes, the number of fragments emitted, and the profile of the job (under --profile)
+    :rtype: `Tuple[Dict[str, EmittedNode], int, Optional[build_profile.ProfileReport]]`
+    """
+    if build_profile.enabled:
+        # a worker process measures only its own job
+        build_profile.reset()
+    job_state = GeneratorState(symbol_prefix=symbol_prefix, file_format=file_format, emit_options=emit_options)
+    job_nodes = traverse_subtree(job_state, tree_root, subtree, subtree_context, {})
+    return job_nodes, job_state.emitted_count, build_profile.optional_report()
+
+
+def start_directory_traverse(state: GeneratorState, tree_root: CompactNode,
+                             previous_nodes: Optional[Dict[str, EmittedNode]] = None,
+                             affected_keys: AbstractSet[str] = frozenset(),
+                             jobs: int = 1) -> Dict[str, EmittedNode]:
+    """
+    Traverse the in-memory syntax tree and emit a Vimscript fragment for each of its nodes.
+
+    Top-level subtrees are independent of each other; with more than one job, they are
+    fanned out to a process pool and merged back in tree order, so the output is the
+    same as that of a serial run.  A subtree shared by two top-level subtrees is emitted
+    by both jobs, under the same key and name, and merged into one.
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param tree_root: the root node of the syntax tree
+    :type tree_root: `CompactNode`
+    :param previous_nodes: the nodes of a previous run, re-used where no change affects them (serially)
+    :type previous_nodes: `Optional[Dict[str, EmittedNode]]`
+    :param affected_keys: the nodes of the previous run whose fragment may differ now
+    :type affected_keys: `AbstractSet[str]`
+    :param jobs: number of worker processes
+    :type jobs: `int`
+    :return: nodes keyed by their path, in output order; the tree root lastly
+    :rtype: `Dict[str, EmittedNode]`
+    """
+    state.tree_root_path = tree_root.path_string
+    root_key = tree_root.path_string
+    root_context = NodeContext('', construct_symbol_name.get_root_dir(state.symbol_prefix), '', (), False, True)
+    root_node = None if previous_nodes is None or root_key in affected_keys else previous_nodes.get(root_key)
+    if root_node is not None:
+        # top-level nodes are never folded
+        subtree_contexts = [(WalkedNode(this_key, this_name, None), NodeContext(*this_symbol_names, (), True))
+                            for this_key, this_name, this_symbol_names, _ in root_node.child_entries]
+    else:
+        root_child_entries, subtree_contexts = find_child_entries(state, tree_root, root_context)
+        root_node = emit_fragment(state, tree_root, root_context, root_child_entries)
+
+    nodes: Dict[str, EmittedNode] = {}
+    if jobs <= 1 or len(subtree_contexts) <= 1 or previous_nodes is not None:
+        for this_subtree, this_subtree_context in subtree_contexts:
+            # a top-level node may be a shared subtree that an earlier one emitted
+            if this_subtree.key not in nodes:
+                traverse_subtree(state, tree_root, this_subtree, this_subtree_context, nodes, previous_nodes,
+                                 affected_keys)
+        nodes[root_key] = root_node
+        return nodes
+
+    # Ship each worker the compact tree (a few flat arrays) and its own top-level node
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        job_futures = [executor.submit(run_subtree_job, state.symbol_prefix, state.file_format,
+                                       state.emit_options, tree_root, this_subtree, this_subtree_context)
+                       for this_subtree, this_subtree_context in subtree_contexts]
+        # merge in submission (tree) order, never in completion order
+        for this_future in job_futures:
+            job_nodes, job_emitted_count, job_profile = this_future.result()
+            for key, this_node in job_nodes.items():
+                nodes.setdefault(key, this_node)
+            state.emitted_count += job_emitted_count
+            if job_profile is not None:
+                build_profile.merge(job_profile)
+    nodes[root_key] = root_node
+    return nodes
+
+
+def emit_in_place(state: GeneratorState, tree_root: CompactNode, previous_nodes: Dict[str, EmittedNode],
+                  affected_keys: AbstractSet[str]) -> Optional[Dict[str, EmittedNode]]:
+    """
+    Emit again only the affected nodes of a previous run, where they were, without traversing the tree.
+
+    This holds as long as none of them has other child nodes to traverse than
+    before: the traversal would then meet every node in the same order, with
+    the same names.
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param tree_root: the root node of the syntax tree
+    :type tree_root: `CompactNode`
+    :param previous_nodes: the nodes of the previous run, in output order
+    :type previous_nodes: `Dict[str, EmittedNode]`
+    :param affected_keys: the nodes of the previous run whose fragment may differ now
+    :type affected_keys: `AbstractSet[str]`
+    :return: nodes keyed by their path, in output order; None if the tree is to be traversed
+    :rtype: `Optional[Dict[str, EmittedNode]]`
+    """
+    state.tree_root_path = tree_root.path_string
+    tree = tree_root.tree
+    changed_nodes = []
+    for this_key in affected_keys:
+        previous_node = previous_nodes.get(this_key)
+        row = None if previous_node is None else tree.find_row(this_key, previous_node.name)
+        if row is None:
+            # the node is gone (and so its parent node has other child nodes)
+            return None
+        fold_group = look_up_fold_group(tree, this_key, previous_node.name, previous_node.folded_siblings)
+        if fold_group is None:
+            # a folded sibling is gone (and so its parent node has other child nodes)
+            return None
+        node = tree.node(row)
+        context = NodeContext(*previous_node.symbol_names, fold_group, previous_node.is_top_level,
+                              previous_node.fragment is None)
+        child_entries, _ = find_child_entries(state, node, context)
+        if child_entries != previous_node.child_entries:
+            return None
+        changed_nodes.append((this_key, node, context, child_entries))
+    nodes = dict(previous_nodes)
+    for this_key, node, context, child_entries in changed_nodes:
+        nodes[this_key] = emit_fragment(state, node, context, child_entries)
+    return nodes
+
+
+def find_full_emit_reason(previous_store: Optional[FragmentStore], settings: Tuple[Any, ...]) -> Optional[str]:
+    """
+    Tell why the fragments of a previous run cannot be re-used, if they cannot.
+    :param previous_store: the fragment store of the previous run, if any
+    :type previous_store: `Optional[FragmentStore]`
+    :param settings: what every fragment depends on
+    :type settings: `Tuple[Any, ...]`
+    :return: the reason, None if the fragments can be re-used
+    :rtype: `Optional[str]`
+    """
+    if previous_store is None:
+        return 'no previous run'
+    if previous_store.settings != settings:
+        return 'other settings than the previous run'
+    return None
+
+
+def generate_vimscript(state: GeneratorState, output_file: TextIO, tree_root: CompactNode,
+                       manifest: Dict[str, StatSignature], representatives: Dict[str, str],
+                       previous_store: Optional[FragmentStore] = None,
+                       jobs: int = 1, verbose: bool = False) -> FragmentStore:
+    """
+    Emit the Vimscript syntax of a loaded syntax tree.
+
+    With the fragment store of a previous run, only the nodes derived from a
+    changed directory (per the tree manifest) are emitted again, and spliced
+    into the lines of the previous output.  A change to a copy of identical
+    subtrees is one to the copy emitted for them all (its representative).
+    :param state: the state of this generator job
+    :type state: `GeneratorState`
+    :param output_file: the output file
+    :type output_file: `TextIO`
+    :param tree_root: the root node of the syntax tree
+    :type tree_root: `CompactNode`
+    :param manifest: stat signatures of every directory and config file of the syntax tree
+    :type manifest: `Dict[str, StatSignature]`
+    :param representatives: the copy emitted, by path of every other copy of a subtree (merged into it)
+    :type representatives: `Dict[str, str]`
+    :param previous_store: the fragment store of a previous run, if any
+    :type previous_store: `Optional[FragmentStore]`
+    :param jobs: number of worker processes
+    :type jobs: `int`
+    :param verbose: report the size saved by clusters, and why no fragment was re-used
+    :type verbose: `bool`
+    :return: the fragment store of this run
+    :rtype: `FragmentStore`
+    """
+    state.fragment = FragmentBuilder()
+    output_vimscript_comment(state, 'AUTO-GENERATED BY YOURS TRULY!')
+    # Need to declare highlight firstly before anything
+    with build_profile.phase('highlight collection'):
+        output_vimscript_highlight_defaults(state, tree_root)
+    preamble_fragment = state.fragment.build()
+
+    settings = (state.symbol_prefix, state.file_format, state.emit_options, tree_root.path_string)
+    full_emit_reason = find_full_emit_reason(previous_store, settings)
+    # Do top-level differently than rest of tree-traversing
+    with build_profile.phase('tree walk'):
+        if full_emit_reason is None:
+            affected_keys = vim_fragments.find_affected_keys(previous_store, manifest, representatives)
+            nodes = emit_in_place(state, tree_root, previous_store.nodes, affected_keys)
+            if nodes is None:
+                nodes = start_directory_traverse(state, tree_root, previous_store.nodes, affected_keys)
+        else:
+            if verbose and previous_store is not None:
+                print(f"Incremental: every fragment emitted again ({full_emit_reason})")
+            previous_store = None
+            nodes = start_directory_traverse(state, tree_root, jobs=jobs)
+    collect_fragment_findings(state, nodes)
+    # only known once every node is emitted: a folded subtree may be emitted through another pathway
+    state.removed_match_count = count_removed_match_items(state, tree_root, nodes)
+
+    # Error groups go ahead of every node: Vim prefers the last defined of the items matching
+    # at the same column, so a child node matching there wins over them
+    state.fragment = FragmentBuilder()
+    with build_profile.phase('error-label output'):
+        output_error_labels_defined(state)
+    error_fragment = state.fragment.build()
+
+    # Clusters are only known once every fragment is; they go ahead of the first node too
+    clusters: Dict[Tuple[str, ...], str] = {}
+    if state.emit_options.cluster_nextgroups:
+        clusters = vim_fragments.plan_clusters((this_node.fragment for this_node in nodes.values()
+                                                if this_node.fragment is not None), state.symbol_prefix + 'NextGroup_')
+    store = vim_fragments.build_store(previous_store, settings, representatives, manifest, nodes, clusters)
+    preamble_lines = vim_fragments.render(preamble_fragment)
+    preamble_lines.extend(vim_fragments.render(error_fragment))
+    if clusters:
+        preamble_lines.append('" Clusters of repeated nextgroup= lists')
+        preamble_lines.extend(vim_fragments.render_clusters(clusters))
+    for this_lines in (preamble_lines, store.lines):
+        output_file.writelines(this_line + '\n' for this_line in this_lines)
+    if verbose and state.emit_options.cluster_nextgroups:
+        all_fragments = [preamble_fragment, error_fragment, *(this_node.fragment for this_node in nodes.values()
+                                                              if this_node.fragment is not None)]
+        unclustered_size = sum(len(this_line) + 1 for this_fragment in all_fragments
+                               for this_line in vim_fragments.render(this_fragment))
+        clustered_size = sum(len(this_line) + 1 for this_lines in (preamble_lines, store.lines)
+                             for this_line in this_lines)
+        print(f"Clusters: {len(clusters)} 'syntax cluster' for repeated nextgroup= lists; "
+              f"{clustered_size} bytes instead of {unclustered_size} bytes")
+    return store
+
+
+def lex_sample_files(tree: compact_tree.CompactTree, sample_filespecs: Sequence[Path], verbose: bool) -> None:
+    """
+    Validate sample files with a lexer compiled from the syntax tree, and report how fast it went.
+    :param tree: the compact syntax tree
+    :type tree: `compact_tree.CompactTree`
+    :param sample_filespecs: the sample files
+    :type sample_filespecs: `Sequence[Path]`
+    :param verbose: also list every invalid line
+    :type verbose: `bool`
+    :return: None
+    :rtype: `None`
+    """
+    lexer = tree_lexer.compile_lexer(tree)
+    for this_row, this_reason in lexer.untranslatable.items():
+        print(f"Lexer: left out {lexer.describe(this_row)} (never matches): {this_reason}")
+    for this_filespec in sample_filespecs:
+        file_result = tree_lexer.validate_file(lexer, str(this_filespec))
+        print(f"Lexed {this_filespec}: {file_result.line_count} lines, {len(file_result.invalid_lines)} invalid, "
+              f"{file_result.lines_per_second:,.0f} lines/sec")
+        if verbose:
+            for this_line in file_result.invalid_lines:
+                print(f"  line {this_line.line_number}: {this_line.message}")
+
+
+def benchmark_edits(tree: compact_tree.CompactTree, sample_filespecs: Sequence[Path]) -> None:
+    """
+    Report how fast an edited document gets its tokens back, against the size of the document.
+    :param tree: the compact syntax tree
+    :type tree: `compact_tree.CompactTree`
+    :param sample_filespecs: the sample files whose lines make up the documents
+    :type sample_filespecs: `Sequence[Path]`
+    :return: None
+    :rtype: `None`
+    """
+    lexer = tree_lexer.compile_lexer(tree)
+    sample_lines: List[str] = []
+    for this_filespec in sample_filespecs:
+        with open(this_filespec, encoding='utf-8', errors='replace') as sample_file:
+            sample_lines.extend(this_line.rstrip('\r\n') for this_line in sample_file)
+    if not sample_lines:
+        print('Edit benchmark: no sample lines')
         return
+    for this_line_count in EDIT_BENCHMARK_LINE_COUNTS:
+        benchmark = tree_document.benchmark_edits(lexer, sample_lines, this_line_count)
+        print(f"Edit benchmark: {tree_document.format_benchmark(benchmark)}")
+
 
-    traverse_recursively(start_path)  # last node traversed here, what's next?
+def report_profile(profile_json_filespec: Optional[Path], file_format: str, jobs: int) -> None:
+    """
+    Print the phase times and call counts of the last (re-)generation, and append them to a JSON file.
+    :param profile_json_filespec: the JSON file (None: print only)
+    :type profile_json_filespec: `Optional[Path]`
+    :param file_format: the file format generated
+    :type file_format: `str`
+    :param jobs: the number of worker processes
+    :type jobs: `int`
+    :return: None
+    :rtype: `None`
+    """
+    profile_report = build_profile.snapshot()
+    print('Profile (phase times include the phases nested in them):')
+    for this_line in build_profile.format_table(profile_report):
+        print(this_line)
+    if profile_json_filespec:
+        build_profile.append_json(profile_json_filespec, profile_report, file_format=file_format, jobs=jobs)
 
 
 def parse_args() -> Namespace:
@@ -484,10 +1162,51 @@ def parse_args() -> Namespace:
     parser.add_argument('-t', '--template', metavar='template_dir_spec', type=Path, required=False,
                         help='Template file path')
     parser.add_argument('-o', '--output', metavar='output_dir_spec', type=Path, required=False, help='Output file path')
+    parser.add_argument('--no-cache', action='store_true', required=False,
+                        help='Do not use (nor update) the compiled syntax tree cache')
+    parser.add_argument('-i', '--incremental', action='store_true', required=False,
+                        help='Re-emit only the Vimscript of changed nodes, re-using the previous run')
+    parser.add_argument('-j', '--jobs', metavar='N', type=int, required=False, default=1,
+                        help='Number of worker processes traversing top-level subtrees (default is 1)')
+    parser.add_argument('-w', '--watch', action='store_true', required=False,
+                        help='Stay resident and regenerate whenever the corpus changes')
+    parser.add_argument('--watch-interval', metavar='seconds', type=float, required=False,
+                        default=corpus_watch.DEFAULT_POLL_INTERVAL, help='Polling interval of --watch')
+    parser.add_argument('-k', '--syntax-keywords', action='store_true', required=False,
+                        help="Emit literal keywords as 'syntax keyword' instead of 'syntax match'")
+    parser.add_argument('--fold-keywords', action='store_true', required=False,
+                        help='Fold sibling literal keywords of alike continuations into one prefix-trie regex')
+    parser.add_argument('--clusters', action='store_true', required=False,
+                        help="Emit one 'syntax cluster' per repeated nextgroup= list and use it as nextgroup=@cluster")
+    parser.add_argument('--default-error-group', action='store_true', required=False,
+                        help="Flag any character that no child node matches after a node without "
+                             "'follow_on_to_only' (default is to flag nothing there)")
+    parser.add_argument('--memory-report', action='store_true', required=False,
+                        help='Report the memory footprint of the compact syntax tree, and the peak memory of loading it')
+    parser.add_argument('--pattern-report', action='store_true', required=False,
+                        help="Report the cost of every node 'pattern' option, most expensive firstly")
+    parser.add_argument('--max-pattern-cost', metavar='cost', type=int, required=False,
+                        help="Fail the build if the cost of a node 'pattern' option exceeds this")
+    parser.add_argument('--lex', metavar='sample_filespec', type=Path, nargs='*', required=False,
+                        help='Validate sample files with a lexer compiled from the syntax tree, reporting lines/sec '
+                             '(default is every sample file kept within the syntax tree)')
+    parser.add_argument('--edit-benchmark', metavar='sample_filespec', type=Path, nargs='*', required=False,
+                        help='Time re-lexing edits of documents made of sample file lines, against document size '
+                             '(default is every sample file kept within the syntax tree)')
+    parser.add_argument('--test-corpus', action='store_true', required=False,
+                        help="Run every '.nft' sample script of the syntax tree (.hold/ too) against its lexer, "
+                             "comparing the annotated 'parser:'/'scanner:' verdicts; unchanged passing scripts "
+                             "are skipped (not with --no-cache)")
+    parser.add_argument('--profile', action='store_true', required=False,
+                        help='Time each phase and count filesystem calls and config cache hits, as a table')
+    parser.add_argument('--profile-json', metavar='json_filespec', type=Path, required=False,
+                        help='Also append the --profile results to this file as a JSON line (implies --profile)')
     parser.add_argument('-v', '--verbose', action='store_true', required=False, help='Verbosity level')
     parser.add_argument('-V', '--version', action='version', version='%(prog)s 1.0.0',
         help="Show program's version number and exit.")
     what_type = parser.parse_args()
+    if what_type.watch and (what_type.lex is not None or what_type.edit_benchmark is not None or what_type.test_corpus):
+        parser.error('--lex, --edit-benchmark and --test-corpus run once, after the generation: not with --watch')
     return what_type
 
 
@@ -495,9 +1214,6 @@ def main() -> None:
     """
     :return: None
     """
-    global target_symbol_prefix
-    global target_file_format
-
     target_symbol_prefix = ''
     args = parse_args()
     if args.file_type is None:
@@ -550,7 +1266,9 @@ def main() -> None:
     output_fileformat_dirpath = output_dirpath / Path(target_file_format)
     output_fileformat_platform_dirpath = output_fileformat_dirpath / Path(TARGET_EDITOR_PLATFORM)
     output_vim_syntax_dirpath = output_fileformat_platform_dirpath / 'syntax'
+    output_cache_dirpath = output_fileformat_dirpath / tree_cache.CACHE_DIRNAME
     vim_syntax_subdir = output_vim_syntax_dirpath
+    vim_syntax_filespec = output_vim_syntax_dirpath / (target_file_format + '.vim')
 
     # set our first global options
     options = parse_simple_ini.get_main_options(corpus_fileformat_tree_dirpath)
@@ -571,14 +1289,136 @@ def main() -> None:
     print(f"  derived from: {corpus_fileformat_platform_dirpath}")
     # Retrieve options from root 'syntax-tree/.config.main.ini
 
-    output_vimscript_comment('AUTO-GENERATED BY YOURS TRULY!')
-    # Need to declare highlight firstly before anything
-    output_vimscript_highlight_defaults(corpus_fileformat_tree_dirpath)
-
-    # Do top-level differently than rest of tree-traversing
-    start_directory_traverse(corpus_fileformat_tree_dirpath, target_symbol_prefix)
+    emit_options = EmitOptions(use_syntax_keywords=args.syntax_keywords, fold_sibling_keywords=args.fold_keywords,
+                               cluster_nextgroups=args.clusters, default_error_group=args.default_error_group)
+    if args.profile or args.profile_json:
+        build_profile.enable()
+    watched_dirpaths = [template_platform_dirpath, corpus_fileformat_platform_dirpath]
+    fragment_store: Optional[FragmentStore] = None
+    if args.incremental:
+        fragment_store = vim_fragments.load_store(output_cache_dirpath)
+
+    while True:
+        if build_profile.enabled:
+            build_profile.reset()
+        watched_dirs_snapshot = corpus_watch.snapshot_dirs(watched_dirpaths)
+        # config files read by a previous (re-)generation are re-validated, and re-read only if changed
+        parse_simple_ini.new_config_cache_generation()
+        # Load the whole syntax tree once, straight into the columns of the compact tree (array columns,
+        # a string table, a path table and bitflags); no further filesystem access while emitting
+        tree_manifest: Dict[str, StatSignature] = {}
+        try:
+            if args.memory_report:
+                tracemalloc.start()
+            with build_profile.phase('tree load'):
+                if args.no_cache:
+                    loaded_tree = syntax_tree.load(corpus_fileformat_tree_dirpath, target_symbol_prefix,
+                                                   tree_manifest)
+                else:
+                    loaded_tree = tree_cache.load_tree(corpus_fileformat_tree_dirpath, target_symbol_prefix,
+                                                       output_cache_dirpath, args.verbose, tree_manifest)
+            # Identical subtrees become one shared row, to be emitted once
+            with build_profile.phase('tree compress'):
+                compacted_tree, compression_report = tree_compress.compress(loaded_tree)
+            del loaded_tree
+            if args.memory_report:
+                _, peak_bytes = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                for this_line in compact_tree.measure(compacted_tree, peak_bytes).format():
+                    print(this_line)
+            if args.verbose:
+                print(f"Syntax tree: {compression_report.node_count} nodes, "
+                      f"{compression_report.unique_node_count} after merging identical subtrees")
+            tree_root = compacted_tree.root
+
+            # Vet the node patterns before any of them gets emitted
+            if args.pattern_report or args.max_pattern_cost is not None:
+                with build_profile.phase('pattern analysis'):
+                    pattern_costs = pattern_cost.analyze_tree(compacted_tree)
+                if args.pattern_report:
+                    print('Pattern cost report (most expensive firstly):')
+                    for this_line in pattern_cost.format_report(pattern_costs):
+                        print(this_line)
+                costly_patterns = [this_cost for this_cost in pattern_costs
+                                   if args.max_pattern_cost is not None and this_cost.cost > args.max_pattern_cost]
+                if costly_patterns:
+                    print(f"Patterns costing more than --max-pattern-cost {args.max_pattern_cost}:")
+                    for this_line in pattern_cost.format_report(costly_patterns):
+                        print(this_line)
+                    if not args.watch:
+                        raise SystemExit(f"Build failed: {len(costly_patterns)} pattern(s) over the maximum "
+                                         f"pattern cost")
+                    # Stay resident: wait for the patterns to be fixed
+                    corpus_watch.wait_for_change(tree_manifest, watched_dirs_snapshot, watched_dirpaths,
+                                                 args.watch_interval)
+                    continue
 
-    output_error_labels_defined()
+            # Every (re-)generation starts afresh with a new state
+            generator_state = GeneratorState(symbol_prefix=target_symbol_prefix, file_format=target_file_format,
+                                             emit_options=emit_options)
+            vim_syntax_output = vim_output.AtomicOutputFile(vim_syntax_filespec)
+            with build_profile.phase('output'), vim_syntax_output as output_file:
+                vim_output.copy_part(output_file, template_platform_dirpath / vim_output.HEADER_FILENAME)
+                vim_output.copy_part(output_file, corpus_fileformat_platform_dirpath / vim_output.HEADER_FILENAME)
+                fragment_store = generate_vimscript(generator_state, output_file, tree_root, tree_manifest,
+                                                    compression_report.representatives, fragment_store, args.jobs,
+                                                    args.verbose)
+                vim_output.copy_part(output_file, corpus_fileformat_platform_dirpath / vim_output.FOOTER_FILENAME)
+                vim_output.copy_part(output_file, template_platform_dirpath / vim_output.FOOTER_FILENAME)
+            print(f"Output: {vim_syntax_filespec}" + ('' if vim_syntax_output.changed else ' (unchanged)'))
+        except (ValueError, OSError) as error:
+            if not args.watch:
+                raise
+            # Stay resident through a broken intermediate edit: report it, and wait for the next one
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            print(f"Build failed: {error}", file=sys.stderr)
+            # the fragment store may be half updated: the next generation emits every fragment again
+            fragment_store = None
+            corpus_watch.wait_for_change(tree_manifest, watched_dirs_snapshot, watched_dirpaths, args.watch_interval)
+            continue
+        if emit_options.fold_sibling_keywords:
+            print(f"Folded sibling keywords: removed {generator_state.removed_match_count} match items")
+        if args.incremental:
+            vim_fragments.save_store(output_cache_dirpath, fragment_store)
+        if args.verbose and (args.incremental or args.watch):
+            print(f"Incremental: re-emitted {generator_state.emitted_count} of {fragment_store.fragment_count} "
+                  f"fragments")
+        if not args.watch:
+            break
+        if build_profile.enabled:
+            report_profile(args.profile_json, target_file_format, args.jobs)
+        # Stay resident: keep the fragment store in memory and wait for the next edit
+        corpus_watch.wait_for_change(tree_manifest, watched_dirs_snapshot, watched_dirpaths, args.watch_interval)
+
+    # Run once, on the tree of the single generation (not with --watch)
+    sample_filespecs: Sequence[Path] = ()
+    if args.lex is not None or args.edit_benchmark is not None:
+        sample_filespecs = [Path(this_filespec) for this_filespec
+                            in tree_lexer.find_sample_files(str(corpus_fileformat_tree_dirpath))]
+    if args.lex is not None:
+        with build_profile.phase('lexing'):
+            lex_sample_files(compacted_tree, args.lex or sample_filespecs, args.verbose)
+    if args.edit_benchmark is not None:
+        with build_profile.phase('edit benchmark'):
+            benchmark_edits(compacted_tree, args.edit_benchmark or sample_filespecs)
+    failed_samples: Tuple[corpus_runner.SampleResult, ...] = ()
+    if args.test_corpus:
+        with build_profile.phase('corpus run'):
+            stored_results = {} if args.no_cache else corpus_runner.load_store(output_cache_dirpath)
+            sample_paths = tree_lexer.find_sample_files(str(corpus_fileformat_tree_dirpath),
+                                                        corpus_runner.SAMPLE_FILE_SUFFIX, include_hidden_dirs=True)
+            corpus_summary = corpus_runner.run_corpus(compacted_tree, sample_paths, stored_results, args.jobs)
+            if not args.no_cache:
+                corpus_runner.save_store(output_cache_dirpath, stored_results)
+        for this_line in corpus_runner.format_report(corpus_summary, str(corpus_fileformat_tree_dirpath),
+                                                     args.verbose):
+            print(this_line)
+        failed_samples = corpus_summary.failed
+    if build_profile.enabled:
+        report_profile(args.profile_json, target_file_format, args.jobs)
+    if failed_samples:
+        raise SystemExit(f"Corpus failed: {len(failed_samples)} script(s) lexed against their verdict")
 
 
 if __name__ == '__main__':
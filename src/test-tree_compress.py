@@ -0,0 +1,150 @@
+"""
+File: test-tree_compress.py
+Purpose: Merge the identical subtrees of a syntax tree, checking incremental regeneration of edited copies.
+
+Usage: python src/test-tree_compress.py [-c corpus]
+
+The ini syntax tree is copied, and gets alike ';' leaves under four parent
+nodes, two of them sibling literal keywords ('on' and 'yes'), which fold
+together under --fold-keywords.  Only the copy with the lowest path (the
+representative) is emitted: the report of the merge names it for every
+other copy.  The copies are then edited step by step, so that they stay
+alike, are set apart, get alike again, or another copy becomes the
+representative.  After each edit, the output of an incremental run ('-i')
+must equal that of a full build, and only the fragments using the edited
+copies must be emitted again.
+"""
+import argparse
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Sequence, Tuple
+
+import syntax_tree
+import tree_compress
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+GENERATOR_FILESPEC: Path = SRC_DIRPATH / 'test-traverse_dirs_and_ast.py'
+FILE_FORMAT: str = 'ini'
+# "Incremental: re-emitted 3 of 11 fragments"
+REEMITTED_REGEX = re.compile(r'Incremental: re-emitted (\d+) of (\d+) fragments')
+# the alike leaves added to the copied tree (relative to it)
+LEAF_PATHS: Sequence[str] = ('[/SECTION/]/;', 'KEYWORD/=/VALUE/;', 'KEYWORD/=/on/;', 'KEYWORD/=/yes/;')
+# every other copy of the leaf, and the copy emitted for it ('K' sorts ahead of '[')
+EXPECTED_REPRESENTATIVES: Dict[str, str] = {
+    '[/SECTION/]/;': 'KEYWORD/=/VALUE/;',
+    'KEYWORD/=/on/;': 'KEYWORD/=/VALUE/;',
+    'KEYWORD/=/yes/;': 'KEYWORD/=/VALUE/;',
+}
+OPTION_SETS: Sequence[Tuple[str, ...]] = ((), ('--fold-keywords',))
+HIGHLIGHT_OPTION_LINE: str = 'highlight_color_name = Special\n'
+
+# each edit: what it does, how (given the copied tree directory), and the number of fragments emitted again
+# without and with --fold-keywords.  The 'nextgroup=' list of a parent node names the copy of the leaf emitted
+# (with --fold-keywords, its grandparent node folds its keywords by it too), so an edit of any copy re-emits
+# that copy, and the parent nodes (and grandparent nodes) of every copy: no other fragment
+EDITS: Sequence[Tuple[str, Callable[[Path], None], Tuple[int, int]]] = (
+    # ';', VALUE, on, yes (folded into 'on' with --fold-keywords) and ']'; with --fold-keywords, '=' and SECTION
+    ('add a config file to a copy, alike still',
+     lambda d: (d / '[' / 'SECTION' / ']' / ';' / '.config.ini').write_text('# alike still\n'), (5, 6)),
+    # the same, and the copy set apart: it is emitted on its own
+    ('set a copy apart', lambda d: (d / '[' / 'SECTION' / ']' / ';' / '.config.ini').write_text(HIGHLIGHT_OPTION_LINE),
+     (6, 7)),
+    # ']' names the representative again (and SECTION folds by it); the representative is as it was
+    ('make it alike again',
+     lambda d: (d / '[' / 'SECTION' / ']' / ';' / '.config.ini').write_text('# alike again\n'), (1, 2)),
+    # '=' lists other child nodes, and KEYWORD folds by them
+    ('rename a folded keyword', lambda d: (d / 'KEYWORD' / '=' / 'yes').rename(d / 'KEYWORD' / '=' / 'no'), (7, 7)),
+    # 'no' and 'on' fold no more
+    ('set the subtree of a folded keyword apart',
+     lambda d: (d / 'KEYWORD' / '=' / 'no' / ';' / '.config.ini').write_text(HIGHLIGHT_OPTION_LINE), (6, 8)),
+    # 'no/;' is alike 'VALUE/;' now; 'on/;' becomes the representative of the other copies
+    ('set the representative apart',
+     lambda d: (d / 'KEYWORD' / '=' / 'VALUE' / ';' / '.config.ini').write_text(HIGHLIGHT_OPTION_LINE), (6, 8)),
+    # '#' sorts ahead of 'K' and '[': the new copy becomes the representative
+    ('add a copy of a lower path', lambda d: (d / '#' / ';').mkdir(), (4, 6)),
+    ('remove it again', lambda d: (d / '#' / ';').rmdir(), (4, 6)),
+)
+
+
+def check_representatives(tree_dirpath: Path) -> None:
+    """
+    Merge the alike leaves of the copied syntax tree, checking the copy kept for each other copy.
+    :param tree_dirpath: the copied syntax tree directory
+    :type tree_dirpath: `Path`
+    :return: None
+    :rtype: `None`
+    """
+    tree = syntax_tree.load(tree_dirpath, FILE_FORMAT + '_')
+    compressed, report = tree_compress.compress(tree)
+    assert report.node_count - report.unique_node_count == len(EXPECTED_REPRESENTATIVES), report
+    root_dirpath = tree_dirpath.resolve()
+    representatives = {str(Path(this_path).relative_to(root_dirpath)): str(Path(this_kept).relative_to(root_dirpath))
+                       for this_path, this_kept in report.representatives.items()}
+    assert representatives == EXPECTED_REPRESENTATIVES, representatives
+    # the one row of the leaf is that of the representative
+    for this_path, this_representative in EXPECTED_REPRESENTATIVES.items():
+        assert compressed.find_row(str(root_dirpath / this_path), ';') is None, this_path
+        assert compressed.find_row(str(root_dirpath / this_representative), ';') is not None, this_representative
+
+
+def generate(corpus_dirpath: Path, output_dirpath: Path, *options: str) -> Tuple[str, str]:
+    """
+    Run the generator, and give what it printed and the syntax file it wrote.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param output_dirpath: the output directory
+    :type output_dirpath: `Path`
+    :param options: more command line options
+    :type options: `str`
+    :return: what the generator printed, and the syntax file it wrote
+    :rtype: `Tuple[str, str]`
+    """
+    output_dirpath.mkdir(exist_ok=True)
+    completed = subprocess.run([sys.executable, str(GENERATOR_FILESPEC), '-f', FILE_FORMAT, '-c', str(corpus_dirpath),
+                                '-t', str(SRC_DIRPATH.parent / 'templates'), '-o', str(output_dirpath), *options],
+                               stdout=subprocess.PIPE, text=True, check=True)
+    syntax_filespec = output_dirpath / FILE_FORMAT / 'vim' / 'syntax' / (FILE_FORMAT + '.vim')
+    return completed.stdout, syntax_filespec.read_text()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test incremental regeneration of merged identical subtrees')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as copy_dirspec:
+        copy_dirpath = Path(copy_dirspec)
+        corpus_dirpath = copy_dirpath / 'corpus'
+        for this_part in ('syntax-tree', 'vim'):
+            shutil.copytree(args.corpus / FILE_FORMAT / this_part, corpus_dirpath / FILE_FORMAT / this_part,
+                            symlinks=True)
+        tree_dirpath = corpus_dirpath / FILE_FORMAT / 'syntax-tree'
+        for this_path in LEAF_PATHS:
+            (tree_dirpath / this_path).mkdir(parents=True)
+        check_representatives(tree_dirpath)
+        print(f"PASS: {FILE_FORMAT}: {len(LEAF_PATHS)} alike leaves merged into the one of the lowest path")
+
+        for this_index, this_options in enumerate(OPTION_SETS):
+            generate(corpus_dirpath, copy_dirpath / f"incremental{this_index}", '-i', *this_options)
+        for this_description, this_edit, these_counts in EDITS:
+            this_edit(tree_dirpath)
+            for this_index, this_options in enumerate(OPTION_SETS):
+                this_label = ' '.join((this_description, *this_options))
+                printed, incremental_output = generate(corpus_dirpath, copy_dirpath / f"incremental{this_index}",
+                                                       '-i', '-v', *this_options)
+                _, full_output = generate(corpus_dirpath, copy_dirpath / 'full', '--no-cache', *this_options)
+                assert incremental_output == full_output, f"{this_label}: the incremental output differs"
+                reemitted = REEMITTED_REGEX.search(printed)
+                assert reemitted, f"{this_label}: no incremental report"
+                assert int(reemitted[1]) == these_counts[this_index], f"{this_label}: {reemitted[0]}"
+                print(f"  {this_label}: {reemitted[0]}")
+        print(f"PASS: {FILE_FORMAT}: {len(EDITS)} edits of merged copies, each regenerated incrementally as a full "
+              f"build does, emitting again only the fragments using the copies edited")
+
+
+if __name__ == '__main__':
+    main()
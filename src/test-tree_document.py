@@ -0,0 +1,133 @@
+"""
+File: test-tree_document.py
+Purpose: Check the incremental re-lexing of an edited document against lexing its whole text afresh.
+
+Usage: python src/test-tree_document.py [-c corpus] [-n 300] [--seed 1]
+
+Random documents get random edits through `TreeDocument.apply_edits()`; after
+each, every line must have the tokens, validity and end state that a new
+document of the same text gets.  The edits open and close blocks across lines:
+'[' ... ']' of the ini syntax tree, and '{' ... '}' of a copy of it with a
+block node added under KEYWORD (whose statements are KEYWORD again).
+"""
+import argparse
+import random
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List, Sequence
+
+import lsp_server
+from tree_lexer import CompiledLexer
+from tree_document import TextEdit, TreeDocument
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+# lines of the documents, and texts of the edits (several lines, too)
+DOCUMENT_LINES: Sequence[str] = (
+    '[section]', '[', 'section]', ']', 'key = value', 'k=v', '# a comment', '', 'x', '[s', 'k {', 'k { }', '}',
+    'k {}', 'a = 1 }',
+)
+INSERTED_TEXTS: Sequence[str] = (
+    '', 'x', '\n', '[', ']', 's]', '\n[\n', '{', '}', ' {', '\n}\n', 'k {\n', 'key = v\n[', '\nk {\nk = 1\n}\n',
+)
+BLOCK_CONFIGS = {
+    '{': "pattern = '\\{'\nhighlight_color_name = Delimiter\nsquishable_with_next_token = 1\n",
+    '}': "pattern = '\\}'\nhighlight_color_name = Delimiter\nsquishable_with_next_token = 1\n",
+}
+
+
+def add_brace_block(corpus_dirpath: Path, copy_dirpath: Path) -> Path:
+    """
+    Copy the ini syntax tree, adding a '{' block under KEYWORD: its statements are KEYWORD (a symlink), and '}'.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param copy_dirpath: an empty directory to copy it into
+    :type copy_dirpath: `Path`
+    :return: the corpus directory of the copy
+    :rtype: `Path`
+    """
+    tree_dirpath = copy_dirpath / 'ini' / 'syntax-tree'
+    shutil.copytree(corpus_dirpath / 'ini' / 'syntax-tree', tree_dirpath, symlinks=True)
+    block_dirpath = tree_dirpath / 'KEYWORD' / '{'
+    (block_dirpath / '}').mkdir(parents=True)
+    (block_dirpath / '.config.ini').write_text(BLOCK_CONFIGS['{'])
+    (block_dirpath / '}' / '.config.ini').write_text(BLOCK_CONFIGS['}'])
+    (block_dirpath / 'KEYWORD').symlink_to('..')
+    return copy_dirpath
+
+
+def random_edit(chooser: random.Random, lines: List[str]) -> TextEdit:
+    """
+    Make a random edit of a document, over one line or a few.
+    :param chooser: the random generator
+    :type chooser: `random.Random`
+    :param lines: the lines of the document
+    :type lines: `List[str]`
+    :return: the edit
+    :rtype: `TextEdit`
+    """
+    start_line = chooser.randrange(len(lines))
+    end_line = min(len(lines) - 1, start_line + chooser.choice((0, 0, 0, 1, 2)))
+    start_column = chooser.randint(0, len(lines[start_line]))
+    if end_line > start_line:
+        end_column = chooser.randint(0, len(lines[end_line]))
+    else:
+        end_column = chooser.randint(start_column, len(lines[start_line]))
+    return TextEdit(start_line, start_column, end_line, end_column, chooser.choice(INSERTED_TEXTS))
+
+
+def check_edits(lexer: CompiledLexer, trial_count: int, seed: int) -> int:
+    """
+    Edit random documents, checking each edit against a fresh document of the same text.
+    :param lexer: a compiled lexer
+    :type lexer: `CompiledLexer`
+    :param trial_count: the number of documents
+    :type trial_count: `int`
+    :param seed: the seed of the random documents and edits
+    :type seed: `int`
+    :return: the number of edits that changed the blocks open at the end of some line
+    :rtype: `int`
+    """
+    chooser = random.Random(seed)
+    block_edit_count = 0
+    for this_trial in range(trial_count):
+        document = TreeDocument(lexer, '\n'.join(chooser.choice(DOCUMENT_LINES)
+                                                 for _ in range(chooser.randint(1, 40))))
+        for this_step in range(30):
+            blocks_before = [this_state.blocks for this_state in document.line_states]
+            edit = random_edit(chooser, document.lines)
+            document.apply_edits([edit])
+            fresh_document = TreeDocument(lexer, document.text)
+            # line numbers are those at the time each line was lexed: not compared
+            edited_results = [this_result._replace(line_number=0) for this_result in document.line_results]
+            fresh_results = [this_result._replace(line_number=0) for this_result in fresh_document.line_results]
+            assert edited_results == fresh_results, f"trial {this_trial}, {edit}: tokens differ"
+            assert document.line_states == fresh_document.line_states, f"trial {this_trial}, {edit}: states differ"
+            if [this_state.blocks for this_state in document.line_states] != blocks_before:
+                block_edit_count += 1
+    return block_edit_count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test re-lexing edited documents against lexing them afresh')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    parser.add_argument('-n', '--trials', metavar='N', type=int, default=300,
+                        help='Number of random documents per syntax tree (default is 300)')
+    parser.add_argument('--seed', metavar='N', type=int, default=1, help='Seed of the random edits (default is 1)')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as copy_dirspec:
+        for this_description, this_corpus_dirpath, this_delimiter in (
+                ('ini', args.corpus, '['),
+                ('ini with a { } block', add_brace_block(args.corpus, Path(copy_dirspec)), '{')):
+            lexer = lsp_server.load_lexer(this_corpus_dirpath, 'ini')
+            delimiters = {lexer.tree.node(this_row).name for this_row in lexer.block_end_delimiters}
+            assert this_delimiter in delimiters, f"{this_description}: no {this_delimiter!r} block node"
+            block_edit_count = check_edits(lexer, args.trials, args.seed)
+            assert block_edit_count, f"{this_description}: no edit opened or closed a block"
+            print(f"PASS: {this_description}: {args.trials * 30} edits re-lexed as a fresh document "
+                  f"({block_edit_count} opened or closed blocks across lines)")
+
+
+if __name__ == '__main__':
+    main()
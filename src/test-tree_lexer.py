@@ -0,0 +1,112 @@
+"""
+File: test-tree_lexer.py
+Purpose: Lex the sample files and known lines of each syntax tree with its compiled lexer, asserting on the tokens.
+
+Usage: python src/test-tree_lexer.py [-c corpus]
+
+A node pattern with no Python 're' equivalent fails the test: the lexer
+would leave that node out, and never match it.
+"""
+import argparse
+from pathlib import Path
+from typing import Dict, Sequence, Tuple
+
+import lsp_server
+import tree_lexer
+from tree_lexer import CompiledLexer, LineResult
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+FILE_FORMATS: Sequence[str] = ('ini', 'nftables')
+# line: whether it is valid, and its tokens (the node path, and the text it matched)
+EXPECTED_LINES: Dict[str, Dict[str, Tuple[bool, Tuple[Tuple[str, str], ...]]]] = {
+    'ini': {
+        '[section]': (True, (('[', '['), ('[/SECTION', 'section'), ('[/SECTION/]', ']'))),
+        'key = value': (True, (('KEYWORD', 'key '), ('KEYWORD/=', '= '), ('KEYWORD/=/VALUE', 'value'))),
+        'k=v': (True, (('KEYWORD', 'k'), ('KEYWORD/=', '='), ('KEYWORD/=/VALUE', 'v'))),
+        '# a comment': (True, (('#', '# a comment'),)),
+        '[': (True, (('[', '['),)),
+        'k=v x': (False, (('KEYWORD', 'k'), ('KEYWORD/=', '='), ('KEYWORD/=/VALUE', 'v '))),
+        ']': (False, ()),
+    },
+    'nftables': {
+        # the TABLE and CHAIN placeholders have no pattern yet: they match their names; 'chain' takes no blanks
+        'add chainTABLECHAIN{': (True, (('add', 'add '), ('add/chain', 'chain'), ('add/chain/TABLE', 'TABLE'),
+                                        ('add/chain/TABLE/CHAIN', 'CHAIN'), ('add/chain/TABLE/CHAIN/{', '{'))),
+        # a symlinked TABLE goes on at its real place
+        'add chainipTABLECHAIN{': (True, (('add', 'add '), ('add/chain', 'chain'), ('add/chain/ip', 'ip'),
+                                          ('add/chain/TABLE', 'TABLE'), ('add/chain/TABLE/CHAIN', 'CHAIN'),
+                                          ('add/chain/TABLE/CHAIN/{', '{'))),
+        'add chainTABLE{': (False, (('add', 'add '), ('add/chain', 'chain'), ('add/chain/TABLE', 'TABLE'))),
+    },
+}
+
+
+def describe_tokens(lexer: CompiledLexer, line: str, line_result: LineResult) -> Tuple[Tuple[str, str], ...]:
+    """
+    Describe the tokens of a lexed line by node path and text.
+    :param lexer: a compiled lexer
+    :type lexer: `CompiledLexer`
+    :param line: the line
+    :type line: `str`
+    :param line_result: the outcome of lexing it
+    :type line_result: `LineResult`
+    :return: the node path and the text of every token
+    :rtype: `Tuple[Tuple[str, str], ...]`
+    """
+    return tuple((lexer.describe(this_token.row), line[this_token.start:this_token.end])
+                 for this_token in line_result.tokens)
+
+
+def check_sample_file(lexer: CompiledLexer, filespec: str) -> None:
+    """
+    Lex a sample file: every token lies within its line, after the token before it, and is not empty.
+    :param lexer: a compiled lexer
+    :type lexer: `CompiledLexer`
+    :param filespec: the sample file
+    :type filespec: `str`
+    :return: None
+    :rtype: `None`
+    """
+    with open(filespec, encoding='utf-8', errors='replace') as sample_file:
+        lines = [this_line.rstrip('\r\n') for this_line in sample_file]
+    line_results = list(tree_lexer.lex_lines(lexer, lines))
+    assert len(line_results) == len(lines), f"{filespec}: {len(line_results)} lines lexed of {len(lines)}"
+    for this_line, this_result in zip(lines, line_results):
+        position = 0
+        for this_token in this_result.tokens:
+            assert position <= this_token.start < this_token.end <= len(this_line), \
+                f"{filespec}:{this_result.line_number}: token {this_token} out of place"
+            position = this_token.end
+        if not this_line.strip():
+            assert this_result.is_valid and not this_result.tokens, f"{filespec}:{this_result.line_number}: blank"
+    file_result = tree_lexer.validate_file(lexer, filespec)
+    assert file_result.line_count == len(lines)
+    assert [this_result.line_number for this_result in file_result.invalid_lines] == \
+        [this_result.line_number for this_result in line_results if not this_result.is_valid]
+    print(f"  {filespec}: {len(lines)} lines, {len(file_result.invalid_lines)} invalid")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test the lexer compiled from each syntax tree')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    args = parser.parse_args()
+    for this_file_format in FILE_FORMATS:
+        lexer = lsp_server.load_lexer(args.corpus, this_file_format)
+        if lexer.untranslatable:
+            raise SystemExit(f"FAIL: {this_file_format}: node patterns with no 're' equivalent:\n" +
+                             '\n'.join(f"  {lexer.describe(this_row)}: {this_reason}"
+                                       for this_row, this_reason in lexer.untranslatable.items()))
+        for this_line, (is_valid, expected_tokens) in EXPECTED_LINES[this_file_format].items():
+            line_result = tree_lexer.lex_line(lexer, this_line)
+            tokens = describe_tokens(lexer, this_line, line_result)
+            assert (line_result.is_valid, tokens) == (is_valid, expected_tokens), \
+                f"{this_file_format}: {this_line!r}: {line_result.is_valid}, {tokens} ({line_result.message})"
+        print(f"PASS: {this_file_format}: {len(EXPECTED_LINES[this_file_format])} lines lexed as expected")
+        tree_dirpath = args.corpus / this_file_format / 'syntax-tree'
+        for this_filespec in tree_lexer.find_sample_files(str(tree_dirpath), include_hidden_dirs=True):
+            check_sample_file(lexer, this_filespec)
+
+
+if __name__ == '__main__':
+    main()
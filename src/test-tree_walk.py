@@ -0,0 +1,201 @@
+"""
+File: test-tree_walk.py
+Purpose: Walk trees deeper than the recursion limit, checking the visiting orders and the ancestors of every visit.
+
+Usage: python src/test-tree_walk.py [-d depth]
+
+A small branching tree is walked in pre-order, post-order and reverse
+post-order against recursive reference walks.  Then a chain of nodes deeper
+than sys.getrecursionlimit() is walked in each order, both as plain nodes and
+as a compact syntax tree (built, then compressed, row by row).
+"""
+import argparse
+import sys
+from collections import deque
+from typing import Any, Deque, List, Optional, Sequence, Tuple
+
+import tree_compress
+import tree_walk
+from compact_tree import CompactTree, CompactTreeBuilder
+
+
+class Node:
+    """
+    A plain tree node.
+    """
+    __slots__ = ('name', 'children')
+
+    def __init__(self, name: str, children: Sequence['Node'] = ()) -> None:
+        self.name = name
+        self.children = children
+
+
+def recursive_post_order(node: Node, ancestors: Tuple[str, ...] = ()) -> List[Tuple[str, Tuple[str, ...]]]:
+    """
+    The reference walk: each node (and its ancestors) after its child nodes, by recursion.
+    :param node: a node
+    :type node: `Node`
+    :param ancestors: the names of its ancestors, from the root down
+    :type ancestors: `Tuple[str, ...]`
+    :return: the name and the ancestor names of every node, in post-order
+    :rtype: `List[Tuple[str, Tuple[str, ...]]]`
+    """
+    visits: List[Tuple[str, Tuple[str, ...]]] = []
+    for this_child in node.children:
+        visits.extend(recursive_post_order(this_child, ancestors + (node.name,)))
+    visits.append((node.name, ancestors))
+    return visits
+
+
+def recursive_pre_order(node: Node, ancestors: Tuple[str, ...] = ()) -> List[Tuple[str, Tuple[str, ...]]]:
+    """
+    The reference walk: each node (and its ancestors) before its child nodes, by recursion.
+    :param node: a node
+    :type node: `Node`
+    :param ancestors: the names of its ancestors, from the root down
+    :type ancestors: `Tuple[str, ...]`
+    :return: the name and the ancestor names of every node, in pre-order
+    :rtype: `List[Tuple[str, Tuple[str, ...]]]`
+    """
+    visits: List[Tuple[str, Tuple[str, ...]]] = [(node.name, ancestors)]
+    for this_child in node.children:
+        visits.extend(recursive_pre_order(this_child, ancestors + (node.name,)))
+    return visits
+
+
+def walked_orders(root: Node) -> Tuple[List[Tuple[str, Tuple[str, ...]]], ...]:
+    """
+    Walk a tree with `tree_walk.walk()` and `tree_walk.walk_reverse_post_order()`, recording every visit.
+    :param root: the root node
+    :type root: `Node`
+    :return: the name and the ancestor names of every node, in pre-order, post-order and reverse post-order
+    :rtype: `Tuple[List[Tuple[str, Tuple[str, ...]]], ...]`
+    """
+    pre_order_visits: List[Tuple[str, Tuple[str, ...]]] = []
+    post_order_visits: List[Tuple[str, Tuple[str, ...]]] = []
+    reverse_post_order_visits: List[Tuple[str, Tuple[str, ...]]] = []
+    ancestors: Deque[Any] = deque()
+
+    def recorder(visits: List[Tuple[str, Tuple[str, ...]]]) -> Any:
+        """
+        Make a visit hook recording into a list
+        :param visits: the list
+        :type visits: `List[Tuple[str, Tuple[str, ...]]]`
+        :return: the visit hook
+        :rtype: `Any`
+        """
+        return lambda node, context, node_ancestors: visits.append(
+            (node.name, tuple(this_ancestor.name for this_ancestor in node_ancestors)))
+
+    tree_walk.walk(root, pre_order=recorder(pre_order_visits), post_order=recorder(post_order_visits),
+                   ancestors=ancestors)
+    assert not ancestors, 'the ancestors are not restored'
+    tree_walk.walk_reverse_post_order(root, recorder(reverse_post_order_visits), ancestors=ancestors)
+    assert not ancestors, 'the ancestors are not restored'
+    return pre_order_visits, post_order_visits, reverse_post_order_visits
+
+
+def walked_post_order(root: Node) -> List[Tuple[str, Tuple[str, ...]]]:
+    """
+    Walk a tree with `tree_walk.walk()`, recording every visit.
+    :param root: the root node
+    :type root: `Node`
+    :return: the name and the ancestor names of every node, in post-order
+    :rtype: `List[Tuple[str, Tuple[str, ...]]]`
+    """
+    visits: List[Tuple[str, Tuple[str, ...]]] = []
+    ancestors: Deque[Any] = deque()
+
+    def record(node: Node, context: Any, node_ancestors: Deque[Node]) -> None:
+        """
+        Record a visit
+        :param node: a node
+        :type node: `Node`
+        :param context: unused
+        :type context: `Any`
+        :param node_ancestors: its ancestors, from the root down
+        :type node_ancestors: `Deque[Node]`
+        :rtype: None
+        """
+        visits.append((node.name, tuple(this_ancestor.name for this_ancestor in node_ancestors)))
+
+    tree_walk.walk(root, post_order=record, ancestors=ancestors)
+    assert not ancestors, 'the ancestors are not restored'
+    return visits
+
+
+def build_chain(depth: int) -> Node:
+    """
+    Build a chain of nodes, each the only child node of the one before.
+    :param depth: the number of nodes
+    :type depth: `int`
+    :return: the root node
+    :rtype: `Node`
+    """
+    node: Optional[Node] = None
+    for this_level in reversed(range(depth)):
+        node = Node(str(this_level), () if node is None else (node,))
+    assert node is not None
+    return node
+
+
+def build_compact_chain(depth: int) -> CompactTree:
+    """
+    Build a chain of nodes as a compact syntax tree, the way the loader fills its columns.
+    :param depth: the number of nodes
+    :type depth: `int`
+    :return: the tree; row 0 is its root
+    :rtype: `CompactTree`
+    """
+    builder = CompactTreeBuilder('/chain')
+    path_id = 0
+    rows = [builder.add_row('chain', path_id, {})]
+    for _ in range(1, depth):
+        path_id = builder.intern_path(path_id, 'n')
+        rows.append(builder.add_row('n', path_id, {}))
+    for this_parent_row, this_child_row in zip(rows, rows[1:]):
+        builder.set_children(this_parent_row, [this_child_row])
+    builder.set_children(rows[-1], [])
+    return builder.finish()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test the explicit-stack tree walk on trees deeper than recursion')
+    parser.add_argument('-d', '--depth', metavar='N', type=int, default=sys.getrecursionlimit() * 3,
+                        help='Depth of the deep trees (default is thrice the recursion limit)')
+    args = parser.parse_args()
+    assert args.depth > sys.getrecursionlimit(), f"depth {args.depth} is within the recursion limit"
+
+    branching_tree = Node('root', (Node('a', (Node('a1'), Node('a2', (Node('a2x'),)))), Node('b'),
+                                   Node('c', (Node('c1'),))))
+    assert walked_post_order(branching_tree) == recursive_post_order(branching_tree)
+    pre_order_visits, post_order_visits, reverse_post_order_visits = walked_orders(branching_tree)
+    assert pre_order_visits == recursive_pre_order(branching_tree)
+    assert post_order_visits == recursive_post_order(branching_tree)
+    assert reverse_post_order_visits == list(reversed(recursive_post_order(branching_tree)))
+    # every node before its child nodes, the last child node firstly
+    assert [this_name for this_name, _ in reverse_post_order_visits] == \
+        ['root', 'c', 'c1', 'b', 'a', 'a2', 'a2x', 'a1'], reverse_post_order_visits
+    print('PASS: a branching tree walked in the pre-order, post-order and reverse post-order of recursive walks')
+
+    visits = walked_post_order(build_chain(args.depth))
+    assert [this_name for this_name, _ in visits] == [str(this_level) for this_level in reversed(range(args.depth))]
+    assert len(visits[0][1]) == args.depth - 1 and visits[-1][1] == ()
+    pre_order_visits, post_order_visits, reverse_post_order_visits = walked_orders(build_chain(args.depth))
+    assert pre_order_visits == list(reversed(visits)) == reverse_post_order_visits and post_order_visits == visits
+    print(f"PASS: a chain of {args.depth} nodes walked, deepest node firstly (lastly in pre-order and reverse "
+          f"post-order)")
+
+    compressed, compression_report = tree_compress.compress(build_compact_chain(args.depth))
+    assert compression_report.unique_node_count == args.depth
+    depths: List[int] = []
+    tree_walk.walk(compressed.root, post_order=lambda node, context, ancestors: depths.append(len(ancestors)))
+    assert depths == list(reversed(range(args.depth)))
+    depths.clear()
+    tree_walk.walk_reverse_post_order(compressed.root, lambda node, context, ancestors: depths.append(len(ancestors)))
+    assert depths == list(range(args.depth))
+    print(f"PASS: a compact chain of {args.depth} nodes compressed and walked")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+File: test-vim_fragments.py
+Purpose: Check incremental regeneration against a full build, after each of a series of edits to a syntax tree.
+
+Usage: python src/test-vim_fragments.py [-c corpus]
+
+The nftables syntax tree is copied, then edited step by step: symlinks lead
+nowhere and somewhere again, get retargeted or replaced, and directories and
+config files of a shared subtree change.  After each edit, the output of an
+incremental run ('-i', re-using the fragments of the run before) must equal
+that of a full build without any cache.
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, Sequence, Tuple
+
+SRC_DIRPATH: Path = Path(__file__).resolve().parent
+GENERATOR_FILESPEC: Path = SRC_DIRPATH / 'test-traverse_dirs_and_ast.py'
+FILE_FORMAT: str = 'nftables'
+# "Incremental: re-emitted 3 of 11 fragments"
+REEMITTED_REGEX = re.compile(r'Incremental: re-emitted (\d+) of (\d+) fragments')
+
+
+def replace_symlink(link_path: Path, target: str) -> None:
+    """
+    Point a symlink somewhere else, in one step.
+    :param link_path: the symlink
+    :type link_path: `Path`
+    :param target: where it is to lead
+    :type target: `str`
+    :return: None
+    :rtype: `None`
+    """
+    new_link_path = link_path.with_name(link_path.name + '.new')
+    new_link_path.symlink_to(target)
+    os.replace(new_link_path, link_path)
+
+
+def replace_by_directory(link_path: Path) -> None:
+    """
+    Replace a symlink by an empty directory of the same name.
+    :param link_path: the symlink
+    :type link_path: `Path`
+    :return: None
+    :rtype: `None`
+    """
+    link_path.unlink()
+    link_path.mkdir()
+
+
+def append_option(config_filespec: Path, option_line: str) -> None:
+    """
+    Add an option line to a config file.
+    :param config_filespec: the config file
+    :type config_filespec: `Path`
+    :param option_line: the option line
+    :type option_line: `str`
+    :return: None
+    :rtype: `None`
+    """
+    with open(config_filespec, 'a') as config_file:
+        config_file.write(option_line + '\n')
+
+
+# each edit: what it does, and how (given the 'add/chain' directory of the copied tree)
+EDITS: Sequence[Tuple[str, Callable[[Path], None]]] = (
+    ('rename the shared TABLE away (its symlinks lead nowhere)', lambda d: (d / 'TABLE').rename(d / 'TABLEX')),
+    ('rename it back (they lead somewhere again)', lambda d: (d / 'TABLEX').rename(d / 'TABLE')),
+    ('add a symlink to nowhere', lambda d: (d / 'ip' / 'SET').symlink_to('../TABLE/SET')),
+    ('create where it leads', lambda d: (d / 'TABLE' / 'SET').mkdir()),
+    ('retarget a symlink', lambda d: replace_symlink(d / 'inet' / 'TABLE', '../TABLE/CHAIN')),
+    ('replace a symlink by a directory', lambda d: replace_by_directory(d / 'ip6' / 'TABLE')),
+    ('edit a config file of the shared subtree',
+     lambda d: append_option(d / 'TABLE' / 'CHAIN' / '{' / '.config.ini', 'highlight_color_name = Special')),
+    ('add a node to the shared subtree', lambda d: (d / 'TABLE' / 'CHAIN' / 'comment').mkdir()),
+    ('remove the node a symlink leads to', lambda d: (d / 'TABLE' / 'SET').rmdir()),
+    ('remove a symlink to nowhere', lambda d: (d / 'ip' / 'SET').unlink()),
+)
+
+
+def generate(corpus_dirpath: Path, output_dirpath: Path, *options: str) -> Tuple[str, str]:
+    """
+    Run the generator, and give what it printed and the syntax file it wrote.
+    :param corpus_dirpath: the corpus directory
+    :type corpus_dirpath: `Path`
+    :param output_dirpath: the output directory
+    :type output_dirpath: `Path`
+    :param options: more command line options
+    :type options: `str`
+    :return: what the generator printed, and the syntax file it wrote
+    :rtype: `Tuple[str, str]`
+    """
+    output_dirpath.mkdir(exist_ok=True)
+    completed = subprocess.run([sys.executable, str(GENERATOR_FILESPEC), '-f', FILE_FORMAT, '-c', str(corpus_dirpath),
+                                '-t', str(SRC_DIRPATH.parent / 'templates'), '-o', str(output_dirpath), *options],
+                               stdout=subprocess.PIPE, text=True, check=True)
+    syntax_filespec = output_dirpath / FILE_FORMAT / 'vim' / 'syntax' / (FILE_FORMAT + '.vim')
+    return completed.stdout, syntax_filespec.read_text()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Test incremental regeneration against a full build')
+    parser.add_argument('-c', '--corpus', metavar='corpus_dirspec', type=Path, default=SRC_DIRPATH.parent / 'corpus',
+                        help='Corpus directory (default is the corpus of this repository)')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as copy_dirspec:
+        copy_dirpath = Path(copy_dirspec)
+        corpus_dirpath = copy_dirpath / 'corpus'
+        for this_part in ('syntax-tree', 'vim'):
+            shutil.copytree(args.corpus / FILE_FORMAT / this_part, corpus_dirpath / FILE_FORMAT / this_part,
+                            symlinks=True)
+        chain_dirpath = corpus_dirpath / FILE_FORMAT / 'syntax-tree' / 'add' / 'chain'
+        generate(corpus_dirpath, copy_dirpath / 'incremental', '-i')
+        reused_count = 0
+        for this_description, this_edit in EDITS:
+            this_edit(chain_dirpath)
+            printed, incremental_output = generate(corpus_dirpath, copy_dirpath / 'incremental', '-i', '-v')
+            _, full_output = generate(corpus_dirpath, copy_dirpath / 'full', '--no-cache')
+            assert incremental_output == full_output, f"{this_description}: the incremental output differs"
+            reemitted = REEMITTED_REGEX.search(printed)
+            assert reemitted, f"{this_description}: no incremental report"
+            if int(reemitted[1]) < int(reemitted[2]):
+                reused_count += 1
+            print(f"  {this_description}: {reemitted[0]}")
+        assert reused_count, 'no incremental run re-used any fragment'
+        print(f"PASS: {FILE_FORMAT}: {len(EDITS)} edits, each regenerated incrementally as a full build does")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+File: tree_cache.py
+Purpose: Persistent on-disk cache of a loaded syntax tree, validated by directory and config file stats.
+
+The cache holds the columns of the compact syntax tree, as loaded (not compressed),
+and the manifest of the stat signatures it was loaded with.
+"""
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import build_profile
+import syntax_tree
+from compact_tree import CompactTree
+from syntax_tree import StatSignature
+
+# Bump whenever the pickled layout of the cache (or of the CompactTree columns) changes
+CACHE_VERSION: int = 6
+CACHE_DIRNAME: str = '.cache'
+TREE_CACHE_FILENAME: str = 'syntax-tree.pickle'
+
+
+def manifest_is_valid(manifest: Dict[str, StatSignature]) -> bool:
+    """
+    Check that no directory nor config file recorded in a manifest has changed since.
+
+    A directory changes its mtime whenever an entry is added, removed or renamed
+    in it; a config file edited in-place changes its own size or mtime; a symlink
+    to nowhere changes its signature once it leads somewhere.
+    :param manifest: stat signatures of every directory and config file of a syntax tree
+    :type manifest: `Dict[str, StatSignature]`
+    :return: Returns True if every recorded stat signature still matches
+    :rtype: `bool`
+    """
+    for this_path, this_signature in manifest.items():
+        try:
+            if syntax_tree.path_signature(this_path) != this_signature:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def write_pickle(file_path: Path, contents: Any) -> None:
+    """
+    Pickle an object into a file, replacing any previous file atomically.
+    :param file_path: Path to the pickle file
+    :type file_path: `Path`
+    :param contents: the object to pickle
+    :type contents: `Any`
+    :return: None
+    :rtype: `None`
+    """
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temp_filespec = tempfile.mkstemp(dir=file_path.parent, prefix=file_path.name + '.')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as f:
+            pickle.dump(contents, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filespec, file_path)
+    except BaseException:
+        os.unlink(temp_filespec)
+        raise
+
+
+def read_pickle(file_path: Path) -> Optional[Any]:
+    """
+    Unpickle an object from a file.
+    :param file_path: Path to the pickle file
+    :type file_path: `Path`
+    :return: the unpickled object, or None if the file is missing or unreadable
+    :rtype: `Optional[Any]`
+    """
+    if build_profile.enabled:
+        build_profile.count_call('open')
+    try:
+        with open(file_path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, TypeError):
+        return None
+
+
+def load_tree(syntax_tree_path: Path, hidden_prefix: str, cache_dirpath: Path,
+              verbose: bool = False, manifest: Optional[Dict[str, StatSignature]] = None) -> CompactTree:
+    """
+    Load the syntax tree from the cache; on any change in the syntax tree, reload and re-cache it.
+    :param syntax_tree_path: Path to the root of syntax tree
+    :type syntax_tree_path: `Path`
+    :param hidden_prefix: a prefix for hidden files
+    :type hidden_prefix: `str`
+    :param cache_dirpath: directory holding the cache files
+    :type cache_dirpath: `Path`
+    :param verbose: report cache hits and misses
+    :type verbose: `bool`
+    :param manifest: if given, collects the stat signature of every directory and config file of the tree
+    :type manifest: `Optional[Dict[str, StatSignature]]`
+    :return: The syntax tree, not compressed; row 0 is its root
+    :rtype: `CompactTree`
+    """
+    cache_filespec = cache_dirpath / TREE_CACHE_FILENAME
+    cache_key = (CACHE_VERSION, str(syntax_tree_path.resolve()), hidden_prefix)
+
+    cached = read_pickle(cache_filespec)
+    if (isinstance(cached, dict) and cached.get('key') == cache_key
+            and isinstance(cached.get('tree'), CompactTree) and manifest_is_valid(cached['manifest'])):
+        if verbose:
+            print(f"Syntax tree cache: hit ({cache_filespec})")
+        if manifest is not None:
+            manifest.update(cached['manifest'])
+        return cached['tree']
+
+    if verbose:
+        print(f"Syntax tree cache: miss ({cache_filespec})")
+    new_manifest: Dict[str, StatSignature] = {}
+    try:
+        tree = syntax_tree.load(syntax_tree_path, hidden_prefix, new_manifest)
+    finally:
+        # even a failed load tells what it read so far, e.g. the config file it failed on
+        if manifest is not None:
+            manifest.update(new_manifest)
+    write_pickle(cache_filespec, {'key': cache_key, 'manifest': new_manifest, 'tree': tree})
+    return tree
+
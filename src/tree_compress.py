@@ -0,0 +1,138 @@
+"""
+File: tree_compress.py
+Purpose: Hash-cons a loaded syntax tree: merge structurally identical subtrees into one shared row (a DAG).
+"""
+from array import array
+from typing import Dict, Hashable, List, NamedTuple, Tuple
+
+from compact_tree import CompactTree, FLAG_BACK_REFERENCE, FLAG_TERMINAL, OPTION_FLAGS, STRING_INDEX_TYPECODE
+
+# the class of a row not classified yet
+NO_CLASS: int = -1
+
+
+class CompressionReport(NamedTuple):
+    """
+    How much hash-consing merged.
+    """
+    node_count: int  # distinct nodes before
+    unique_node_count: int  # distinct nodes after
+    representatives: Dict[str, str]  # the path of the copy kept, by path of every other copy (back references aside)
+
+
+def canonical_key(tree: CompactTree, row: int, child_classes: List[int]) -> Hashable:
+    """
+    Give the canonical key of a subtree: its node name, its options and the classes of its child nodes.
+    :param tree: a compact syntax tree
+    :type tree: `CompactTree`
+    :param row: the row of the node
+    :type row: `int`
+    :param child_classes: the classes of its child nodes
+    :type child_classes: `List[int]`
+    :return: a key, equal for identical subtrees only
+    :rtype: `Hashable`
+    """
+    flags = tree.flags[row]
+    if flags & FLAG_BACK_REFERENCE:
+        # a cycle is only ever the same as itself, under the same keyword
+        return FLAG_BACK_REFERENCE, tree.name_ids[row], tree.path_ids[row]
+    # child nodes get sorted by the emitter anyway, so their listing order does not matter
+    return (tree.name_ids[row], tree.pattern_ids[row], tree.highlight_ids[row], tree.follow_on_ids[row],
+            flags & (OPTION_FLAGS | FLAG_TERMINAL), tuple(sorted(child_classes)))
+
+
+def child_rows(tree: CompactTree, row: int) -> array:
+    """
+    Give the rows of the child nodes of a node.
+    :param tree: a compact syntax tree
+    :type tree: `CompactTree`
+    :param row: the row of the node
+    :type row: `int`
+    :return: the rows
+    :rtype: `array`
+    """
+    start = tree.child_starts[row]
+    return tree.child_indices[start:start + tree.child_counts[row]]
+
+
+def compress(tree: CompactTree) -> Tuple[CompactTree, CompressionReport]:
+    """
+    Merge structurally identical subtrees of a syntax tree into one shared row each.
+
+    Of the identical subtrees, the one with the lowest path is kept (so the result does
+    not depend on directory listing order); every other place then refers to it, and
+    the emitter outputs it once.  The rows are numbered again breadth-first, so the
+    root stays row 0; the string table and the path table are shared with the tree.
+    The report tells which copy each other copy was merged into, for an incremental
+    run to find the fragments that an edit of a copy affects.
+    :param tree: the loaded syntax tree
+    :type tree: `CompactTree`
+    :return: the compressed syntax tree, and how much was merged (and into which copies)
+    :rtype: `Tuple[CompactTree, CompressionReport]`
+    """
+    # Pass 1: the class of every row, once all of its child nodes have theirs (post-order)
+    row_classes = array(STRING_INDEX_TYPECODE, [NO_CLASS]) * len(tree)  # signed, for NO_CLASS
+    class_ids: Dict[Hashable, int] = {}
+    # the row kept for each class
+    representatives: List[int] = []
+    # the class of the node at each path (back references aside)
+    path_classes: Dict[int, int] = {}
+    pending_rows: List[int] = [0]
+    while pending_rows:
+        row = pending_rows[-1]
+        if row_classes[row] != NO_CLASS:
+            pending_rows.pop()
+            continue
+        children = child_rows(tree, row)
+        unclassified_rows = [this_row for this_row in children if row_classes[this_row] == NO_CLASS]
+        if unclassified_rows:
+            pending_rows.extend(unclassified_rows)
+            continue
+        pending_rows.pop()
+        class_id = class_ids.setdefault(canonical_key(tree, row, [row_classes[this_row] for this_row in children]),
+                                        len(representatives))
+        if class_id == len(representatives):
+            representatives.append(row)
+        elif tree.get_path(tree.path_ids[row]) < tree.get_path(tree.path_ids[representatives[class_id]]):
+            representatives[class_id] = row
+        row_classes[row] = class_id
+        if not tree.flags[row] & FLAG_BACK_REFERENCE:
+            path_classes[tree.path_ids[row]] = class_id
+
+    # every other copy is emitted as the one kept
+    representative_paths: Dict[str, str] = {}
+    for this_path_id, this_class in path_classes.items():
+        representative_path_id = tree.path_ids[representatives[this_class]]
+        if representative_path_id != this_path_id:
+            representative_paths[tree.get_path(this_path_id)] = tree.get_path(representative_path_id)
+
+    # Pass 2: one row per class, numbered breadth-first from the root
+    compressed = CompactTree()
+    compressed.strings = tree.strings
+    compressed.path_parent_ids = tree.path_parent_ids
+    compressed.path_name_ids = tree.path_name_ids
+    class_rows: Dict[int, int] = {row_classes[0]: 0}
+    ordered_classes: List[int] = [row_classes[0]]
+    for this_class in ordered_classes:
+        row = representatives[this_class]
+        path_id = tree.path_ids[row]
+        if tree.flags[row] & FLAG_BACK_REFERENCE and path_id in path_classes:
+            # refer to wherever the ancestor was merged into
+            path_id = tree.path_ids[representatives[path_classes[path_id]]]
+        compressed.name_ids.append(tree.name_ids[row])
+        compressed.path_ids.append(path_id)
+        compressed.pattern_ids.append(tree.pattern_ids[row])
+        compressed.highlight_ids.append(tree.highlight_ids[row])
+        compressed.follow_on_ids.append(tree.follow_on_ids[row])
+        compressed.flags.append(tree.flags[row])
+        compressed.child_starts.append(len(compressed.child_indices))
+        children = child_rows(tree, row)
+        compressed.child_counts.append(len(children))
+        for this_child_row in children:
+            child_class = row_classes[this_child_row]
+            if child_class not in class_rows:
+                class_rows[child_class] = len(ordered_classes)
+                ordered_classes.append(child_class)
+            compressed.child_indices.append(class_rows[child_class])
+    compressed.reset_handles()
+    return compressed, CompressionReport(len(tree), len(representatives), representative_paths)
@@ -0,0 +1,282 @@
+"""
+File: tree_document.py
+Purpose: An open document, lexed line by line with the lexer of the syntax tree, and kept lexed as it is edited.
+
+The lexing of a line depends on its own text and on the state that the line
+before it ended in: the node that the line starts at and the blocks ('{', '[')
+still open.  That end state is kept for every line, as a checkpoint.
+
+An edit only marks the lines it touched; the next re-lex starts at the first
+marked line, from the end state of the line before it.  Past the last marked
+line, it stops at the first line that starts from the same state as it did
+before the edit: that line and the lines after it keep their tokens (however
+far the edit moved them).  Only an edit that opens or closes a block goes on
+further, up to where the blocks open meet again.
+"""
+import random
+import statistics
+import time
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import tree_lexer
+from tree_lexer import ROOT_ROW, CompiledLexer, LineResult, Token
+
+# The number of lines on each side of an edit that `benchmark_edits()` queries the tokens of (a screenful)
+BENCHMARK_WINDOW_LINES: int = 25
+
+
+class TextEdit(NamedTuple):
+    """
+    Replace a range of a document (lines and columns from 0, columns in characters) with a text.
+    """
+    start_line: int
+    start_column: int
+    end_line: int
+    end_column: int
+    text: str
+
+
+class LineState(NamedTuple):
+    """
+    The state that a line ends in: where the lexing of the next line starts.
+    """
+    row: int  # the node that the next line starts at
+    blocks: Tuple[int, ...]  # the blocks open (their start delimiter nodes, innermost lastly)
+
+
+# The state before the first line
+INITIAL_STATE = LineState(ROOT_ROW, ())
+
+
+def end_state(line_result: LineResult) -> LineState:
+    """
+    Give the state that a lexed line ends in.
+    :param line_result: the outcome of lexing the line
+    :type line_result: `LineResult`
+    :return: its end state
+    :rtype: `LineState`
+    """
+    blocks = line_result.blocks
+    return LineState(blocks[-1] if blocks else ROOT_ROW, blocks)
+
+
+def split_lines(text: str) -> List[str]:
+    """
+    Split a text into its lines, without their end of line (a text always has one line, at least).
+    :param text: the text
+    :type text: `str`
+    :return: the lines
+    :rtype: `List[str]`
+    """
+    return text.split('\n')
+
+
+class TreeDocument:
+    """
+    The lines of a document, and the lexing of each of them.
+    """
+    __slots__ = ('lexer', 'lines', 'line_results', 'line_states', 'dirty_start', 'dirty_stop', 'changed_start',
+                 'unchanged_tail')
+
+    def __init__(self, lexer: CompiledLexer, text: str) -> None:
+        self.lexer = lexer
+        self.lines = split_lines(text)
+        self.line_results: List[Optional[LineResult]] = [None] * len(self.lines)
+        # the state that each line ended in when it was last lexed (None: never lexed)
+        self.line_states: List[Optional[LineState]] = [None] * len(self.lines)
+        # the range of lines to re-lex [start, stop)
+        self.dirty_start = 0
+        self.dirty_stop = len(self.lines)
+        # the lines changed since `take_changes()`: from changed_start, up to the last unchanged_tail lines
+        self.changed_start = 0
+        self.unchanged_tail = 0
+        self.relex()
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.lines)
+
+    def apply_edit(self, edit: TextEdit) -> None:
+        """
+        Apply an edit to the text; the lines it touched are re-lexed by the next `relex()`.
+        :param edit: the edit (a range past the end of a line or of the document is clipped)
+        :type edit: `TextEdit`
+        :return: None
+        :rtype: `None`
+        """
+        last_line = len(self.lines) - 1
+        start_line = min(max(edit.start_line, 0), last_line)
+        end_line = min(max(edit.end_line, start_line), last_line)
+        head = self.lines[start_line][:max(edit.start_column, 0)]
+        tail = self.lines[end_line][edit.end_column:] if edit.end_line <= last_line else ''
+        new_lines = split_lines(head + edit.text + tail)
+        self.changed_start = min(self.changed_start, start_line)
+        self.unchanged_tail = min(self.unchanged_tail, last_line - end_line)
+        self.lines[start_line:end_line + 1] = new_lines
+        self.line_results[start_line:end_line + 1] = [None] * len(new_lines)
+        # the last new line keeps the end state of the last line replaced: the line after it started from that
+        self.line_states[start_line:end_line + 1] = [None] * (len(new_lines) - 1) + [self.line_states[end_line]]
+        # the dirty range moves with the lines after the edit
+        line_count_change = len(new_lines) - (end_line + 1 - start_line)
+        if self.dirty_start >= self.dirty_stop:
+            self.dirty_start, self.dirty_stop = start_line, start_line + len(new_lines)
+        else:
+            if self.dirty_stop > end_line:
+                self.dirty_stop += line_count_change
+            self.dirty_start = min(self.dirty_start, start_line)
+            self.dirty_stop = max(self.dirty_stop, start_line + len(new_lines))
+
+    def apply_edits(self, edits: Iterable[TextEdit]) -> Tuple[int, int]:
+        """
+        Apply edits to the text, one after the other, then re-lex it.
+        :param edits: the edits (the range of each is in the text left by the edits before it)
+        :type edits: `Iterable[TextEdit]`
+        :return: the range of lines lexed [start, stop)
+        :rtype: `Tuple[int, int]`
+        """
+        for this_edit in edits:
+            self.apply_edit(this_edit)
+        return self.relex()
+
+    def relex(self) -> Tuple[int, int]:
+        """
+        Lex the lines touched by edits since the last re-lex, from the first of them, then the lines after them
+        until one starts from the same state as before.
+        :return: the range of lines lexed [start, stop)
+        :rtype: `Tuple[int, int]`
+        """
+        start, stop = self.dirty_start, min(self.dirty_stop, len(self.lines))
+        if start >= stop:
+            return start, start
+        lexer = self.lexer
+        lines = self.lines
+        line_results = self.line_results
+        line_states = self.line_states
+        line_count = len(lines)
+        state = line_states[start - 1] if start else INITIAL_STATE
+        # the state that the line before ended in until now, i.e. that the line at this_index started from
+        previous_state = state
+        this_index = start
+        while this_index < line_count:
+            if this_index >= stop and state == previous_state:
+                break
+            cached_state = line_states[this_index]
+            if line_results[this_index] is None or state != previous_state:
+                line_result = tree_lexer.lex_line(lexer, lines[this_index].rstrip('\r'), this_index + 1, state.row,
+                                                  state.blocks)
+                line_results[this_index] = line_result
+                state = line_states[this_index] = end_state(line_result)
+            else:
+                # a line between two edits, starting from the same state as before: unchanged
+                state = cached_state
+            previous_state = cached_state
+            this_index += 1
+        # the lines re-lexed past the edits changed too
+        self.unchanged_tail = min(self.unchanged_tail, line_count - this_index)
+        self.dirty_start = self.dirty_stop = 0
+        return start, this_index
+
+    def take_changes(self) -> Tuple[int, int]:
+        """
+        Give the range of lines changed since the last call, and start afresh.
+        :return: the first changed line, and the number of unchanged lines at the end
+        :rtype: `Tuple[int, int]`
+        """
+        line_count = len(self.lines)
+        changed_start = min(self.changed_start, line_count)
+        changes = (changed_start, min(self.unchanged_tail, line_count - changed_start))
+        self.changed_start = self.unchanged_tail = line_count
+        return changes
+
+    def tokens(self, line: int) -> Tuple[Token, ...]:
+        """
+        Give the tokens of a line.
+        :param line: the line (from 0)
+        :type line: `int`
+        :return: its tokens
+        :rtype: `Tuple[Token, ...]`
+        """
+        if self.dirty_start < self.dirty_stop:
+            self.relex()
+        return self.line_results[line].tokens
+
+    def tokens_in_range(self, start: int, stop: int) -> List[Tuple[Token, ...]]:
+        """
+        Give the tokens of a range of lines (re-lexing the document first, if it was edited).
+        :param start: the first line (from 0)
+        :type start: `int`
+        :param stop: the line after the last one (clipped to the end of the document)
+        :type stop: `int`
+        :return: the tokens of each line
+        :rtype: `List[Tuple[Token, ...]]`
+        """
+        if self.dirty_start < self.dirty_stop:
+            self.relex()
+        return [this_result.tokens for this_result in self.line_results[max(start, 0):stop]]
+
+
+class EditBenchmark(NamedTuple):
+    """
+    How fast a document of some size gets its tokens back after an edit.
+    """
+    line_count: int
+    full_lex_seconds: float  # lexing the whole document, once
+    latencies: Tuple[float, ...]  # each edit: seconds from applying it to having the tokens around it
+    relexed_line_counts: Tuple[int, ...]  # each edit: the number of lines re-lexed
+
+
+def benchmark_edits(lexer: CompiledLexer, sample_lines: Sequence[str], line_count: int, edit_count: int = 200,
+                    seed: int = 0) -> EditBenchmark:
+    """
+    Time edits of a document made of sample lines, repeated up to a number of lines.  Every other edit types
+    a character into a random line, the edit after it deletes it again; after each, the tokens of the lines
+    around it are queried, as an editor redrawing its screen would.
+    :param lexer: a compiled lexer
+    :type lexer: `CompiledLexer`
+    :param sample_lines: the lines to repeat (without their end of line)
+    :type sample_lines: `Sequence[str]`
+    :param line_count: the number of lines of the document
+    :type line_count: `int`
+    :param edit_count: the number of edits to time
+    :type edit_count: `int`
+    :param seed: the seed of the random edits, for a repeatable run
+    :type seed: `int`
+    :return: the timings
+    :rtype: `EditBenchmark`
+    """
+    lines = [sample_lines[this_index % len(sample_lines)] for this_index in range(line_count)]
+    start_time = time.perf_counter()
+    document = TreeDocument(lexer, '\n'.join(lines))
+    full_lex_seconds = time.perf_counter() - start_time
+    chooser = random.Random(seed)
+    latencies: List[float] = []
+    relexed_line_counts: List[int] = []
+    edit = TextEdit(0, 0, 0, 0, '')
+    for this_edit_index in range(edit_count):
+        if this_edit_index % 2 == 0:
+            line = chooser.randrange(line_count)
+            column = chooser.randint(0, len(lines[line]))
+            edit = TextEdit(line, column, line, column, chooser.choice(lines[line] or ' '))
+        else:
+            edit = TextEdit(edit.start_line, edit.start_column, edit.start_line, edit.start_column + 1, '')
+        start_time = time.perf_counter()
+        relexed_start, relexed_stop = document.apply_edits([edit])
+        document.tokens_in_range(edit.start_line - BENCHMARK_WINDOW_LINES, edit.start_line + BENCHMARK_WINDOW_LINES)
+        latencies.append(time.perf_counter() - start_time)
+        relexed_line_counts.append(relexed_stop - relexed_start)
+    return EditBenchmark(line_count, full_lex_seconds, tuple(latencies), tuple(relexed_line_counts))
+
+
+def format_benchmark(benchmark: EditBenchmark) -> str:
+    """
+    Format the timings of `benchmark_edits()` as one line of a report.
+    :param benchmark: the timings
+    :type benchmark: `EditBenchmark`
+    :return: the line
+    :rtype: `str`
+    """
+    latencies = sorted(benchmark.latencies)
+    p99_latency = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return (f"{benchmark.line_count:>9,} lines: full lex {benchmark.full_lex_seconds * 1000:9.2f} ms; "
+            f"edit to tokens median {statistics.median(latencies) * 1000:.3f} ms, p99 {p99_latency * 1000:.3f} ms; "
+            f"{statistics.mean(benchmark.relexed_line_counts):.1f} lines re-lexed per edit")
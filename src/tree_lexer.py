@@ -0,0 +1,580 @@
+"""
+File: tree_lexer.py
+Purpose: An in-process lexer compiled from the syntax tree, to validate sample files without Vim.
+
+Every node pattern is translated from Vim very-magic ('\v') into a Python 're'
+regex, exactly as it gets emitted (see node_patterns.py), and the child nodes
+of each node are compiled into one alternation.  Lexing a line then follows
+the 'nextgroup=' pathways of the emitted Vimscript:
+
+- the alternation of a node lists its child nodes most specific firstly; as
+  Vim prefers the last defined of the items matching at the same column, and
+  the most specific sibling is defined lastly, the first alternative to match
+  is the item Vim picks
+- a symlinked (shared) child node or a back reference (a cycle) continues at
+  the real place of its directory, as its 'nextgroup=' group name does
+- top-level nodes are tried at every column, blanks between them are skipped
+- a '{', '[' or '(' node opens a block, which its end delimiter node closes;
+  within a block, a statement starts at the child nodes of its start
+  delimiter, and a block left open at the end of a line goes on in the next
+  line
+- a ';' ends the statement after a terminal node, or a node that lists
+  'end_of_statement' in its 'follow_on_to_only'; the end of the line ends it
+  after a terminal node, or a node that lists 'new_line'
+
+The error antipattern groups are a last resort, as in Vim (which defines them
+ahead of every node, so any child node matching at the same column wins): they
+only tell what went wrong where no child node matches.
+"""
+import os
+import re
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Tuple
+
+import error_handlers
+import node_patterns
+from compact_tree import CompactNode, CompactTree, FLAG_TERMINAL
+
+# the root row stands for the top level, where a statement starts
+ROOT_ROW: int = 0
+# a Python 're' class for each character class escape of Vim
+VIM_CLASS_ESCAPES: Dict[str, str] = {
+    's': '[ \\t]', 'S': '[^ \\t]',
+    'd': '[0-9]', 'D': '[^0-9]',
+    'w': '[0-9A-Za-z_]', 'W': '[^0-9A-Za-z_]',
+    'a': '[A-Za-z]', 'A': '[^A-Za-z]',
+    'l': '[a-z]', 'L': '[^a-z]',
+    'u': '[A-Z]', 'U': '[^A-Z]',
+    'x': '[0-9A-Fa-f]', 'X': '[^0-9A-Fa-f]',
+    'o': '[0-7]', 'O': '[^0-7]',
+    'h': '[A-Za-z_]', 'H': '[^A-Za-z_]',
+}
+VIM_CHAR_ESCAPES: Dict[str, str] = {'t': '\\t', 'e': '\\x1b', 'r': '\\r', 'n': '\\n', 'b': '\\x08'}
+# the '[:name:]' classes of a Vim collection, as Python 're' set items
+VIM_COLLECTION_CLASSES: Dict[str, str] = {
+    'alnum': '0-9A-Za-z', 'alpha': 'A-Za-z', 'blank': ' \\t', 'cntrl': '\\x00-\\x1f\\x7f',
+    'digit': '0-9', 'graph': '!-~', 'lower': 'a-z', 'print': ' -~', 'punct': '!-/:-@\\[-`{-~',
+    'space': ' \\t\\n\\r\\f\\v', 'upper': 'A-Z', 'xdigit': '0-9A-Fa-f',
+}
+# '@' (look-around) suffixes of very-magic mode, in the order they are to be tried
+VIM_LOOKAROUNDS: Tuple[Tuple[str, str], ...] = (('<=', '(?<='), ('<!', '(?<!'), ('=', '(?='), ('!', '(?!'),
+                                                ('>', '(?>'))
+BLANKS_REGEX = re.compile(r'[ \t]*')
+# the start delimiter node of a block (region, see DESIGN-block-region.md): its end delimiter
+# ('<' is left out: it is a comparison operator, too)
+BLOCK_DELIMITERS: Dict[str, str] = {'{': '}', '[': ']', '(': ')'}
+
+
+def translate_collection(pattern: str, offset: int) -> Tuple[Optional[str], int]:
+    """
+    Translate a Vim '[...]' collection into a Python 're' set.
+    :param pattern: a Vim very-magic regex
+    :type pattern: `str`
+    :param offset: the offset of the character after the '['
+    :type offset: `int`
+    :return: the set and the offset after its ']'; None if the '[' is not closed (then it is literal)
+    :rtype: `Tuple[Optional[str], int]`
+    :raises ValueError: If the collection has no 're' equivalent.
+    """
+    items = ['[']
+    if pattern.startswith('^', offset):
+        items.append('^')
+        offset += 1
+    if pattern.startswith(']', offset):
+        # a leading ']' is literal
+        items.append('\\]')
+        offset += 1
+    while offset < len(pattern) and pattern[offset] != ']':
+        this_char = pattern[offset]
+        if this_char == '\\' and offset + 1 < len(pattern):
+            next_char = pattern[offset + 1]
+            if next_char in ']^-\\':
+                items.append('\\' + next_char)
+                offset += 2
+            elif next_char in VIM_CHAR_ESCAPES:
+                items.append(VIM_CHAR_ESCAPES[next_char])
+                offset += 2
+            elif next_char in 'doxuU':
+                raise ValueError(f"character code '\\{next_char}' in a collection at offset {offset}")
+            else:
+                # a backslash before any other character is literal, and so is the character
+                items.append('\\\\')
+                offset += 1
+        elif pattern.startswith('[:', offset) and pattern.find(':]', offset + 2) > 0:
+            class_end = pattern.find(':]', offset + 2)
+            class_name = pattern[offset + 2:class_end]
+            if class_name not in VIM_COLLECTION_CLASSES:
+                raise ValueError(f"unknown class '[:{class_name}:]' at offset {offset}")
+            items.append(VIM_COLLECTION_CLASSES[class_name])
+            offset = class_end + 2
+        else:
+            # a '-' makes a range; anything else is escaped, lest Python read it as a set operation
+            items.append(this_char if this_char == '-' else re.escape(this_char))
+            offset += 1
+    if offset >= len(pattern):
+        return None, offset
+    items.append(']')
+    return ''.join(items), offset + 1
+
+
+def translate_multi(pattern: str, offset: int) -> Tuple[str, int]:
+    """
+    Translate a Vim '{n,m}' multi into a Python 're' quantifier.
+    :param pattern: a Vim very-magic regex
+    :type pattern: `str`
+    :param offset: the offset of the character after the '{'
+    :type offset: `int`
+    :return: the quantifier and the offset after its '}'
+    :rtype: `Tuple[str, int]`
+    :raises ValueError: If the multi is malformed.
+    """
+    multi_end = pattern.find('}', offset)
+    if multi_end < 0:
+        raise ValueError(f"unclosed '{{' at offset {offset - 1}")
+    bounds = pattern[offset:multi_end].rstrip('\\')
+    lazy = bounds.startswith('-')
+    bounds = bounds.lstrip('-')
+    minimum, comma, maximum = bounds.partition(',')
+    if not (minimum.isdigit() or minimum == '') or not (maximum.isdigit() or maximum == ''):
+        raise ValueError(f"malformed multi '{{{pattern[offset:multi_end]}}}' at offset {offset - 1}")
+    if not minimum and not maximum:
+        quantifier = '*'
+    elif not comma:
+        quantifier = '{' + minimum + '}'
+    else:
+        quantifier = '{' + (minimum or '0') + ',' + maximum + '}'
+    return quantifier + ('?' if lazy else ''), multi_end + 1
+
+
+def translate_very_magic(pattern: str, group_offset: int = 0) -> str:
+    """
+    Translate a Vim very-magic regex (without its leading '\\v') into a Python 're' regex, matching one line.
+    :param pattern: a Vim very-magic regex
+    :type pattern: `str`
+    :param group_offset: the number of capturing groups before this regex (its back references are moved by it)
+    :type group_offset: `int`
+    :return: the Python regex
+    :rtype: `str`
+    :raises ValueError: If the regex has no 're' equivalent, or Vim would reject it.
+    """
+    translated: List[str] = []
+    group_starts: List[int] = []
+    last_atom_start: Optional[int] = None  # where the atom that a multi would apply to starts in translated
+    offset = 0
+    while offset < len(pattern):
+        this_char = pattern[offset]
+        offset += 1
+        atom: Optional[str] = None
+        if this_char == '\\':
+            if offset >= len(pattern):
+                raise ValueError(f"trailing backslash at offset {offset - 1}")
+            escaped_char = pattern[offset]
+            offset += 1
+            if escaped_char == '_' and offset < len(pattern):
+                # '\_x' also matches the end of the line, which a lexed line does not contain
+                escaped_char = pattern[offset]
+                offset += 1
+                if escaped_char == '.':
+                    atom = '.'
+                elif escaped_char in VIM_CLASS_ESCAPES:
+                    atom = VIM_CLASS_ESCAPES[escaped_char]
+                elif escaped_char == '[':
+                    atom, offset = translate_collection(pattern, offset)
+                    if atom is None:
+                        raise ValueError(f"unclosed '\\_[' at offset {offset}")
+                else:
+                    raise ValueError(f"unsupported '\\_{escaped_char}' at offset {offset - 3}")
+            elif escaped_char in VIM_CLASS_ESCAPES:
+                atom = VIM_CLASS_ESCAPES[escaped_char]
+            elif escaped_char in VIM_CHAR_ESCAPES:
+                atom = VIM_CHAR_ESCAPES[escaped_char]
+            elif escaped_char in '123456789':
+                atom = '(?:\\' + str(int(escaped_char) + group_offset) + ')'
+            elif escaped_char.isalnum() or escaped_char == '%':
+                # '\z...', '\%...', '\i', '\k', '\f', '\p' and the like
+                raise ValueError(f"unsupported '\\{escaped_char}' at offset {offset - 2}")
+            else:
+                atom = re.escape(escaped_char)
+        elif this_char == '(':
+            group_starts.append(len(translated))
+            translated.append('(')
+            last_atom_start = None
+            continue
+        elif this_char == '%':
+            if not pattern.startswith('(', offset):
+                raise ValueError(f"unsupported '%{pattern[offset:offset + 1]}' at offset {offset - 1}")
+            offset += 1
+            group_starts.append(len(translated))
+            translated.append('(?:')
+            last_atom_start = None
+            continue
+        elif this_char == ')':
+            if not group_starts:
+                raise ValueError(f"unmatched ')' at offset {offset - 1}")
+            translated.append(')')
+            last_atom_start = group_starts.pop()
+            continue
+        elif this_char == '|':
+            translated.append('|')
+            last_atom_start = None
+            continue
+        elif this_char in '*+=?{@':
+            if last_atom_start is None:
+                # Vim rejects it too (E64/E866), so the group never matches
+                raise ValueError(f"'{this_char}' follows nothing at offset {offset - 1}")
+            if this_char == '{':
+                quantifier, offset = translate_multi(pattern, offset)
+                translated.append(quantifier)
+            elif this_char == '@':
+                for this_suffix, this_lookaround in VIM_LOOKAROUNDS:
+                    if pattern.startswith(this_suffix, offset):
+                        offset += len(this_suffix)
+                        translated[last_atom_start:] = [this_lookaround + ''.join(translated[last_atom_start:]) + ')']
+                        break
+                else:
+                    raise ValueError(f"unsupported '@{pattern[offset:offset + 1]}' at offset {offset - 1}")
+            else:
+                translated.append('?' if this_char == '=' else this_char)
+            # a multi may not follow a multi
+            last_atom_start = None
+            continue
+        elif this_char in '&~':
+            raise ValueError(f"unsupported '{this_char}' at offset {offset - 1}")
+        elif this_char in '<>':
+            translated.append('\\b')
+            last_atom_start = None
+            continue
+        elif this_char in '^$':
+            # in very-magic mode, both are anchors wherever they are
+            translated.append(this_char)
+            last_atom_start = None
+            continue
+        elif this_char == '.':
+            atom = '.'
+        elif this_char == '[':
+            atom, collection_end = translate_collection(pattern, offset)
+            if atom is None:
+                atom = '\\['
+            else:
+                offset = collection_end
+        else:
+            atom = re.escape(this_char)
+        last_atom_start = len(translated)
+        translated.append(atom)
+    if group_starts:
+        raise ValueError(f"unmatched '(' in '{pattern}'")
+    return ''.join(translated)
+
+
+class Token(NamedTuple):
+    """
+    One lexed token: the node (row of the compact tree) it matched, and where.
+    """
+    row: int
+    start: int
+    end: int
+
+
+class LineResult(NamedTuple):
+    """
+    The outcome of lexing one line.
+    """
+    line_number: int
+    is_valid: bool
+    tokens: Tuple[Token, ...]
+    end_row: int  # the node that the line ended at (if valid: where the next line starts a statement)
+    message: str  # what went wrong, if not valid
+    blocks: Tuple[int, ...] = ()  # the blocks open at the end of the line (their start delimiter nodes)
+
+
+class FileResult(NamedTuple):
+    """
+    The outcome of validating one file.
+    """
+    path: str
+    line_count: int
+    invalid_lines: Tuple[LineResult, ...]
+    seconds: float
+
+    @property
+    def lines_per_second(self) -> float:
+        return self.line_count / self.seconds if self.seconds > 0 else float('inf')
+
+
+class CompiledLexer:
+    """
+    The syntax tree compiled into one regex per node (the alternation of its child nodes).
+    """
+    __slots__ = ('tree', 'child_regexes', 'continuation_rows', 'error_regexes', 'group_rows', 'line_end_flags',
+                 'statement_end_flags', 'block_end_delimiters', 'end_delimiter_rows', 'untranslatable')
+
+    def __init__(self, tree: CompactTree) -> None:
+        self.tree = tree
+        self.child_regexes: List[Optional[Pattern[str]]] = [None] * len(tree)
+        # the rows that the alternation of each row lists (those left out too), most specific firstly
+        self.continuation_rows: List[Tuple[int, ...]] = [()] * len(tree)
+        self.error_regexes: List[Optional[Pattern[str]]] = [None] * len(tree)
+        self.group_rows: Dict[str, int] = {}  # named group of an alternation: the row it continues at
+        self.line_end_flags = bytearray(len(tree))  # the line may end after this node
+        self.statement_end_flags = bytearray(len(tree))  # a ';' may follow this node
+        # start delimiter nodes (e.g. '{'): the end delimiter of their block; end delimiter nodes: theirs
+        self.block_end_delimiters: Dict[int, str] = {}
+        self.end_delimiter_rows: Dict[int, str] = {}
+        self.untranslatable: Dict[int, str] = {}  # row: why its pattern was left out (it never matches)
+
+    def describe(self, row: int) -> str:
+        """
+        Name a node by its path within the syntax tree.
+        :param row: a row of the compact tree
+        :type row: `int`
+        :return: its path, relative to the tree root
+        :rtype: `str`
+        """
+        if row == ROOT_ROW:
+            return '(top level)'
+        return os.path.relpath(self.tree.node(row).path_string, self.tree.root.path_string)
+
+
+def canonical_rows(tree: CompactTree) -> Dict[str, int]:
+    """
+    Find the real place of every node directory: the node that is named after it.
+    :param tree: a compact syntax tree
+    :type tree: `CompactTree`
+    :return: the row of every node directory, keyed by its path
+    :rtype: `Dict[str, int]`
+    """
+    rows: Dict[str, int] = {}
+    for this_index in range(len(tree)):
+        this_node = tree.node(this_index)
+        # a back reference has the path of its ancestor; every other node has a path of its own
+        if not this_node.is_back_reference:
+            rows[this_node.path_string] = this_index
+    return rows
+
+
+def continuation_row(tree_root_path: str, rows: Dict[str, int], node: CompactNode, child: CompactNode) -> int:
+    """
+    Give the row that the group of a child node continues at: its real place, if it was reached through a symlink.
+    :param tree_root_path: the path of the tree root
+    :type tree_root_path: `str`
+    :param rows: the real place of every node directory
+    :type rows: `Dict[str, int]`
+    :param node: a node of the syntax tree
+    :type node: `CompactNode`
+    :param child: a child node of that node
+    :type child: `CompactNode`
+    :return: a row of the compact tree
+    :rtype: `int`
+    """
+    child_path = child.path_string
+    if os.path.dirname(child_path) != node.path_string and child_path.startswith(tree_root_path + os.sep):
+        return rows.get(child_path, child.index)
+    return child.index
+
+
+def compile_lexer(tree: CompactTree) -> CompiledLexer:
+    """
+    Compile the syntax tree into a lexer.
+    :param tree: a compact syntax tree
+    :type tree: `CompactTree`
+    :return: the lexer; nodes whose pattern has no 're' equivalent are left out (they are listed in it)
+    :rtype: `CompiledLexer`
+    """
+    lexer = CompiledLexer(tree)
+    tree_root_path = tree.root.path_string
+    rows = canonical_rows(tree)
+    translations: Dict[Tuple[int, int], Tuple[str, int]] = {}
+
+    def translate_row(row: int, group_offset: int) -> Optional[Tuple[str, int]]:
+        """
+        Translate the pattern of a node, once per group offset.
+        :return: the Python regex and its number of capturing groups; None if it has no 're' equivalent
+        """
+        key = (row, group_offset)
+        if key not in translations and row not in lexer.untranslatable:
+            try:
+                translated = translate_very_magic(node_patterns.match_regex(tree.node(row)), group_offset)
+                translations[key] = (translated, re.compile(translated).groups)
+            except (ValueError, re.error) as this_error:
+                lexer.untranslatable[row] = str(this_error)
+        return translations.get(key)
+
+    lexer.line_end_flags[ROOT_ROW] = 1
+    for this_index in range(len(tree)):
+        this_node = tree.node(this_index)
+        if this_index != ROOT_ROW and this_node.name in BLOCK_DELIMITERS:
+            lexer.block_end_delimiters[this_index] = BLOCK_DELIMITERS[this_node.name]
+        elif this_node.name in BLOCK_DELIMITERS.values():
+            lexer.end_delimiter_rows[this_index] = this_node.name
+        follow_on_tokens: Tuple[str, ...] = ()
+        if this_node.follow_on_to_only is not None:
+            try:
+                follow_on_tokens = error_handlers.parse_follow_on_tokens(this_node.follow_on_to_only)
+            except ValueError:
+                pass
+        if this_node.is_terminal or 'new_line' in follow_on_tokens:
+            lexer.line_end_flags[this_index] = 1
+        if this_node.is_terminal or 'end_of_statement' in follow_on_tokens:
+            lexer.statement_end_flags[this_index] = 1
+        if this_node.is_terminal:
+            continue
+        if follow_on_tokens:
+            error_handler = error_handlers.compile_tokens('', follow_on_tokens)
+            lexer.error_regexes[this_index] = re.compile(translate_very_magic(error_handler.antipattern[2:]))
+
+        # one alternation of the child nodes, most specific firstly; a shared group is listed once
+        alternatives: List[str] = []
+        group_count = 0
+        listed_rows: Dict[int, None] = {}
+        for this_child in node_patterns.order_by_specificity(this_node.children):
+            listed_rows.setdefault(continuation_row(tree_root_path, rows, this_node, this_child))
+        lexer.continuation_rows[this_index] = tuple(listed_rows)
+        for this_row in listed_rows:
+            translation = translate_row(this_row, group_count + 1)
+            if translation is None:
+                continue
+            translated, translated_group_count = translation
+            group_name = 'n' + str(this_row)
+            alternatives.append('(?P<' + group_name + '>' + translated + ')')
+            lexer.group_rows[group_name] = this_row
+            group_count += 1 + translated_group_count
+        if alternatives:
+            lexer.child_regexes[this_index] = re.compile('|'.join(alternatives))
+    return lexer
+
+
+def lex_line(lexer: CompiledLexer, line: str, line_number: int = 0, start_row: Optional[int] = None,
+             blocks: Tuple[int, ...] = ()) -> LineResult:
+    """
+    Lex one line (without its end of line) along the pathways of the syntax tree.
+    :param lexer: a compiled lexer
+    :type lexer: `CompiledLexer`
+    :param line: the line
+    :type line: `str`
+    :param line_number: its line number, to report
+    :type line_number: `int`
+    :param start_row: the node to continue from (default: the line starts a statement)
+    :type start_row: `Optional[int]`
+    :param blocks: the blocks open at the start of the line (their start delimiter nodes, innermost lastly)
+    :type blocks: `Tuple[int, ...]`
+    :return: its tokens, whether it is valid, and the blocks open at its end
+    :rtype: `LineResult`
+    """
+    child_regexes = lexer.child_regexes
+    group_rows = lexer.group_rows
+    block_end_delimiters = lexer.block_end_delimiters
+    tokens: List[Token] = []
+    open_blocks = list(blocks)
+    # a statement starts at the top level, or within the innermost open block
+    statement_row = open_blocks[-1] if open_blocks else ROOT_ROW
+    row = statement_row if start_row is None else start_row
+    position = 0
+    line_length = len(line)
+    message = ''
+    while True:
+        child_regex = child_regexes[row]
+        if child_regex is not None:
+            match = child_regex.match(line, position)
+            if match is None and row == statement_row:
+                # a statement may start at any column: skip the blanks before it
+                position = BLANKS_REGEX.match(line, position).end()
+                if position < line_length:
+                    match = child_regex.match(line, position)
+            # an empty match would not advance; it counts as none
+            if match is not None and match.end() > position:
+                row = group_rows[match.lastgroup]
+                tokens.append(Token(row, position, match.end()))
+                position = match.end()
+                if row in block_end_delimiters:
+                    open_blocks.append(row)
+                    statement_row = row
+                elif row in lexer.end_delimiter_rows:
+                    if not open_blocks or block_end_delimiters[open_blocks[-1]] != lexer.end_delimiter_rows[row]:
+                        message = f"column {match.start() + 1}: {line[match.start()]!r} closes no open block"
+                        break
+                    open_blocks.pop()
+                    statement_row = open_blocks[-1] if open_blocks else ROOT_ROW
+                continue
+        # no child node follows: this pathway ends here
+        next_position = BLANKS_REGEX.match(line, position).end()
+        if next_position >= line_length:
+            if lexer.line_end_flags[row] or row == statement_row:
+                # the next line starts a statement (within the blocks still open)
+                return LineResult(line_number, True, tuple(tokens), statement_row, '', tuple(open_blocks))
+            message = f"line ends after {lexer.describe(row)}, which expects more"
+            break
+        if row == statement_row:
+            message = f"column {next_position + 1}: no statement of {lexer.describe(row)} matches"
+            break
+        if line[next_position] == ';' and lexer.statement_end_flags[row]:
+            position = next_position + 1
+            row = statement_row
+            continue
+        if lexer.tree.flags[row] & FLAG_TERMINAL:
+            # after a terminal node, the next statement may start at once
+            row = statement_row
+            continue
+        error_regex = lexer.error_regexes[row]
+        if error_regex is not None and error_regex.match(line, next_position):
+            message = f"column {next_position + 1}: {line[next_position]!r} may not follow {lexer.describe(row)}"
+        else:
+            message = f"column {position + 1}: no child node of {lexer.describe(row)} matches"
+        break
+    # an invalid line opens or closes no block: the next line goes on within the blocks open before it
+    return LineResult(line_number, False, tuple(tokens), row, message, blocks)
+
+
+def lex_lines(lexer: CompiledLexer, lines: Iterable[str]) -> Iterable[LineResult]:
+    """
+    Lex lines, a block open at the end of a line going on in the next one; blank lines give no tokens.
+    :param lexer: a compiled lexer
+    :type lexer: `CompiledLexer`
+    :param lines: the lines (an end of line is stripped)
+    :type lines: `Iterable[str]`
+    :return: the outcome of each line
+    :rtype: `Iterable[LineResult]`
+    """
+    blocks: Tuple[int, ...] = ()
+    for this_line_number, this_line in enumerate(lines, start=1):
+        line_result = lex_line(lexer, this_line.rstrip('\r\n'), this_line_number, blocks=blocks)
+        blocks = line_result.blocks
+        yield line_result
+
+
+def validate_file(lexer: CompiledLexer, path: str) -> FileResult:
+    """
+    Lex every line of a file, timing it.
+    :param lexer: a compiled lexer
+    :type lexer: `CompiledLexer`
+    :param path: the file path
+    :type path: `str`
+    :return: its invalid lines, line count and lexing time
+    :rtype: `FileResult`
+    """
+    with open(path, encoding='utf-8', errors='replace') as sample_file:
+        lines = sample_file.readlines()
+    start_time = time.perf_counter()
+    invalid_lines = tuple(this_result for this_result in lex_lines(lexer, lines) if not this_result.is_valid)
+    return FileResult(path, len(lines), invalid_lines, time.perf_counter() - start_time)
+
+
+def find_sample_files(tree_dirpath: str, suffix: str = '', include_hidden_dirs: bool = False) -> List[str]:
+    """
+    Find the sample files kept within the syntax tree (any file that is not hidden).
+    :param tree_dirpath: the syntax tree directory
+    :type tree_dirpath: `str`
+    :param suffix: only the files ending with this (default: any)
+    :type suffix: `str`
+    :param include_hidden_dirs: also look within hidden directories (e.g. '.hold/')
+    :type include_hidden_dirs: `bool`
+    :return: the file paths, sorted
+    :rtype: `List[str]`
+    """
+    sample_files = []
+    # symlinked directories are not followed: they are pathways into the tree itself
+    for this_dirpath, these_dirnames, these_filenames in os.walk(tree_dirpath, followlinks=False):
+        if not include_hidden_dirs:
+            these_dirnames[:] = [this_dirname for this_dirname in these_dirnames if not this_dirname.startswith('.')]
+        sample_files.extend(os.path.join(this_dirpath, this_filename) for this_filename in these_filenames
+                            if not this_filename.startswith('.') and this_filename.endswith(suffix))
+    return sorted(sample_files)
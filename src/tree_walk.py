@@ -0,0 +1,119 @@
+"""
+File: tree_walk.py
+Purpose: Walk the syntax tree with an explicit stack: pre-order, post-order and reverse post-order visits.
+
+No Python recursion is involved, so the depth of a syntax tree is not bounded by
+sys.getrecursionlimit(); the one stack of ancestors is shared by every visit.
+"""
+from collections import deque
+from typing import Any, Callable, Deque, Iterable, Iterator, List, Optional, Protocol, Sequence, Tuple
+
+
+class TreeNode(Protocol):
+    """
+    Any node of a syntax tree, e.g. a `CompactNode`.
+    """
+    @property
+    def children(self) -> Sequence[Any]: ...
+
+
+# expand(node, context) -> (child node, child context) pairs, in visiting order
+ExpandHook = Callable[[TreeNode, Any], Iterable[Tuple[TreeNode, Any]]]
+# visit(node, context, ancestors); the ancestors run from the root down to the parent of the node
+VisitHook = Callable[[TreeNode, Any, Deque[TreeNode]], None]
+
+
+def expand_children(node: TreeNode, context: Any) -> Iterable[Tuple[TreeNode, Any]]:
+    """
+    The default expand hook: every child node in tree order, with no context.
+    :param node: a node of the syntax tree
+    :type node: `TreeNode`
+    :param context: the context of the node (unused)
+    :type context: `Any`
+    :return: (child node, None) pairs
+    :rtype: `Iterable[Tuple[TreeNode, Any]]`
+    """
+    return ((this_child, None) for this_child in node.children)
+
+
+def walk(root: TreeNode, root_context: Any = None, expand: ExpandHook = expand_children,
+         pre_order: Optional[VisitHook] = None, post_order: Optional[VisitHook] = None,
+         ancestors: Optional[Deque[TreeNode]] = None) -> None:
+    """
+    Walk a (sub)tree depth-first, calling `pre_order` before and `post_order` after the child nodes of each node.
+    :param root: the node to start at
+    :type root: `TreeNode`
+    :param root_context: the context of the starting node
+    :type root_context: `Any`
+    :param expand: gives the child nodes to visit (and their context), in visiting order
+    :type expand: `ExpandHook`
+    :param pre_order: called when a node is entered
+    :type pre_order: `Optional[VisitHook]`
+    :param post_order: called when a node is left, after all its child nodes
+    :type post_order: `Optional[VisitHook]`
+    :param ancestors: the ancestors of the starting node, if any; restored when the walk returns
+    :type ancestors: `Optional[Deque[TreeNode]]`
+    :return: None
+    :rtype: `None`
+    """
+    if ancestors is None:
+        ancestors = deque()
+    base_depth = len(ancestors)
+    # each frame: the node, its context, and an iterator over its remaining child nodes
+    frames: List[Tuple[TreeNode, Any, Iterator[Tuple[TreeNode, Any]]]] = []
+
+    if pre_order is not None:
+        pre_order(root, root_context, ancestors)
+    frames.append((root, root_context, iter(expand(root, root_context))))
+    while frames:
+        node, context, children = frames[-1]
+        next_child = next(children, None)
+        if next_child is not None:
+            child, child_context = next_child
+            # the ancestors are the nodes of every frame below the top one
+            ancestors.append(node)
+            if pre_order is not None:
+                pre_order(child, child_context, ancestors)
+            frames.append((child, child_context, iter(expand(child, child_context))))
+            continue
+        frames.pop()
+        if post_order is not None:
+            post_order(node, context, ancestors)
+        if frames:
+            # back to the parent node: it is no longer an ancestor of the top frame
+            ancestors.pop()
+
+
+def walk_reverse_post_order(root: TreeNode, visit: VisitHook, root_context: Any = None,
+                            expand: ExpandHook = expand_children,
+                            ancestors: Optional[Deque[TreeNode]] = None) -> None:
+    """
+    Visit a (sub)tree in reverse post-order: every node before its child nodes, the last child node firstly.
+
+    This is the exact reverse of the post-order, without collecting the post-order firstly.
+    :param root: the node to start at
+    :type root: `TreeNode`
+    :param visit: called for each node
+    :type visit: `VisitHook`
+    :param root_context: the context of the starting node
+    :type root_context: `Any`
+    :param expand: gives the child nodes to visit (and their context), in (forward) visiting order
+    :type expand: `ExpandHook`
+    :param ancestors: the ancestors of the starting node, if any; restored when the walk returns
+    :type ancestors: `Optional[Deque[TreeNode]]`
+    :return: None
+    :rtype: `None`
+    """
+    def expand_reversed(node: TreeNode, context: Any) -> Iterable[Tuple[TreeNode, Any]]:
+        """
+        The child nodes given by `expand`, last one firstly.
+        :param node: a node of the syntax tree
+        :type node: `TreeNode`
+        :param context: the context of the node
+        :type context: `Any`
+        :return: (child node, child context) pairs
+        :rtype: `Iterable[Tuple[TreeNode, Any]]`
+        """
+        return reversed(list(expand(node, context)))
+
+    walk(root, root_context, expand_reversed, pre_order=visit, ancestors=ancestors)
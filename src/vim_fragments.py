@@ -0,0 +1,402 @@
+"""
+File: vim_fragments.py
+Purpose: Emitted Vimscript fragments, one per syntax tree node, and their on-disk store for incremental regeneration.
+
+The fragment of a node is derived from the node directory and from the
+directories of its child nodes (its 'nextgroup=' list names them).  The store
+indexes every emitted node by the inodes of those directories, so the stat
+signatures that changed in the tree manifest give the nodes to emit again;
+every other fragment keeps its lines of the previous output.  Of identical
+subtrees, only the copy kept (the representative) is emitted: a change to any
+other copy is one to the representative, whose fragments are emitted again.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import tree_cache
+from syntax_tree import NO_INODE, NODE_CONFIG_FILENAME, StatSignature
+
+FRAGMENT_STORE_VERSION: int = 9
+FRAGMENT_STORE_FILENAME: str = 'fragments.pickle'
+
+
+@dataclass(frozen=True)
+class Fragment:
+    """
+    The Vimscript emitted for one node of the syntax tree.
+
+    The 'nextgroup=' member list is kept apart from the other lines (and is
+    inserted before line number `nextgroup_at`) so that it can be rendered
+    after every fragment is known.  Error handlers found while emitting the
+    node are kept with it, so a re-used fragment brings them along.
+    """
+    lines: Tuple[str, ...]
+    nextgroup_at: int
+    nextgroup: Tuple[str, ...]
+    errors: Tuple[Tuple[str, str, str], ...]
+
+
+class FragmentBuilder:
+    """
+    Collects the output of the emit functions into a Fragment.
+    """
+
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+        self.nextgroup_at: int = -1
+        self.nextgroup: List[str] = []
+        self.errors: List[Tuple[str, str, str]] = []
+
+    def add_line(self, line: str) -> None:
+        """
+        Append a Vimscript line.
+        :param line: a Vimscript line (without newline)
+        :type line: `str`
+        :return: None
+        :rtype: `None`
+        """
+        self.lines.append(line)
+
+    def add_nextgroup(self, group_name: str) -> None:
+        """
+        Append a group name to the 'nextgroup=' list of this fragment.
+        :param group_name: a Vimscript group name
+        :type group_name: `str`
+        :return: None
+        :rtype: `None`
+        """
+        if self.nextgroup_at < 0:
+            self.nextgroup_at = len(self.lines)
+        self.nextgroup.append(group_name)
+
+    def add_error(self, error_handler: Tuple[str, str, str]) -> None:
+        """
+        Record an error handler found: (group name, symbol, antipattern)
+        :param error_handler: the error handler found
+        :type error_handler: `Tuple[str, str, str]`
+        :return: None
+        :rtype: `None`
+        """
+        self.errors.append(error_handler)
+
+    def build(self) -> Fragment:
+        """
+        Freeze the collected output into a Fragment.
+        :return: the fragment
+        :rtype: `Fragment`
+        """
+        nextgroup_at = self.nextgroup_at if self.nextgroup_at >= 0 else len(self.lines)
+        return Fragment(lines=tuple(self.lines), nextgroup_at=nextgroup_at,
+                        nextgroup=tuple(self.nextgroup), errors=tuple(self.errors))
+
+
+# (key, name) of a sibling keyword folded into the group of a node
+FoldedSibling = Tuple[str, str]
+# (key, name, symbol names, folded siblings) of a child node, as its parent node lists it for the traversal
+ChildEntry = Tuple[str, str, Tuple[str, str, str], Tuple[FoldedSibling, ...]]
+
+
+class EmittedNode(NamedTuple):
+    """
+    A node as a run emitted it: its fragment, and everything the fragment was derived from besides the tree.
+    """
+    name: str
+    fragment: Optional[Fragment]  # None for the tree root, which is emitted by no one
+    symbol_names: Tuple[str, str, str]  # group name, symbol name that child names extend, converted name part
+    is_top_level: bool
+    folded_siblings: Tuple[FoldedSibling, ...]  # the sibling keywords folded into its group
+    child_entries: Tuple[ChildEntry, ...]  # the child nodes to traverse, in traversal order (no back reference)
+    dependencies: Tuple[str, ...]  # the paths of the node and of its child nodes (and grandchild nodes, if folding)
+
+
+@dataclass
+class FragmentStore:
+    """
+    What a run leaves to the next one: every node emitted, and the rendered lines of their fragments.
+    """
+    settings: Tuple[Any, ...]  # what every fragment depends on: symbol prefix, file format, emit options, tree root
+    representatives: Dict[str, str]  # the path of the copy emitted, by path of every other copy of a subtree
+    manifest: Dict[str, StatSignature]
+    nodes: Dict[str, EmittedNode]  # by key (the node path), in output order; the tree root lastly
+    dependents: Dict[int, Set[str]]  # the keys of the nodes derived from each directory, by inode
+    lines: List[str]  # the rendered fragments, in output order
+    line_ranges: Dict[str, Tuple[int, int]]  # where the fragment of each node starts and ends within `lines`
+    clusters: Dict[Tuple[str, ...], str]
+
+    @property
+    def fragment_count(self) -> int:
+        """The number of fragments, the tree root aside."""
+        return len(self.line_ranges)
+
+
+def fingerprint(*inputs: Any) -> str:
+    """
+    Fingerprint everything that a piece of output is derived from.
+    :param inputs: node names, their options, etc.
+    :type inputs: `Any`
+    :return: a hex digest
+    :rtype: `str`
+    """
+    return hashlib.blake2b(repr(inputs).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def render_group_list(lines: List[str], group_names: Tuple[str, ...]) -> None:
+    """
+    Render a list of group names, one continuation line each.
+    :param lines: Vimscript lines to append to
+    :type lines: `List[str]`
+    :param group_names: the group names
+    :type group_names: `Tuple[str, ...]`
+    :return: None
+    :rtype: `None`
+    """
+    for this_group_name in group_names[:-1]:
+        lines.append("\\    %s," % this_group_name)
+    lines.append("\\    %s" % group_names[-1])
+
+
+def plan_clusters(fragments: Iterable[Fragment], cluster_prefix: str) -> Dict[Tuple[str, ...], str]:
+    """
+    Name a 'syntax cluster' for every 'nextgroup=' list that more than one fragment uses.
+    :param fragments: the fragments, in output order
+    :type fragments: `Iterable[Fragment]`
+    :param cluster_prefix: a prefix for the cluster names
+    :type cluster_prefix: `str`
+    :return: cluster names keyed by their 'nextgroup=' list, numbered in order of first use
+    :rtype: `Dict[Tuple[str, ...], str]`
+    """
+    use_counts: Dict[Tuple[str, ...], int] = {}
+    for this_fragment in fragments:
+        # a single group name is no shorter as a cluster
+        if len(this_fragment.nextgroup) > 1:
+            use_counts[this_fragment.nextgroup] = use_counts.get(this_fragment.nextgroup, 0) + 1
+    clusters: Dict[Tuple[str, ...], str] = {}
+    for this_nextgroup, this_use_count in use_counts.items():
+        if this_use_count > 1:
+            clusters[this_nextgroup] = '%s%d' % (cluster_prefix, len(clusters) + 1)
+    return clusters
+
+
+def render_clusters(clusters: Dict[Tuple[str, ...], str]) -> List[str]:
+    """
+    Render the 'syntax cluster' definitions.
+    :param clusters: cluster names keyed by their 'nextgroup=' list
+    :type clusters: `Dict[Tuple[str, ...], str]`
+    :return: Vimscript lines (without newlines)
+    :rtype: `List[str]`
+    """
+    lines: List[str] = []
+    for this_nextgroup, this_cluster_name in clusters.items():
+        lines.append("syntax cluster %s contains=" % this_cluster_name)
+        render_group_list(lines, this_nextgroup)
+    return lines
+
+
+def render(fragment: Fragment, clusters: Optional[Dict[Tuple[str, ...], str]] = None) -> List[str]:
+    """
+    Render a fragment into Vimscript lines.
+    :param fragment: the fragment
+    :type fragment: `Fragment`
+    :param clusters: if given, a 'nextgroup=' list found in here is rendered as its '@cluster'
+    :type clusters: `Optional[Dict[Tuple[str, ...], str]]`
+    :return: Vimscript lines (without newlines)
+    :rtype: `List[str]`
+    """
+    lines = list(fragment.lines[:fragment.nextgroup_at])
+    cluster_name = clusters.get(fragment.nextgroup) if clusters else None
+    if cluster_name is not None:
+        lines.append("\\ nextgroup=@%s" % cluster_name)
+    elif fragment.nextgroup:
+        lines.append("\\ nextgroup=")
+        render_group_list(lines, fragment.nextgroup)
+    lines.extend(fragment.lines[fragment.nextgroup_at:])
+    return lines
+
+
+def inode_of(manifest: Dict[str, StatSignature], path: str) -> int:
+    """
+    Give the inode that a path had when the manifest was made.
+    :param manifest: stat signatures of every directory and config file of a syntax tree
+    :type manifest: `Dict[str, StatSignature]`
+    :param path: a directory of the syntax tree
+    :type path: `str`
+    :return: its inode, NO_INODE if it is not in the manifest (or is a symlink to nowhere): whatever
+        depends on it is emitted again, always
+    :rtype: `int`
+    """
+    return manifest.get(path, (NO_INODE,))[0]
+
+
+def changed_inodes(previous_manifest: Dict[str, StatSignature], manifest: Dict[str, StatSignature],
+                   previous_representatives: Dict[str, str], representatives: Dict[str, str]) -> Set[int]:
+    """
+    Find the directories that changed between two runs: added, removed, edited, with an edited config file,
+    or merged into another copy of their subtree than before.
+
+    A path that is no node in one of the manifests (it is missing from it, or is a
+    symlink to nowhere) is a change to the directory listing it, too: a symlink that
+    starts (or stops) leading somewhere does not change the mtime of its directory.
+    A change to a copy of a subtree is one to the copy that was emitted for it.
+    :param previous_manifest: the manifest of the previous run
+    :type previous_manifest: `Dict[str, StatSignature]`
+    :param manifest: the manifest of this run
+    :type manifest: `Dict[str, StatSignature]`
+    :param previous_representatives: the copy emitted, by path of every other copy of a subtree, in the previous run
+    :type previous_representatives: `Dict[str, str]`
+    :param representatives: the copy emitted, by path of every other copy of a subtree, in this run
+    :type representatives: `Dict[str, str]`
+    :return: their inodes, both the previous and the present one of each (and of the copy emitted for it)
+    :rtype: `Set[int]`
+    """
+    changed_paths = previous_manifest.keys() ^ manifest.keys()
+    changed_paths.update(this_path for this_path, this_signature in manifest.items()
+                         if previous_manifest.get(this_path, this_signature) != this_signature)
+    changed_dir_paths: Set[str] = set()
+    for this_path in changed_paths:
+        if os.path.basename(this_path) == NODE_CONFIG_FILENAME:
+            # the options of a node are those of its directory
+            this_path = os.path.dirname(this_path)
+        elif NO_INODE in (inode_of(previous_manifest, this_path), inode_of(manifest, this_path)):
+            # the child nodes of a node are those of its directory
+            changed_dir_paths.add(os.path.dirname(this_path))
+        changed_dir_paths.add(this_path)
+    # a copy merged into another copy (or no more) is named, and emitted, as another one
+    changed_dir_paths.update(this_path for this_path in previous_representatives.keys() | representatives.keys()
+                             if previous_representatives.get(this_path) != representatives.get(this_path))
+    inodes: Set[int] = {NO_INODE}
+    for this_path in changed_dir_paths:
+        for this_changed_path in {this_path, previous_representatives.get(this_path, this_path)}:
+            inodes.add(inode_of(previous_manifest, this_changed_path))
+            inodes.add(inode_of(manifest, this_changed_path))
+    return inodes
+
+
+def find_affected_keys(store: FragmentStore, manifest: Dict[str, StatSignature],
+                       representatives: Dict[str, str]) -> Set[str]:
+    """
+    Find the nodes of the previous run whose fragment may differ now.
+    :param store: the fragment store of the previous run
+    :type store: `FragmentStore`
+    :param manifest: the manifest of this run
+    :type manifest: `Dict[str, StatSignature]`
+    :param representatives: the copy emitted, by path of every other copy of a subtree, in this run
+    :type representatives: `Dict[str, str]`
+    :return: their keys
+    :rtype: `Set[str]`
+    """
+    affected_keys: Set[str] = set()
+    for this_inode in changed_inodes(store.manifest, manifest, store.representatives, representatives):
+        affected_keys.update(store.dependents.get(this_inode, ()))
+    return affected_keys
+
+
+def index_dependents(dependents: Dict[int, Set[str]], manifest: Dict[str, StatSignature], key: str,
+                     node: EmittedNode, is_removed: bool = False) -> None:
+    """
+    Add a node to (or remove it from) the dependents of each directory that its fragment is derived from.
+    :param dependents: the keys of the nodes derived from each directory, by inode
+    :type dependents: `Dict[int, Set[str]]`
+    :param manifest: the manifest that the node was emitted with
+    :type manifest: `Dict[str, StatSignature]`
+    :param key: the key of the node
+    :type key: `str`
+    :param node: the emitted node
+    :type node: `EmittedNode`
+    :param is_removed: remove the node instead
+    :type is_removed: `bool`
+    :return: None
+    :rtype: `None`
+    """
+    for this_path in node.dependencies:
+        inode = inode_of(manifest, this_path)
+        if is_removed:
+            dependents.get(inode, set()).discard(key)
+        else:
+            dependents.setdefault(inode, set()).add(key)
+
+
+def build_store(previous_store: Optional[FragmentStore], settings: Tuple[Any, ...], representatives: Dict[str, str],
+                manifest: Dict[str, StatSignature], nodes: Dict[str, EmittedNode],
+                clusters: Dict[Tuple[str, ...], str]) -> FragmentStore:
+    """
+    Render the fragments of a run into a store, splicing the lines of the previous store where a node was re-used.
+
+    The dependents index of the previous store is updated in place (for the nodes
+    emitted again, or gone), so the previous store is not to be used afterward.
+    :param previous_store: the store of the previous run, if its nodes were re-used
+    :type previous_store: `Optional[FragmentStore]`
+    :param settings: what every fragment depends on
+    :type settings: `Tuple[Any, ...]`
+    :param representatives: the copy emitted, by path of every other copy of a subtree
+    :type representatives: `Dict[str, str]`
+    :param manifest: the manifest of this run
+    :type manifest: `Dict[str, StatSignature]`
+    :param nodes: the nodes of this run, in output order
+    :type nodes: `Dict[str, EmittedNode]`
+    :param clusters: cluster names keyed by their 'nextgroup=' list
+    :type clusters: `Dict[Tuple[str, ...], str]`
+    :return: the store of this run
+    :rtype: `FragmentStore`
+    """
+    previous_nodes: Dict[str, EmittedNode] = {}
+    previous_lines: List[str] = []
+    previous_ranges: Dict[str, Tuple[int, int]] = {}
+    dependents: Dict[int, Set[str]] = {}
+    if previous_store is not None:
+        previous_nodes = previous_store.nodes
+        dependents = previous_store.dependents
+        if previous_store.clusters == clusters:
+            # the lines of a re-used fragment are the same as before
+            previous_lines = previous_store.lines
+            previous_ranges = previous_store.line_ranges
+        for key, this_node in previous_nodes.items():
+            if nodes.get(key) is not this_node:
+                index_dependents(dependents, previous_store.manifest, key, this_node, is_removed=True)
+
+    lines: List[str] = []
+    line_ranges: Dict[str, Tuple[int, int]] = {}
+    for key, this_node in nodes.items():
+        is_reused = previous_nodes.get(key) is this_node
+        if not is_reused:
+            index_dependents(dependents, manifest, key, this_node)
+        if this_node.fragment is None:
+            continue
+        start = len(lines)
+        previous_range = previous_ranges.get(key) if is_reused else None
+        if previous_range is not None:
+            lines.extend(previous_lines[previous_range[0]:previous_range[1]])
+        else:
+            lines.extend(render(this_node.fragment, clusters))
+        line_ranges[key] = (start, len(lines))
+    return FragmentStore(settings=settings, representatives=representatives, manifest=manifest, nodes=nodes,
+                         dependents=dependents, lines=lines, line_ranges=line_ranges, clusters=clusters)
+
+
+def load_store(cache_dirpath: Path) -> Optional[FragmentStore]:
+    """
+    Load the fragment store of the previous run.
+    :param cache_dirpath: directory holding the cache files
+    :type cache_dirpath: `Path`
+    :return: the store, None if there is none (or of another version)
+    :rtype: `Optional[FragmentStore]`
+    """
+    stored = tree_cache.read_pickle(cache_dirpath / FRAGMENT_STORE_FILENAME)
+    if not isinstance(stored, dict) or stored.get('version') != FRAGMENT_STORE_VERSION:
+        return None
+    return stored['store']
+
+
+def save_store(cache_dirpath: Path, store: FragmentStore) -> None:
+    """
+    Save the fragment store of this run for the next one.
+    :param cache_dirpath: directory holding the cache files
+    :type cache_dirpath: `Path`
+    :param store: the fragment store
+    :type store: `FragmentStore`
+    :return: None
+    :rtype: `None`
+    """
+    tree_cache.write_pickle(cache_dirpath / FRAGMENT_STORE_FILENAME, {'version': FRAGMENT_STORE_VERSION, 'store': store})
@@ -0,0 +1,89 @@
+"""
+File: vim_output.py
+Purpose: Buffered output sink of a generated Vimscript syntax file, replaced atomically once complete.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from types import TracebackType
+from typing import cast, Optional, TextIO, Type
+
+OUTPUT_BUFFER_SIZE: int = 1024 * 1024  # bytes
+HEADER_FILENAME: str = 'header.vim'
+FOOTER_FILENAME: str = 'footer.vim'
+
+
+def file_digest(file_path: Path) -> Optional[str]:
+    """
+    Hash the contents of a file.
+    :param file_path: Path to the file
+    :type file_path: `Path`
+    :return: a hex digest, or None if the file is missing
+    :rtype: `Optional[str]`
+    """
+    file_hash = hashlib.blake2b(digest_size=32)
+    try:
+        with open(file_path, 'rb') as f:
+            for this_chunk in iter(lambda: f.read(OUTPUT_BUFFER_SIZE), b''):
+                file_hash.update(this_chunk)
+    except FileNotFoundError:
+        return None
+    return file_hash.hexdigest()
+
+
+class AtomicOutputFile:
+    """
+    A file written through one large buffer; it replaces the target file only once closed without error.
+
+    Readers of the target file (e.g. a running Vim, or a build rule) never see a
+    partially written file.  If the new contents hash the same as the target
+    file, the target file (and its mtime) is left alone, so that a no-op
+    regeneration triggers no reloads nor rebuilds downstream.
+    """
+
+    def __init__(self, file_path: Path) -> None:
+        self.file_path: Path = file_path
+        self.changed: bool = False
+        self._temp_filespec: str = ''
+        self._file: Optional[TextIO] = None
+
+    def __enter__(self) -> TextIO:
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_descriptor, self._temp_filespec = tempfile.mkstemp(dir=self.file_path.parent,
+                                                                prefix=self.file_path.name + '.')
+        self._file = os.fdopen(file_descriptor, 'w', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE)
+        return self._file
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]], exc_value: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        replaced = False
+        try:
+            cast(TextIO, self._file).close()
+            if exc_type is None and file_digest(Path(self._temp_filespec)) != file_digest(self.file_path):
+                os.chmod(self._temp_filespec, 0o644)
+                os.replace(self._temp_filespec, self.file_path)
+                replaced = True
+        finally:
+            # the temporary file is left behind by no failure (of the writing, nor of the replacing)
+            if not replaced:
+                os.unlink(self._temp_filespec)
+        self.changed = replaced
+
+
+def copy_part(output_file: TextIO, part_filespec: Path) -> None:
+    """
+    Copy a header/footer Vimscript file into the output; a missing one is skipped.
+    :param output_file: the output file
+    :type output_file: `TextIO`
+    :param part_filespec: Path to the header/footer Vimscript file
+    :type part_filespec: `Path`
+    :return: None
+    :rtype: `None`
+    """
+    try:
+        with open(part_filespec, 'r', encoding='utf-8') as f:
+            shutil.copyfileobj(f, output_file)
+    except FileNotFoundError:
+        return